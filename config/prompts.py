@@ -3113,4 +3113,25 @@ Output:
 ]
 
 Now extract relevant information from the given NOTAM text and output it in JSON format.
-"""
\ No newline at end of file
+"""
+
+# Prompt per category, used when records are routed to categories (mixed input streams)
+CATEGORY_PROMPTS = {
+    'runway': RUNWAY_PROMPT_ICL,
+    'taxiway': TAXIWAY_PROMPT_ICL,
+    'airway': AIRWAY_PROMPT_ICL,
+    'airport': AIRPORT_PROMPT_ICL,
+    'navigation': NAVIGATION_PROMPT_ICL,
+    'light': LIGHT_PROMPT_ICL,
+    'procedure': PROCEDURE_PROMPT_ICL,
+    'stand': STAND_PROMPT_ICL,
+    'standard': STANDARD_PROMPT_ICL,
+    'area': AREA_PROMPT_ICL,
+    'RVR': RVR_PROMPT_ICL
+}
+
+# Pruned ICL variants written by src/prompt_profiler.py (the module exists once a pruning run is saved)
+try:
+    from config.pruned_prompts import PRUNED_PROMPTS
+except ImportError:
+    PRUNED_PROMPTS = {}
@@ -2,8 +2,12 @@ import argparse
 import sys
 import json
 import os
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 
 # Add project root to Python path
 project_root = Path(__file__).parent
@@ -20,9 +24,24 @@ except ImportError:
 
 # Import project modules
 from src.api_manager import create_api_manager
-from src.utils import get_logger, print_evaluation_report
+from src.utils import get_logger, print_evaluation_report, reset_canonical_stats
 from src.handler.json_handler import JSONHandler
 from src.models import ProcessingBatch
+from src.consistency import AdaptiveConsistencyPolicy, vote_fields
+from src.blob_store import BlobStore, compact_record
+from src.telemetry import RunTelemetry, MetricsServer, ProgressDisplay
+from src.normalize import deduplicate_records, fan_out_results, dedup_stats
+from src.scheduler import CostEstimator, lpt_order, restore_order
+from src.streaming import iter_records, iter_batches, StreamingRecordWriter
+from src.columnar import ParquetExporter, category_from_path
+from src.schema import response_format_for, validate_parse_fields
+from src.cascade import CascadePolicy, new_cascade_stats, count_accurate_fields, cascade_report, print_cascade_report
+from src.rules import RuleFastPath
+from src.router import CategoryRouter, untrained_categories
+from src.fewshot import FewShotPromptBuilder
+from src.serialization import Serializer
+from src.metrics import IncrementalEvaluator
+from src.leaderboard import EvaluationService, CACHE_FILE as METRICS_CACHE_FILE
 from config.prompts import *
 
 logger = get_logger('main')
@@ -40,11 +59,130 @@ class DataProcessor:
             retry_delay=config.get('retry_delay', 1.0),
             rate_limit=config.get('rate_limit', None)
         )
-        self.json_handler = JSONHandler()
+        # Result files: pretty-printed by default, compact on request; .zst paths are compressed
+        self.serializer = Serializer(pretty=not config.get('serialization', {}).get('compact', False),
+                                     backend=config.get('serialization', {}).get('backend'))
+        self.json_handler = JSONHandler(self.serializer)
+        # Metrics of every written result file are cached by content hash for leaderboards
+        self.evaluation_cache = config.get('evaluation', {}).get('cache', METRICS_CACHE_FILE)
         # Add self-consistency configuration
         self.self_consistency_enabled = config.get('self_consistency', {}).get('enabled', False)
         self.consistency_rounds = config.get('self_consistency', {}).get('rounds', 3)
         self.consistency_strategy = config.get('self_consistency', {}).get('strategy', 'majority_vote')
+        # Adaptive (sequential) self-consistency: issue rounds incrementally, stop on agreement
+        self.adaptive_consistency = config.get('self_consistency', {}).get('adaptive', False)
+        self.consistency_policy = AdaptiveConsistencyPolicy(
+            min_rounds=config.get('self_consistency', {}).get('min_rounds', 2),
+            max_rounds=self.consistency_rounds,
+            threshold=config.get('self_consistency', {}).get('agreement_threshold', 1.0),
+            level=config.get('self_consistency', {}).get('agreement_level', 'record')
+        )
+        self.fixed_policy = AdaptiveConsistencyPolicy(
+            min_rounds=self.consistency_rounds,
+            max_rounds=self.consistency_rounds
+        )
+        self.consistency_stats = {
+            'records': 0,
+            'api_calls': 0,
+            'fixed_round_calls': 0,
+            'early_stopped': 0,
+            'contested': 0
+        }
+        self.multi_sample_stats = {
+            'requests': 0,
+            'samples': 0,
+            'fallback_calls': 0,
+            'prompt_tokens_saved': 0,
+            'request_seconds': 0.0,
+            'estimated_separate_seconds': 0.0
+        }
+        
+        # Deduplication: one request per canonical NOTAM text, results fanned out to duplicates
+        self.dedup = config.get('dedup', False)
+        
+        # Scheduling: 'fifo' (input order) or 'lpt' (estimated most expensive records first)
+        self.scheduling = config.get('scheduling', 'fifo')
+        self.cost_estimator = CostEstimator()
+        if self.scheduling == 'lpt':
+            seeded = self.cost_estimator.seed_from_dataset()
+            logger.info(f"LPT scheduling enabled, cost history seeded with {seeded} pairs")
+        
+        # Structured output: per-category JSON Schema sent as response_format (where supported),
+        # results validated locally and invalid records retried
+        structured_config = config.get('structured_output', {})
+        self.structured_output = structured_config.get('enabled', False)
+        self.schema_retries = structured_config.get('max_retries', 1)
+        self.schema_stats = {'validated': 0, 'invalid': 0, 'retried': 0, 'repaired': 0, 'invalid_final': 0}
+        
+        # Model cascade: cheapest tier first, escalate records that fail local checks
+        cascade_config = config.get('cascade', {})
+        self.cascade_policy = None
+        if cascade_config.get('enabled', False):
+            self.cascade_policy = CascadePolicy(
+                tiers=cascade_config.get('tiers', []),
+                category_tiers=cascade_config.get('category_tiers'),
+                min_coverage=cascade_config.get('min_coverage', 0.8),
+                min_agreement=cascade_config.get('min_agreement', 1.0),
+                prices=cascade_config.get('prices')
+            )
+            logger.info(f"Model cascade enabled: {' -> '.join(self.cascade_policy.tiers)}")
+        self.cascade_stats = new_cascade_stats()
+        self.default_category = None
+        
+        # Rule fast path: template NOTAMs a deterministic rule answers confidently never reach the API
+        fast_path_config = config.get('fast_path', {})
+        self.fast_path = None
+        if fast_path_config.get('enabled', False):
+            self.fast_path = RuleFastPath(min_confidence=fast_path_config.get('min_confidence', 0.9))
+            logger.info(f"Rule fast path enabled (min confidence {self.fast_path.min_confidence})")
+        
+        # Category routing: records without a category are classified locally and parsed with
+        # their category's prompt, so a mixed stream runs in one invocation
+        routing_config = config.get('routing', {})
+        self.router = None
+        if routing_config.get('enabled', False):
+            self.router = CategoryRouter.load_or_train(routing_config.get('model_file'),
+                                                       threshold=routing_config.get('threshold', 0.5))
+            logger.info(f"Category routing enabled over {len(self.router.categories)} categories")
+        self.routing_stats = {'records': 0, 'routed': 0, 'multi_label': 0, 'categories': Counter(), 'seconds': 0.0,
+                              'unroutable_categories': untrained_categories(self.router.categories) if self.router else []}
+        
+        # Dynamic few-shot: per-record prompt of category instructions plus the k most similar
+        # training examples, instead of the fixed example set of the *_PROMPT_ICL prompts
+        fewshot_config = config.get('fewshot', {})
+        self.fewshot = None
+        if fewshot_config.get('enabled', False):
+            self.fewshot = FewShotPromptBuilder(k=fewshot_config.get('k', 2),
+                                                max_example_tokens=fewshot_config.get('max_example_tokens', 400))
+            logger.info(f"Dynamic few-shot prompts enabled: {self.fewshot.k} retrieved examples per record")
+        
+        # Streaming: read, process and write batch by batch so memory stays bounded by the
+        # in-flight window (streaming_depth batches) rather than the input size
+        self.streaming = config.get('streaming', False)
+        self.streaming_depth = config.get('streaming_depth', 2)
+        
+        # Columnar sink: flattened parse_fields rows written as Parquet under this root
+        self.parquet_dir = config.get('parquet_dir', None)
+        
+        # Compact output: raw responses and round results go to a sidecar blob store
+        self.compact_output = config.get('compact_output', False)
+        
+        # Live telemetry: metrics endpoint, single-line progress display, optional per-task logs
+        self.metrics_port = config.get('telemetry', {}).get('metrics_port', None)
+        self.progress_display = config.get('telemetry', {}).get('progress_display', False)
+        self.api_manager.log_task_details = config.get('telemetry', {}).get('log_task_details', True)
+        
+        # Truncated responses: complete rows are always kept; a continuation request for the rest is optional
+        self.api_manager.continue_truncated = config.get('truncation', {}).get('continue', False)
+        self.telemetry = None
+        # Streaming runs several batches at once; run statistics are updated under this lock
+        self._stats_lock = threading.Lock()
+        
+        # Live evaluation: running accuracy/F1 of labelled records as they complete, optional early abort
+        self.abort_below = config.get('live_evaluation', {}).get('abort_below', None)
+        self.abort_min_records = config.get('live_evaluation', {}).get('min_records', 50)
+        self.live_evaluation = config.get('live_evaluation', {}).get('enabled', False) or self.abort_below is not None
+        self.live_evaluator = None
         
         # === POML MODIFICATION ===
         self.use_poml = config.get('use_poml', False)
@@ -53,6 +191,9 @@ class DataProcessor:
         logger.info("Data processor initialization complete")
         if self.self_consistency_enabled:
             logger.info(f"Self-consistency enabled: {self.consistency_rounds} rounds, strategy: {self.consistency_strategy}")
+            if self.adaptive_consistency:
+                logger.info(f"Adaptive self-consistency: min {self.consistency_policy.min_rounds} rounds, "
+                            f"{self.consistency_policy.level}-level agreement >= {self.consistency_policy.threshold}")
         # === POML MODIFICATION ===
         if self.use_poml:
             logger.info(f"POML mode enabled, using file: {self.poml_file}")
@@ -64,64 +205,144 @@ class DataProcessor:
                          progress_callback=None, 
                          batch_size: int = 50) -> Dict[str, Any]:
         """Process complete flow for JSON file"""
+        if self.streaming:
+            return self.process_json_stream(input_file, output_file, prompt, progress_callback, batch_size)
+        
         logger.info(f"Starting processing: {input_file} -> {output_file}")
+        self.default_category = category_from_path(input_file)
         
         # 1. Read data
         records = self._load_records(input_file)
         logger.info(f"Read {len(records)} records")
         
-        # 2. Prepare output file directory
-        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        input_records = records
+        if self.dedup:
+            records, dedup_groups = deduplicate_records(input_records)
+            logger.info(f"Deduplicated {len(input_records)} records to {len(records)} unique NOTAM texts")
         
-        # 3. Process in batches
-        processed_records = []
-        total_success_count = 0
+        unique_records = records
+        schedule_order = None
+        if self.scheduling == 'lpt':
+            schedule_order = lpt_order([self.cost_estimator.estimate(record, self._record_category(record)) for record in records])
+            records = [records[i] for i in schedule_order]
+        
+        metrics_server, display = self._start_telemetry(len(records))
+        if self.telemetry:
+            progress_callback = self.telemetry.wrap_progress(progress_callback)
         
-        for batch_start in range(0, len(records), batch_size):
-            batch_end = min(batch_start + batch_size, len(records))
-            batch_records = records[batch_start:batch_end]
+        try:
+            # 2. Prepare output file directory
+            os.makedirs(os.path.dirname(output_file), exist_ok=True)
             
-            logger.info(f"Processing batch {batch_start//batch_size + 1}: records {batch_start+1}-{batch_end}/{len(records)}")
+            # 3. Process in batches
+            processed_records = []
+            total_success_count = 0
+            blob_store = BlobStore.for_output(output_file) if self.compact_output else None
+            self.live_evaluator = IncrementalEvaluator(self.abort_below, self.abort_min_records) if self.live_evaluation else None
+            aborted = False
             
-            # === POML MODIFICATION ===
-            if self.use_poml:
-                batch_processed, batch_success = self._process_batch_poml(
-                    batch_records, batch_start, len(records), progress_callback
+            for batch_start in range(0, len(records), batch_size):
+                batch_end = min(batch_start + batch_size, len(records))
+                batch_records = records[batch_start:batch_end]
+                
+                logger.info(f"Processing batch {batch_start//batch_size + 1}: records {batch_start+1}-{batch_end}/{len(records)}")
+                
+                batch_processed, batch_success = self._dispatch_batch(
+                    batch_records, prompt, batch_start, len(records), progress_callback, blob_store
                 )
-            else:
-                batch_processed, batch_success = self._process_batch(
-                    batch_records, prompt, batch_start, len(records), progress_callback
-                )
-            # === END MODIFICATION ===
+                
+                processed_records.extend(batch_processed)
+                total_success_count += batch_success
+                if self.scheduling == 'lpt':
+                    self._observe_costs(batch_processed)
+                if self.telemetry:
+                    self.telemetry.record_batch(len(processed_records), total_success_count)
+                
+                # Incremental save
+                self._save_progress(output_file, processed_records, total_success_count, len(records))
+                
+                logger.info(f"Batch complete: {batch_success}/{len(batch_records)} successful, cumulative: {total_success_count}/{len(processed_records)}")
+                if self._evaluate_batch(batch_processed):
+                    aborted = True
+                    break
             
-            processed_records.extend(batch_processed)
-            total_success_count += batch_success
+            if aborted:
+                # Partial output: the records processed so far, in dispatch order and not fanned out to duplicates
+                records = processed_records
+            elif schedule_order is not None:
+                # Output stays in input order whatever order the records were dispatched in
+                processed_records = restore_order(processed_records, schedule_order)
+                records = unique_records
             
-            # Incremental save
-            self._save_progress(output_file, processed_records, total_success_count, len(records))
+            if self.dedup and not aborted:
+                processed_records = fan_out_results(input_records, dedup_groups, records, processed_records)
+                total_success_count = sum(1 for record in processed_records if self._is_success(record))
+                records = input_records
             
-            logger.info(f"Batch complete: {batch_success}/{len(batch_records)} successful, cumulative: {total_success_count}/{len(processed_records)}")
-        
-        # 4. Save final result
-        final_output_data = {
-            'metadata': ProcessingBatch.create_metadata(
-                total_records=len(processed_records),
-                processing_type='api_processing',
-                success_count=total_success_count
-            ),
-            'records': processed_records,
-            'api_stats': self.api_manager.get_stats()
-        }
-        
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(final_output_data, f, ensure_ascii=False, indent=2, default=str)
+            parquet_stats = None
+            if self.parquet_dir:
+                exporter = self._create_parquet_exporter(input_file, output_file)
+                exporter.add_records(processed_records)
+                parquet_stats = exporter.close()
+            
+            # 4. Save final result
+            final_output_data = {
+                'metadata': ProcessingBatch.create_metadata(
+                    total_records=len(processed_records),
+                    processing_type='api_processing',
+                    success_count=total_success_count
+                ),
+                'records': processed_records,
+                'api_stats': self.api_manager.get_stats()
+            }
+            if self.self_consistency_enabled and self.adaptive_consistency:
+                final_output_data['consistency_stats'] = self.get_consistency_report()
+            if self.multi_sample_stats['requests']:
+                final_output_data['multi_sample_stats'] = self.get_multi_sample_report()
+            if self.cascade_policy:
+                final_output_data['cascade_stats'] = self.get_cascade_report()
+            if self.structured_output:
+                final_output_data['schema_stats'] = dict(self.schema_stats)
+            if self.fast_path:
+                final_output_data['fast_path_stats'] = self.fast_path.get_stats()
+            if self.router:
+                final_output_data['routing_stats'] = self.get_routing_report()
+            if self.fewshot:
+                final_output_data['fewshot_stats'] = self.fewshot.get_stats()
+            if blob_store:
+                final_output_data['blob_store'] = blob_store.get_stats()
+            if self.dedup:
+                final_output_data['dedup_stats'] = dedup_stats(dedup_groups)
+            if parquet_stats:
+                final_output_data['parquet_export'] = parquet_stats
+            if self.live_evaluator:
+                final_output_data['live_evaluation'] = self.get_live_evaluation_report(aborted)
+            
+            self.serializer.dump(final_output_data, output_file)
+        finally:
+            # Also on errors: the metrics server and progress display must not outlive the run
+            self._stop_telemetry(metrics_server, display)
         
         logger.info(f"Processing complete: {total_success_count}/{len(records)} successful")
+        if self.self_consistency_enabled and self.adaptive_consistency:
+            self.print_consistency_report()
+        if self.multi_sample_stats['requests']:
+            self.print_multi_sample_report()
+        if self.cascade_policy:
+            print_cascade_report(self.get_cascade_report())
+        if self.structured_output:
+            logger.info(f"Schema validation: {self.schema_stats}")
+        if self.fast_path:
+            logger.info(f"Rule fast path: {self.fast_path.get_stats()}")
+        if self.router:
+            logger.info(f"Category routing: {self.get_routing_report()}")
         
-        # 5. Output evaluation report
-        print_evaluation_report(output_file)
+        # 5. Output evaluation report (from memory; cached for later leaderboards)
+        evaluation = print_evaluation_report(output_file, records=processed_records)
+        if self.evaluation_cache:
+            EvaluationService(self.evaluation_cache).store(output_file, evaluation)
         
-        return {
+        result = {
             'input_file': input_file,
             'output_file': output_file,
             'total_records': len(records),
@@ -129,11 +350,473 @@ class DataProcessor:
             'success_rate': total_success_count / len(records) if records else 0,
             'api_stats': self.api_manager.get_stats()
         }
+        if self.self_consistency_enabled and self.adaptive_consistency:
+            result['consistency_stats'] = self.get_consistency_report()
+        if self.multi_sample_stats['requests']:
+            result['multi_sample_stats'] = self.get_multi_sample_report()
+        if self.cascade_policy:
+            result['cascade_stats'] = self.get_cascade_report()
+        if self.structured_output:
+            result['schema_stats'] = dict(self.schema_stats)
+        if self.fast_path:
+            result['fast_path_stats'] = self.fast_path.get_stats()
+        if self.router:
+            result['routing_stats'] = self.get_routing_report()
+        if self.fewshot:
+            result['fewshot_stats'] = self.fewshot.get_stats()
+        if self.dedup:
+            result['dedup_stats'] = dedup_stats(dedup_groups)
+        if self.live_evaluator:
+            result['live_evaluation'] = self.get_live_evaluation_report(aborted)
+        return result
+    
+    def process_json_stream(self,
+                            input_file: str,
+                            output_file: str,
+                            prompt: str = None,
+                            progress_callback=None,
+                            batch_size: int = 50) -> Dict[str, Any]:
+        """
+        Constant-memory variant of process_json_file: records are read incrementally,
+        at most streaming_depth batches are in flight, and finished batches are appended
+        to the output in input order. The output file itself is the progress file.
+        """
+        logger.info(f"Starting streaming processing: {input_file} -> {output_file}")
+        self.default_category = category_from_path(input_file)
+        if self.dedup or self.scheduling == 'lpt':
+            # Both need the whole input up front
+            logger.warning("Deduplication and LPT scheduling are not available in streaming mode; ignored")
+        
+        os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+        # Opened first: an unsupported output (e.g. .zst without zstandard) fails before any work starts
+        writer = StreamingRecordWriter(output_file, self.serializer)
+        
+        metrics_server, display = self._start_telemetry(0)
+        if self.telemetry:
+            progress_callback = self.telemetry.wrap_progress(progress_callback)
+        
+        blob_store = BlobStore.for_output(output_file) if self.compact_output else None
+        exporter = self._create_parquet_exporter(input_file, output_file) if self.parquet_dir else None
+        total_records = 0
+        total_success_count = 0
+        in_flight = deque()
+        # The output is never held in memory, so the final evaluation comes from the running counts
+        self.live_evaluator = IncrementalEvaluator(self.abort_below, self.abort_min_records)
+        reset_canonical_stats()
+        aborted = False
+        
+        def drain_oldest():
+            nonlocal total_success_count, aborted
+            batch_processed, batch_success = in_flight.popleft().result()
+            writer.write(batch_processed)
+            if exporter:
+                exporter.add_records(batch_processed)
+            total_success_count += batch_success
+            if self.telemetry:
+                self.telemetry.record_batch(writer.count, total_success_count)
+            logger.info(f"Batch written: {batch_success}/{len(batch_processed)} successful, "
+                        f"cumulative: {total_success_count}/{writer.count}")
+            aborted = self._evaluate_batch(batch_processed) or aborted
+        
+        try:
+            with ThreadPoolExecutor(max_workers=self.streaming_depth) as executor:
+                for batch_records in iter_batches(iter_records(input_file), batch_size):
+                    # Bounded window: wait for the oldest batch before reading further
+                    while len(in_flight) >= self.streaming_depth:
+                        drain_oldest()
+                    if aborted:
+                        # Batches already in flight are still written; nothing new is read
+                        break
+                    logger.info(f"Processing batch {total_records//batch_size + 1}: records {total_records+1}-{total_records+len(batch_records)}")
+                    in_flight.append(executor.submit(
+                        self._dispatch_batch, batch_records, prompt, total_records, 0, progress_callback, blob_store
+                    ))
+                    total_records += len(batch_records)
+                while in_flight:
+                    drain_oldest()
+            
+            trailer = {
+                'metadata': ProcessingBatch.create_metadata(
+                    total_records=writer.count,
+                    processing_type='api_processing',
+                    success_count=total_success_count
+                ),
+                'api_stats': self.api_manager.get_stats()
+            }
+            if self.self_consistency_enabled and self.adaptive_consistency:
+                trailer['consistency_stats'] = self.get_consistency_report()
+            if self.multi_sample_stats['requests']:
+                trailer['multi_sample_stats'] = self.get_multi_sample_report()
+            if self.cascade_policy:
+                trailer['cascade_stats'] = self.get_cascade_report()
+            if self.structured_output:
+                trailer['schema_stats'] = dict(self.schema_stats)
+            if self.fast_path:
+                trailer['fast_path_stats'] = self.fast_path.get_stats()
+            if self.router:
+                trailer['routing_stats'] = self.get_routing_report()
+            if self.fewshot:
+                trailer['fewshot_stats'] = self.fewshot.get_stats()
+            if blob_store:
+                trailer['blob_store'] = blob_store.get_stats()
+            if exporter:
+                trailer['parquet_export'] = exporter.close()
+            if self.live_evaluation:
+                trailer['live_evaluation'] = self.get_live_evaluation_report(aborted)
+            writer.close(trailer)
+        finally:
+            self._stop_telemetry(metrics_server, display)
+        logger.info(f"Processing complete: {total_success_count}/{total_records} successful")
+        if self.self_consistency_enabled and self.adaptive_consistency:
+            self.print_consistency_report()
+        if self.multi_sample_stats['requests']:
+            self.print_multi_sample_report()
+        if self.cascade_policy:
+            print_cascade_report(self.get_cascade_report())
+        if self.structured_output:
+            logger.info(f"Schema validation: {self.schema_stats}")
+        if self.fast_path:
+            logger.info(f"Rule fast path: {self.fast_path.get_stats()}")
+        if self.router:
+            logger.info(f"Category routing: {self.get_routing_report()}")
+        
+        # Evaluation report from the running counts; the streamed output is not reloaded
+        evaluation = print_evaluation_report(output_file, results=self.live_evaluator.field_metrics())
+        if self.evaluation_cache:
+            EvaluationService(self.evaluation_cache).store(output_file, evaluation)
+        
+        result = {
+            'input_file': input_file,
+            'output_file': output_file,
+            'total_records': total_records,
+            'success_count': total_success_count,
+            'success_rate': total_success_count / total_records if total_records else 0,
+            'api_stats': self.api_manager.get_stats()
+        }
+        if self.self_consistency_enabled and self.adaptive_consistency:
+            result['consistency_stats'] = self.get_consistency_report()
+        if self.multi_sample_stats['requests']:
+            result['multi_sample_stats'] = self.get_multi_sample_report()
+        if self.cascade_policy:
+            result['cascade_stats'] = self.get_cascade_report()
+        if self.structured_output:
+            result['schema_stats'] = dict(self.schema_stats)
+        if self.fast_path:
+            result['fast_path_stats'] = self.fast_path.get_stats()
+        if self.router:
+            result['routing_stats'] = self.get_routing_report()
+        if self.fewshot:
+            result['fewshot_stats'] = self.fewshot.get_stats()
+        if self.live_evaluation:
+            result['live_evaluation'] = self.get_live_evaluation_report(aborted)
+        return result
+    
+    def _process_batch_mode(self, batch_records: List[Dict], prompt: str, batch_start: int,
+                            total_records: int, progress_callback,
+                            client_name: Optional[str] = None) -> tuple[List[Dict], int]:
+        """
+        Process one batch on one API client with the configured mode. With structured output,
+        parsed results are validated against the category schema and only the records that
+        fail validation are sent again.
+        """
+        processed, success_count = self._process_batch_once(
+            batch_records, prompt, batch_start, total_records, progress_callback, client_name
+        )
+        if not self.structured_output:
+            return processed, success_count
+        
+        invalid = self._validate_batch(processed)
+        with self._stats_lock:
+            self.schema_stats['validated'] += sum(1 for record in processed if self._is_success(record))
+            self.schema_stats['invalid'] += len(invalid)
+        for attempt in range(self.schema_retries):
+            if not invalid:
+                break
+            logger.info(f"Schema validation: retrying {len(invalid)} invalid records (attempt {attempt + 1}/{self.schema_retries})")
+            with self._stats_lock:
+                self.schema_stats['retried'] += len(invalid)
+            retried, _ = self._process_batch_once(
+                [batch_records[i] for i in invalid], prompt, batch_start, total_records, None, client_name
+            )
+            for i, record in zip(invalid, retried):
+                # A failed retry does not replace a parsed (if invalid) result
+                if self._is_success(record) or not self._is_success(processed[i]):
+                    processed[i] = record
+            still_invalid = self._validate_batch(processed, invalid)
+            with self._stats_lock:
+                self.schema_stats['repaired'] += len(invalid) - len(still_invalid)
+            invalid = still_invalid
+        
+        for i in invalid:
+            processed[i]['schema_errors'] = self._schema_errors(processed[i])[:10]
+        with self._stats_lock:
+            self.schema_stats['invalid_final'] += len(invalid)
+        return processed, sum(1 for record in processed if self._is_success(record))
+    
+    def _schema_errors(self, record: Dict) -> List[str]:
+        return validate_parse_fields(record['parse_fields'], self._record_category(record))
+    
+    def _validate_batch(self, processed: List[Dict], indices: Optional[List[int]] = None) -> List[int]:
+        """Indices of parsed records whose parse_fields violate the category schema"""
+        indices = range(len(processed)) if indices is None else indices
+        return [i for i in indices if self._is_success(processed[i]) and self._schema_errors(processed[i])]
+    
+    def _process_batch_once(self, batch_records: List[Dict], prompt: str, batch_start: int,
+                            total_records: int, progress_callback,
+                            client_name: Optional[str] = None) -> tuple[List[Dict], int]:
+        """Dispatch a batch to the processing method of the configured mode"""
+        # === POML MODIFICATION ===
+        if self.self_consistency_enabled and (self.adaptive_consistency or self.api_manager.supports_multi_sample(client_name)):
+            return self._process_batch_rounds(
+                batch_records, prompt, batch_start, total_records, progress_callback, client_name
+            )
+        elif self.use_poml:
+            return self._process_batch_poml(
+                batch_records, batch_start, total_records, progress_callback, client_name
+            )
+        else:
+            return self._process_batch(
+                batch_records, prompt, batch_start, total_records, progress_callback, client_name
+            )
+        # === END MODIFICATION ===
+    
+    def _process_batch_cascade(self, batch_records: List[Dict], prompt: str, batch_start: int,
+                               total_records: int, progress_callback) -> tuple[List[Dict], int]:
+        """
+        Model cascade: every record starts on the first tier of its category and moves to the
+        next tier while the local checks reject its result; the last tier's result is kept.
+        """
+        final_records: List[Optional[Dict]] = [None] * len(batch_records)
+        escalations = {i: [] for i in range(len(batch_records))}
+        pending = list(range(len(batch_records)))
+        level = 0
+        
+        while pending:
+            # Records of different categories may be on different tiers at the same level
+            by_tier: Dict[str, List[int]] = {}
+            for i in pending:
+                by_tier.setdefault(self.cascade_policy.tiers_for(self._record_category(batch_records[i]))[level], []).append(i)
+            
+            pending = []
+            for tier, indices in by_tier.items():
+                logger.info(f"Cascade tier {level + 1} ({tier}): {len(indices)} records")
+                with self._stats_lock:
+                    self.cascade_stats['tier_attempts'][tier] += len(indices)
+                processed, _ = self._process_batch_mode(
+                    [batch_records[i] for i in indices], prompt, batch_start, total_records, progress_callback, tier
+                )
+                for i, record in zip(indices, processed):
+                    category = self._record_category(batch_records[i])
+                    reason = self.cascade_policy.check(record, category) if 'raw_text' in batch_records[i] else None
+                    is_last = level + 1 >= len(self.cascade_policy.tiers_for(category))
+                    if reason and not is_last:
+                        escalations[i].append({'tier': tier, 'reason': reason})
+                        with self._stats_lock:
+                            self.cascade_stats['reasons'][reason] += 1
+                        pending.append(i)
+                        continue
+                    record['cascade_info'] = {'tier': tier, 'level': level, 'escalations': escalations[i]}
+                    if reason:
+                        record['cascade_info']['unresolved'] = reason
+                    final_records[i] = record
+                    with self._stats_lock:
+                        self.cascade_stats['final_tier'][tier] += 1
+            level += 1
+        
+        accurate, evaluated = count_accurate_fields(final_records)
+        with self._stats_lock:
+            self.cascade_stats['records'] += len(batch_records)
+            self.cascade_stats['escalated'] += sum(1 for steps in escalations.values() if steps)
+            self.cascade_stats['accurate_fields'] += accurate
+            self.cascade_stats['evaluated_fields'] += evaluated
+        return final_records, sum(1 for record in final_records if self._is_success(record))
+    
+    def _record_category(self, record: Dict) -> Optional[str]:
+        """Category of a record (its own field, else the one named by the input file)"""
+        return record.get('category') or self.default_category
+    
+    def get_cascade_report(self) -> Dict[str, Any]:
+        """Escalation rate, per-tier usage and cost per accurate field"""
+        return cascade_report(self.cascade_stats, self.cascade_policy, self.api_manager.client_stats)
+    
+    def _create_parquet_exporter(self, input_file: str, output_file: str) -> ParquetExporter:
+        """Parquet sink for this run (run partition = output file stem)"""
+        return ParquetExporter(self.parquet_dir, run_id=Path(output_file).stem,
+                               default_category=category_from_path(input_file))
+    
+    def _dispatch_batch(self, batch_records: List[Dict], prompt: str, batch_start: int,
+                        total_records: int, progress_callback, blob_store=None) -> tuple[List[Dict], int]:
+        """Process one batch with the configured mode, compacting records if a blob store is given"""
+        if self.router:
+            batch_records = [self._route_record(record) for record in batch_records]
+        
+        answered = {}
+        if self.fast_path:
+            for i, record in enumerate(batch_records):
+                processed = self.fast_path.try_parse(record, self._record_category(record))
+                if processed is not None:
+                    answered[i] = processed
+        remaining = [record for i, record in enumerate(batch_records) if i not in answered]
+        
+        batch_processed, batch_success = [], 0
+        if remaining and self.router:
+            batch_processed, batch_success = self._process_routed(
+                remaining, prompt, batch_start, total_records, progress_callback
+            )
+        elif remaining:
+            batch_processed, batch_success = self._process_records(
+                remaining, prompt, batch_start, total_records, progress_callback
+            )
+        
+        if answered:
+            # Merge fast-path answers back in input order
+            api_processed = iter(batch_processed)
+            batch_processed = [answered[i] if i in answered else next(api_processed) for i in range(len(batch_records))]
+            batch_success += len(answered)
+        
+        if blob_store:
+            batch_processed = [compact_record(record, blob_store) for record in batch_processed]
+        return batch_processed, batch_success
+    
+    def _process_records(self, batch_records: List[Dict], prompt: str, batch_start: int,
+                         total_records: int, progress_callback) -> tuple[List[Dict], int]:
+        """API processing of records through the cascade or the configured mode"""
+        if self.cascade_policy:
+            return self._process_batch_cascade(batch_records, prompt, batch_start, total_records, progress_callback)
+        return self._process_batch_mode(batch_records, prompt, batch_start, total_records, progress_callback)
+    
+    def _route_record(self, record: Dict) -> Dict:
+        """Copy of the record with its routed category (records that carry a category are kept as is)"""
+        with self._stats_lock:
+            self.routing_stats['records'] += 1
+        if record.get('category') or not isinstance(record.get('raw_text'), str):
+            return record
+        start = time.perf_counter()
+        routes = self.router.route(record['raw_text'])
+        with self._stats_lock:
+            self.routing_stats['seconds'] += time.perf_counter() - start
+            self.routing_stats['routed'] += 1
+            self.routing_stats['categories'][routes[0][0]] += 1
+            if len(routes) > 1:
+                self.routing_stats['multi_label'] += 1
+        return {
+            **record,
+            'category': routes[0][0],
+            'routing': {'categories': [c for c, _ in routes], 'probabilities': {c: round(p, 4) for c, p in routes}}
+        }
+    
+    def _process_routed(self, batch_records: List[Dict], prompt: str, batch_start: int,
+                        total_records: int, progress_callback) -> tuple[List[Dict], int]:
+        """
+        Process routed records one category group at a time with that category's prompt
+        (the given prompt is the fallback). Records routed to further categories are parsed
+        again under each of them; those results go to secondary_parse_fields.
+        """
+        groups: Dict[Optional[str], List[tuple]] = {}
+        for i, record in enumerate(batch_records):
+            groups.setdefault(self._record_category(record), []).append((i, record))
+            for category in (record.get('routing') or {}).get('categories', [])[1:]:
+                groups.setdefault(category, []).append((i, {**record, 'category': category}))
+        
+        processed: List[Optional[Dict]] = [None] * len(batch_records)
+        secondary: Dict[int, Dict[str, Any]] = {}
+        batch_success = 0
+        for category, members in groups.items():
+            group_records = [record for _, record in members]
+            group_processed, _ = self._process_records(
+                group_records, CATEGORY_PROMPTS.get(category, prompt), batch_start, total_records, progress_callback
+            )
+            for (i, record), result in zip(members, group_processed):
+                if record is batch_records[i]:
+                    processed[i] = result
+                    batch_success += self._is_success(result)
+                else:
+                    secondary.setdefault(i, {})[category] = result.get('parse_fields')
+        for i, fields in secondary.items():
+            processed[i] = {**processed[i], 'secondary_parse_fields': fields}
+        return processed, batch_success
+    
+    def get_routing_report(self) -> Dict[str, Any]:
+        stats = self.routing_stats
+        return {
+            **stats,
+            'categories': dict(stats['categories']),
+            'us_per_record': stats['seconds'] / stats['routed'] * 1e6 if stats['routed'] else 0.0
+        }
+    
+    def _evaluate_batch(self, batch_processed: List[Dict]) -> bool:
+        """Feed completed records to the live evaluator; True when the run should be aborted"""
+        if not self.live_evaluator:
+            return False
+        for record in batch_processed:
+            self.live_evaluator.update(record)
+        summary = self.live_evaluator.summary()
+        if self.telemetry:
+            self.telemetry.record_evaluation(summary['accuracy'], summary['f1'])
+        if summary['accuracy'] is not None:
+            logger.info(f"Live evaluation: {summary['records']} labelled records, "
+                        f"accuracy {summary['accuracy']:.1%}, F1 {summary['f1']:.1%}")
+        if self.live_evaluator.aborted:
+            # Batches that were already in flight when the run was stopped
+            return True
+        if self.live_evaluator.should_abort():
+            logger.error(f"Aborting run: accuracy {summary['accuracy']:.1%} below {self.abort_below:.1%} "
+                         f"after {summary['records']} labelled records")
+            return True
+        return False
+    
+    def get_live_evaluation_report(self, aborted: bool = False) -> Dict[str, Any]:
+        """Live evaluation summary, per-field metrics and whether the run was aborted"""
+        return {
+            **self.live_evaluator.summary(),
+            'abort_below': self.abort_below,
+            'aborted': aborted,
+            'field_metrics': self.live_evaluator.field_metrics()
+        }
+    
+    def _start_telemetry(self, total_records: int) -> tuple:
+        """Create run telemetry and start the metrics endpoint / progress display if configured"""
+        if not self.metrics_port and not self.progress_display:
+            return None, None
+        
+        self.telemetry = RunTelemetry()
+        self.telemetry.set_total(total_records)
+        self.api_manager.telemetry = self.telemetry
+        
+        metrics_server = None
+        if self.metrics_port:
+            metrics_server = MetricsServer(self.telemetry, self.metrics_port)
+            metrics_server.start()
+        display = None
+        if self.progress_display:
+            display = ProgressDisplay(self.telemetry)
+            display.start()
+        return metrics_server, display
+    
+    def _stop_telemetry(self, metrics_server, display):
+        """Stop telemetry outputs and detach from the API manager"""
+        if display:
+            display.stop()
+        if metrics_server:
+            metrics_server.stop()
+        self.api_manager.telemetry = None
+    
+    def _observe_costs(self, processed: List[Dict]):
+        """Feed observed output sizes back into the per-category cost history"""
+        for record in processed:
+            if self._is_success(record) and isinstance(record.get('raw_text'), str):
+                output_chars = len(json.dumps(record['parse_fields'], ensure_ascii=False, default=str))
+                self.cost_estimator.observe(self._record_category(record), len(record['raw_text']), output_chars)
+    
+    @staticmethod
+    def _is_success(record: Dict) -> bool:
+        """Whether a processed record holds parsed fields rather than an error"""
+        parse_fields = record.get('parse_fields')
+        return parse_fields is not None and not (isinstance(parse_fields, dict) and 'error' in parse_fields)
     
     def _load_records(self, input_file: str) -> List[Dict]:
         """Load records - Handle different JSON structures uniformly"""
-        with open(input_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = self.serializer.load(input_file)
         
         if isinstance(data, dict) and 'records' in data:
             return data['records']
@@ -144,7 +827,8 @@ class DataProcessor:
     
     # === POML MODIFICATION ===
     def _process_batch_poml(self, batch_records: List[Dict], 
-                           batch_start: int, total_records: int, progress_callback) -> tuple[List[Dict], int]:
+                           batch_start: int, total_records: int, progress_callback,
+                           client_name: Optional[str] = None) -> tuple[List[Dict], int]:
         """Process a single batch in POML mode"""
         batch_requests = []
         batch_indices = []
@@ -159,7 +843,8 @@ class DataProcessor:
                             'input_text': item['raw_text'],
                             'max_retries': 3,
                             'original_index': i,
-                            'round': round_idx
+                            'round': round_idx,
+                            **self._structured_output_params(item, client_name)
                         })
                 else:
                     batch_requests.append({
@@ -168,7 +853,8 @@ class DataProcessor:
                         'input_text': item['raw_text'],
                         'max_retries': 3,
                         'original_index': i,
-                        'round': 0
+                        'round': 0,
+                        **self._structured_output_params(item, client_name)
                     })
                 batch_indices.append(i)
         
@@ -180,7 +866,8 @@ class DataProcessor:
             if progress_callback:
                 progress_callback(overall_completed, total_records)
         
-        api_results = self.api_manager.batch_call(batch_requests, progress_callback=batch_progress_wrapper) if batch_requests else []
+        api_results = self.api_manager.batch_call(batch_requests, progress_callback=batch_progress_wrapper,
+                                                  client_name=client_name) if batch_requests else []
         
         processed_records = []
         success_count = 0
@@ -204,6 +891,7 @@ class DataProcessor:
                             result_record['consistency_info'] = {
                                 'rounds': len(round_results),
                                 'strategy': self.consistency_strategy,
+                                **(best_result['consensus'] or {}),
                                 'all_results': [r['result'] for r in round_results]
                             }
                             success_count += 1
@@ -224,6 +912,9 @@ class DataProcessor:
                             parsed_fields = api_result['result']['data']
                             if parsed_fields is not None:
                                 result_record['parse_fields'] = parsed_fields
+                                if api_result['result'].get('partial'):
+                                    # Truncated response: only the complete rows were kept
+                                    result_record['partial'] = True
                                 success_count += 1
                             else:
                                 result_record['parse_fields'] = {
@@ -241,7 +932,8 @@ class DataProcessor:
     # === END POML MODIFICATION ===
     
     def _process_batch(self, batch_records: List[Dict], prompt: str, 
-                      batch_start: int, total_records: int, progress_callback) -> tuple[List[Dict], int]:
+                      batch_start: int, total_records: int, progress_callback,
+                      client_name: Optional[str] = None) -> tuple[List[Dict], int]:
         """Process a single batch (Traditional mode)"""
         # Prepare API requests
         batch_requests = []
@@ -252,19 +944,21 @@ class DataProcessor:
                 if self.self_consistency_enabled:
                     for round_idx in range(self.consistency_rounds):
                         batch_requests.append({
-                            'prompt': prompt,
+                            'prompt': self._record_prompt(item, prompt),
                             'input_text': item['raw_text'],
                             'max_retries': 3,
                             'original_index': i,
-                            'round': round_idx
+                            'round': round_idx,
+                            **self._structured_output_params(item, client_name)
                         })
                 else:
                     batch_requests.append({
-                        'prompt': prompt,
+                        'prompt': self._record_prompt(item, prompt),
                         'input_text': item['raw_text'],
                         'max_retries': 3,
                         'original_index': i,
-                        'round': 0
+                        'round': 0,
+                        **self._structured_output_params(item, client_name)
                     })
                 batch_indices.append(i)
         
@@ -277,7 +971,8 @@ class DataProcessor:
             if progress_callback:
                 progress_callback(overall_completed, total_records)
         
-        api_results = self.api_manager.batch_call(batch_requests, progress_callback=batch_progress_wrapper) if batch_requests else []
+        api_results = self.api_manager.batch_call(batch_requests, progress_callback=batch_progress_wrapper,
+                                                  client_name=client_name) if batch_requests else []
         
         # Process results
         processed_records = []
@@ -302,6 +997,7 @@ class DataProcessor:
                             result_record['consistency_info'] = {
                                 'rounds': len(round_results),
                                 'strategy': self.consistency_strategy,
+                                **(best_result['consensus'] or {}),
                                 'all_results': [r['result'] for r in round_results]
                             }
                             success_count += 1
@@ -322,6 +1018,9 @@ class DataProcessor:
                             parsed_fields = api_result['result']['data']
                             if parsed_fields is not None:
                                 result_record['parse_fields'] = parsed_fields
+                                if api_result['result'].get('partial'):
+                                    # Truncated response: only the complete rows were kept
+                                    result_record['partial'] = True
                                 success_count += 1
                             else:
                                 result_record['parse_fields'] = {
@@ -337,6 +1036,215 @@ class DataProcessor:
         
         return processed_records, success_count
     
+    def _process_batch_rounds(self, batch_records: List[Dict], prompt: str,
+                              batch_start: int, total_records: int, progress_callback,
+                              client_name: Optional[str] = None) -> tuple[List[Dict], int]:
+        """
+        Process a single batch with self-consistency rounds issued in waves.
+        Adaptive mode keeps issuing waves for contested records; fixed mode is a single wave.
+        """
+        policy = self.consistency_policy if self.adaptive_consistency else self.fixed_policy
+        round_results = {i: [] for i, item in enumerate(batch_records) if 'raw_text' in item}
+        active = list(round_results.keys())
+        
+        while active:
+            wave = [(i, batch_records[i], len(round_results[i]), policy.next_rounds(round_results[i])) for i in active]
+            wave = [entry for entry in wave if entry[3] > 0]
+            if not wave:
+                break
+            
+            logger.info(f"Self-consistency wave: {sum(entry[3] for entry in wave)} rounds for {len(wave)} records")
+            for i, results in self._call_rounds(wave, prompt, client_name).items():
+                round_results[i].extend(results)
+            
+            active = [i for i in active if not policy.is_settled(round_results[i])]
+            if progress_callback:
+                progress_callback(batch_start + len(round_results) - len(active), total_records)
+        
+        processed_records = []
+        success_count = 0
+        
+        for i, original in enumerate(batch_records):
+            result_record = original.copy()
+            
+            if i in round_results:
+                rounds = round_results[i]
+                with self._stats_lock:
+                    self.consistency_stats['records'] += 1
+                    self.consistency_stats['fixed_round_calls'] += self.consistency_rounds
+                    if len(rounds) < self.consistency_rounds:
+                        self.consistency_stats['early_stopped'] += 1
+                    if len(rounds) > self.consistency_policy.min_rounds:
+                        self.consistency_stats['contested'] += 1
+                
+                best_result = self._apply_consistency_strategy(rounds)
+                if best_result and best_result['result'].get('success'):
+                    parsed_fields = best_result['result']['data']
+                    if parsed_fields is not None:
+                        result_record['parse_fields'] = parsed_fields
+                        result_record['consistency_info'] = {
+                            'rounds': len(rounds),
+                            'strategy': self.consistency_strategy,
+                            'adaptive': self.adaptive_consistency,
+                            **(best_result['consensus'] or {}),
+                            'all_results': [r['result'] for r in rounds]
+                        }
+                        success_count += 1
+                    else:
+                        result_record['parse_fields'] = {
+                            'error': 'Self-consistency returned empty data',
+                            'consistency_info': {'rounds': len(rounds)}
+                        }
+                else:
+                    result_record['parse_fields'] = {
+                        'error': 'Self-consistency failed',
+                        'consistency_info': {'rounds': len(rounds)}
+                    }
+            else:
+                result_record['parse_fields'] = {'error': 'Missing raw_text field'}
+            
+            processed_records.append(result_record)
+        
+        return processed_records, success_count
+    
+    def _call_rounds(self, wave: List[tuple], prompt: str, client_name: Optional[str] = None) -> Dict[int, List[Dict]]:
+        """
+        Issue `count` rounds for every (index, item, first_round, count) entry of a wave.
+        When the provider supports `n`, each record gets one multi-sample request whose choices
+        become its rounds; rounds not returned that way fall back to separate calls.
+        """
+        round_results = {index: [] for index, _, _, _ in wave}
+        
+        multi_sample_wave = [entry for entry in wave if entry[3] > 1] if self.api_manager.supports_multi_sample(client_name) else []
+        if multi_sample_wave:
+            requests = [
+                {**self._build_request(item, prompt, index, first_round, client_name), 'n': count}
+                for index, item, first_round, count in multi_sample_wave
+            ]
+            api_results = self.api_manager.batch_call(requests, client_name=client_name)
+            with self._stats_lock:
+                self.consistency_stats['api_calls'] += len(api_results)
+            for (index, _, _, count), api_result in zip(multi_sample_wave, api_results):
+                round_results[index].extend(self._split_choices(api_result, count))
+        
+        multi_sample_indices = {entry[0] for entry in multi_sample_wave}
+        separate_requests = []
+        separate_indices = []
+        for index, item, first_round, count in wave:
+            returned = len(round_results[index])
+            for round_idx in range(first_round + returned, first_round + count):
+                separate_requests.append(self._build_request(item, prompt, index, round_idx, client_name))
+                separate_indices.append(index)
+        
+        if separate_requests:
+            api_results = self.api_manager.batch_call(separate_requests, client_name=client_name)
+            with self._stats_lock:
+                self.consistency_stats['api_calls'] += len(api_results)
+                self.multi_sample_stats['fallback_calls'] += sum(1 for index in separate_indices if index in multi_sample_indices)
+            for index, api_result in zip(separate_indices, api_results):
+                round_results[index].append(api_result)
+        
+        return round_results
+    
+    def _split_choices(self, api_result: Dict, count: int) -> List[Dict]:
+        """Map the choices of a multi-sample response to round results"""
+        result = api_result['result']
+        choices = result.get('choices')
+        if not result.get('success') or not choices:
+            return []
+        
+        usage = result.get('usage') or {}
+        samples = choices[:count]
+        stats = self.multi_sample_stats
+        with self._stats_lock:
+            stats['requests'] += 1
+            stats['samples'] += len(samples)
+            stats['prompt_tokens_saved'] += (usage.get('prompt_tokens') or 0) * (len(samples) - 1)
+            stats['request_seconds'] += result.get('latency') or 0.0
+            stats['estimated_separate_seconds'] += (result.get('latency') or 0.0) * len(samples)
+        
+        # Usage is reported once per request, so it is attached to the first sample only
+        return [
+            {**api_result, 'result': {**choice, 'usage': usage if round_idx == 0 else None}}
+            for round_idx, choice in enumerate(samples)
+        ]
+    
+    def _build_request(self, item: Dict, prompt: str, index: int, round_idx: int,
+                       client_name: Optional[str] = None) -> Dict[str, Any]:
+        """Build a single API request for a record in the active mode (traditional or POML)"""
+        if self.use_poml:
+            return {
+                'mode': 'poml',
+                'poml_file': self.poml_file,
+                'input_text': item['raw_text'],
+                'max_retries': 3,
+                'original_index': index,
+                'round': round_idx,
+                **self._structured_output_params(item, client_name)
+            }
+        return {
+            'prompt': self._record_prompt(item, prompt),
+            'input_text': item['raw_text'],
+            'max_retries': 3,
+            'original_index': index,
+            'round': round_idx,
+            **self._structured_output_params(item, client_name)
+        }
+    
+    def _record_prompt(self, item: Dict, prompt: str) -> str:
+        """Prompt for one record: retrieved few-shot prompt when enabled, else the batch prompt"""
+        if not self.fewshot:
+            return prompt
+        return self.fewshot.build_prompt(item['raw_text'], self._record_category(item), fallback=prompt)
+    
+    def _structured_output_params(self, item: Dict, client_name: Optional[str] = None) -> Dict[str, Any]:
+        """Per-request response_format with the category schema, when enabled and supported"""
+        if not self.structured_output or not self.api_manager.supports_json_schema(client_name):
+            return {}
+        category = self._record_category(item)
+        response_format = response_format_for(category) if category else None
+        return {'response_format': response_format} if response_format else {}
+    
+    def get_consistency_report(self) -> Dict[str, Any]:
+        """Calls made by adaptive self-consistency versus fixed-round voting"""
+        stats = self.consistency_stats
+        saved = stats['fixed_round_calls'] - stats['api_calls']
+        return {
+            **stats,
+            'max_rounds': self.consistency_rounds,
+            'min_rounds': self.consistency_policy.min_rounds,
+            'agreement_level': self.consistency_policy.level,
+            'agreement_threshold': self.consistency_policy.threshold,
+            'calls_saved': saved,
+            'calls_saved_rate': saved / stats['fixed_round_calls'] if stats['fixed_round_calls'] else 0
+        }
+    
+    def get_multi_sample_report(self) -> Dict[str, Any]:
+        """Token and latency savings of multi-sample (`n`) requests versus separate calls"""
+        stats = self.multi_sample_stats
+        return {
+            **stats,
+            'calls_saved': stats['samples'] - stats['requests'],
+            'request_seconds_saved': stats['estimated_separate_seconds'] - stats['request_seconds']
+        }
+    
+    def print_consistency_report(self):
+        """Print adaptive self-consistency savings"""
+        report = self.get_consistency_report()
+        print(f"\n=== Adaptive Self-Consistency Report ===")
+        print(f"   Records: {report['records']} (early stopped: {report['early_stopped']}, contested: {report['contested']})")
+        print(f"   API calls: {report['api_calls']} vs {report['fixed_round_calls']} with fixed {report['max_rounds']}-round voting")
+        print(f"   Calls saved: {report['calls_saved']} ({report['calls_saved_rate']:.1%})")
+    
+    def print_multi_sample_report(self):
+        """Print multi-sample (`n`) token and latency savings"""
+        report = self.get_multi_sample_report()
+        print(f"\n=== Multi-Sample Self-Consistency Report ===")
+        print(f"   Requests: {report['requests']} returning {report['samples']} samples "
+              f"({report['calls_saved']} separate calls avoided, {report['fallback_calls']} fallback calls)")
+        print(f"   Prompt tokens saved: {report['prompt_tokens_saved']}")
+        print(f"   Request time: {report['request_seconds']:.1f}s vs ~{report['estimated_separate_seconds']:.1f}s as separate calls")
+    
     def _parse_api_response(self, raw_response):
         """Parse API response - Simplified version"""
         return raw_response if raw_response is not None else None
@@ -362,49 +1270,55 @@ class DataProcessor:
         }
         
         temp_file = output_file.replace('.json', '_progress.json')
-        with open(temp_file, 'w', encoding='utf-8') as f:
-            json.dump(progress_data, f, ensure_ascii=False, indent=2, default=str)
+        self.serializer.dump(progress_data, temp_file)
 
     def _apply_consistency_strategy(self, round_results: List[Dict]) -> Dict:
-        """Apply self-consistency strategy to choose the best result"""
+        """
+        Apply self-consistency strategy to choose the best result.
+        Every strategy returns the same shape: a round result whose 'result' holds the chosen
+        (or synthesized) data, plus 'consensus' with the field-level agreement across rounds.
+        """
         if not round_results:
             return None
         
         successful_results = [r for r in round_results if r['result'].get('success')]
         
         if not successful_results:
-            return round_results[0] if round_results else None
+            return {**round_results[0], 'consensus': None}
+        
+        vote = vote_fields([r['result'].get('data') for r in successful_results])
         
         if self.consistency_strategy == 'majority_vote':
-            return self._majority_vote_strategy(successful_results)
+            chosen = self._majority_vote_strategy(successful_results, vote)
         elif self.consistency_strategy == 'first_success':
-            return successful_results[0]
+            chosen = successful_results[0]
         elif self.consistency_strategy == 'most_confident':
-            return self._most_confident_strategy(successful_results)
+            chosen = self._most_confident_strategy(successful_results)
         else:
             logger.warning(f"Unknown consistency strategy: {self.consistency_strategy}, using majority_vote")
-            return self._majority_vote_strategy(successful_results)
+            chosen = self._majority_vote_strategy(successful_results, vote)
+        
+        return {
+            **chosen,
+            'consensus': {
+                'agreement': vote['agreement'],
+                'field_agreement': vote['field_agreement'],
+                'row_count_agreement': vote['row_count_agreement']
+            }
+        }
     
-    def _majority_vote_strategy(self, results: List[Dict]) -> Dict:
-        """Majority vote strategy"""
+    def _majority_vote_strategy(self, results: List[Dict], vote: Dict[str, Any]) -> Dict:
+        """Majority vote strategy - synthesized record of per-field plurality values"""
         if len(results) == 1:
             return results[0]
         
-        result_scores = {}
-        
-        for i, result_a in enumerate(results):
-            score = 0
-            data_a = result_a['result'].get('data', {})
-            
-            for j, result_b in enumerate(results):
-                if i != j:
-                    data_b = result_b['result'].get('data', {})
-                    score += self._calculate_similarity(data_a, data_b)
-            
-            result_scores[i] = score
-        
-        best_index = max(result_scores, key=result_scores.get)
-        return results[best_index]
+        return {
+            **results[0],
+            'result': {
+                **results[0]['result'],
+                'data': vote['data']
+            }
+        }
     
     def _most_confident_strategy(self, results: List[Dict]) -> Dict:
         """Choose most confident result (based on field completeness)"""
@@ -419,27 +1333,6 @@ class DataProcessor:
             return non_empty_fields * 10 + total_chars
         
         return max(results, key=calculate_confidence)
-    
-    def _calculate_similarity(self, data_a: Dict, data_b: Dict) -> float:
-        """Calculate similarity between two parsing results"""
-        if not isinstance(data_a, dict) or not isinstance(data_b, dict):
-            return 0.0
-        
-        common_keys = set(data_a.keys()) & set(data_b.keys())
-        if not common_keys:
-            return 0.0
-        
-        similarity_score = 0
-        for key in common_keys:
-            val_a = str(data_a.get(key, '')).strip()
-            val_b = str(data_b.get(key, '')).strip()
-            
-            if val_a == val_b:
-                similarity_score += 1
-            elif val_a and val_b:
-                similarity_score += len(set(val_a.split()) & set(val_b.split())) / max(len(val_a.split()), len(val_b.split()))
-        
-        return similarity_score / len(common_keys)
 
 # Convenience functions
 def process_json_with_prompt(input_file: str, output_file: str, prompt: str = None, config: Dict[str, Any] = None,
@@ -473,9 +1366,74 @@ def main():
     parser.add_argument('--consistency-rounds', type=int, default=3, help='Self-consistency rounds (default: 3)')
     parser.add_argument('--consistency-strategy', choices=['majority_vote', 'first_success', 'most_confident'], 
                        default='majority_vote', help='Self-consistency strategy (default: majority_vote)')
+    parser.add_argument('--adaptive-consistency', action='store_true',
+                       help='Issue self-consistency rounds incrementally and stop once rounds agree')
+    parser.add_argument('--consistency-min-rounds', type=int, default=2,
+                       help='Rounds issued up front in adaptive mode (default: 2)')
+    parser.add_argument('--consistency-threshold', type=float, default=1.0,
+                       help='Agreement share required to stop early in adaptive mode (default: 1.0)')
+    parser.add_argument('--multi-sample', action='store_true',
+                       help='Request all self-consistency rounds in one call via `n` (falls back to separate calls if unsupported)')
+    parser.add_argument('--consistency-agreement-level', choices=['record', 'field'], default='record',
+                       help='Agree on whole records or on every field (quorum) in adaptive mode (default: record)')
     
     # Other options
+    parser.add_argument('--metrics-port', type=int, default=None,
+                       help='Serve live metrics on http://127.0.0.1:PORT/metrics (Prometheus) and /metrics.json')
+    parser.add_argument('--progress', action='store_true', help='Show a single-line live progress display')
+    parser.add_argument('--no-task-log', action='store_true', help='Disable per-task INFO log lines')
+    parser.add_argument('--scheduling', choices=['fifo', 'lpt'], default='fifo',
+                       help='Dispatch order: input order or estimated longest first (default: fifo)')
+    parser.add_argument('--dedup', action='store_true',
+                       help='Send one request per canonical NOTAM text and copy results to duplicates')
+    parser.add_argument('--streaming', action='store_true',
+                       help='Constant-memory mode: read, process and append records batch by batch (JSON or .jsonl)')
+    parser.add_argument('--streaming-depth', type=int, default=2,
+                       help='Batches in flight in streaming mode (default: 2)')
+    parser.add_argument('--structured-output', action='store_true',
+                       help='Send the category JSON Schema as response_format where supported, validate locally and retry invalid records')
+    parser.add_argument('--schema-retries', type=int, default=1,
+                       help='Retries for records failing schema validation (default: 1)')
+    parser.add_argument('--compact-json', action='store_true',
+                       help='Write result files without indentation (roughly half the size); a .zst output path is zstd-compressed')
+    parser.add_argument('--continue-truncated', action='store_true',
+                       help='Send one continuation request for the rows missing from a truncated response')
+    parser.add_argument('--route', action='store_true',
+                       help='Mixed input: classify each record locally and use its category prompt (--prompt becomes the fallback)')
+    parser.add_argument('--router-model', default=None,
+                       help='Router artifact (default: data/category_router.npz, trained on first use)')
+    parser.add_argument('--route-threshold', type=float, default=0.5,
+                       help='Probability above which a record is also routed to a further category (default: 0.5)')
+    parser.add_argument('--dynamic-fewshot', type=int, default=None, metavar='K',
+                       help='Replace fixed ICL examples with the K most similar training examples per record')
+    parser.add_argument('--fewshot-max-tokens', type=int, default=400,
+                       help='Token budget for retrieved examples (default: 400)')
+    parser.add_argument('--rule-fast-path', action='store_true',
+                       help='Parse template NOTAMs (runway/RVR/stand closures) with local rules instead of the API')
+    parser.add_argument('--fast-path-min-confidence', type=float, default=0.9,
+                       help='Minimum rule confidence for the fast path (default: 0.9)')
+    parser.add_argument('--cascade-models', default=None,
+                       help='Comma-separated models tried cheapest first, e.g. qwen3-8b,qwen-max (same provider settings)')
+    parser.add_argument('--cascade-category-tiers', action='append', default=[], metavar='CATEGORY=M1,M2',
+                       help='Per-category cascade tiers (repeatable)')
+    parser.add_argument('--cascade-prices', action='append', default=[], metavar='MODEL=PRICE',
+                       help='Price per 1K tokens for the cost report (repeatable)')
+    parser.add_argument('--cascade-min-coverage', type=float, default=0.8,
+                       help='Minimum share of category fields filled before escalating (default: 0.8)')
+    parser.add_argument('--parquet-dir', default=None,
+                       help='Also write parsed rows as Parquet partitioned by category and run (requires pyarrow)')
+    parser.add_argument('--compact-output', action='store_true',
+                       help='Store raw responses and per-round results in a compressed sidecar blob store')
     parser.add_argument('--evaluate', action='store_true', help='Show evaluation report after processing')
+    parser.add_argument('--metrics-cache', default=str(METRICS_CACHE_FILE),
+                       help='Metrics cache shared with the leaderboard (python -m src.leaderboard)')
+    parser.add_argument('--no-metrics-cache', action='store_true', help='Do not cache the metrics of the output file')
+    parser.add_argument('--live-eval', action='store_true',
+                       help='Track accuracy/F1 of records with manual_fields while the run progresses')
+    parser.add_argument('--abort-below', type=float, default=None,
+                       help='Stop the run when live accuracy falls below this floor (implies --live-eval)')
+    parser.add_argument('--abort-min-records', type=int, default=50,
+                       help='Labelled records evaluated before --abort-below applies (default: 50)')
     parser.add_argument('--evaluate_only', metavar='FILE', help='Only evaluate specified file, no processing')
     
     args = parser.parse_args()
@@ -488,6 +1446,8 @@ def main():
     # Validate required parameters (only in non-evaluation mode)
     if not args.input_file or not args.output_file:
         parser.error("In processing mode, input_file and output_file are required parameters")
+    if args.dynamic_fewshot is not None and args.dynamic_fewshot < 1:
+        parser.error("--dynamic-fewshot K must be at least 1")
     
     # === POML MODIFICATION ===
     if args.use_poml:
@@ -502,8 +1462,8 @@ def main():
             parser.error("POML module not installed. Please install 'poml' package.")
         actual_prompt = None  # POML模式下不需要prompt
     else:
-        if not args.prompt:
-            parser.error("In traditional mode, --prompt is required")
+        if not args.prompt and not args.route:
+            parser.error("In traditional mode, --prompt is required (or --route for per-category prompts)")
         
         # Process prompt: if it's a predefined prompt name, get the actual content
         prompt_map = {
@@ -541,11 +1501,15 @@ def main():
             'AREA_PROMPT_ICL': AREA_PROMPT_ICL,
             'RVR_PROMPT_Vanilla': RVR_PROMPT_Vanilla,
             'RVR_PROMPT_COT': RVR_PROMPT_COT,
-            'RVR_PROMPT_ICL': RVR_PROMPT_ICL
+            'RVR_PROMPT_ICL': RVR_PROMPT_ICL,
+            **PRUNED_PROMPTS
         }
         
         # Get actual prompt content
-        if args.prompt in prompt_map:
+        if not args.prompt:
+            actual_prompt = None  # Routed records use their category prompt
+            print("Using per-category prompts")
+        elif args.prompt in prompt_map:
             actual_prompt = prompt_map[args.prompt]
             print(f"Using predefined prompt: {args.prompt}")
         else:
@@ -553,7 +1517,7 @@ def main():
             print(f"Using custom prompt")
         
         # Ensure prompt contains json keyword (if using json format output)
-        if 'json' not in actual_prompt.lower():
+        if actual_prompt and 'json' not in actual_prompt.lower():
             actual_prompt = f"{actual_prompt}\n\nPlease respond in JSON format."
             print("Automatically added JSON format requirement to prompt")
     # === END MODIFICATION ===
@@ -571,23 +1535,91 @@ def main():
         # 千问API的enable_thinking参数需要通过extra_body传递
         api_config['extra_body'] = {'enable_thinking': False}
     
+    api_config['supports_n'] = args.multi_sample
+    
     print(f"API configuration: Provider={args.provider}, Model={args.model}, Temperature={args.temperature}")
     
+    api_configs = {args.provider: api_config}
+    cascade_config = {'enabled': False}
+    if args.cascade_models:
+        # Each cascade tier is a client named after its model, sharing the provider settings
+        tiers = [m.strip() for m in args.cascade_models.split(',') if m.strip()]
+        category_tiers = {}
+        for clause in args.cascade_category_tiers:
+            category, models = clause.split('=', 1)
+            category_tiers[category] = [m.strip() for m in models.split(',') if m.strip()]
+        for model in dict.fromkeys(tiers + [m for ms in category_tiers.values() for m in ms]):
+            api_configs[model] = {**api_config, 'model': model}
+        cascade_config = {
+            'enabled': True,
+            'tiers': tiers,
+            'category_tiers': category_tiers,
+            'min_coverage': args.cascade_min_coverage,
+            'prices': {k: float(v) for k, v in (clause.split('=', 1) for clause in args.cascade_prices)}
+        }
+        print(f"Model cascade: {' -> '.join(tiers)}")
+    
     config = {
         'max_workers': 10,
         'max_retries': 3,
-        'api_config': {
-            args.provider: api_config
-        },
+        'api_config': api_configs,
         'self_consistency': {
             'enabled': args.self_consistency,
             'rounds': args.consistency_rounds,
-            'strategy': args.consistency_strategy
+            'strategy': args.consistency_strategy,
+            'adaptive': args.adaptive_consistency,
+            'min_rounds': args.consistency_min_rounds,
+            'agreement_threshold': args.consistency_threshold,
+            'agreement_level': args.consistency_agreement_level
         },
         # === POML MODIFICATION ===
         'use_poml': args.use_poml,
-        'poml_file': args.poml_file if args.use_poml else None
+        'poml_file': args.poml_file if args.use_poml else None,
         # === END MODIFICATION ===
+        'dedup': args.dedup,
+        'scheduling': args.scheduling,
+        'compact_output': args.compact_output,
+        'streaming': args.streaming,
+        'streaming_depth': args.streaming_depth,
+        'parquet_dir': args.parquet_dir,
+        'cascade': cascade_config,
+        'structured_output': {
+            'enabled': args.structured_output,
+            'max_retries': args.schema_retries
+        },
+        'truncation': {
+            'continue': args.continue_truncated
+        },
+        'serialization': {
+            'compact': args.compact_json
+        },
+        'evaluation': {
+            'cache': None if args.no_metrics_cache else args.metrics_cache
+        },
+        'live_evaluation': {
+            'enabled': args.live_eval,
+            'abort_below': args.abort_below,
+            'min_records': args.abort_min_records
+        },
+        'routing': {
+            'enabled': args.route,
+            'model_file': args.router_model,
+            'threshold': args.route_threshold
+        },
+        'fewshot': {
+            'enabled': args.dynamic_fewshot is not None,
+            'k': args.dynamic_fewshot,
+            'max_example_tokens': args.fewshot_max_tokens
+        },
+        'fast_path': {
+            'enabled': args.rule_fast_path,
+            'min_confidence': args.fast_path_min_confidence
+        },
+        'telemetry': {
+            'metrics_port': args.metrics_port,
+            'progress_display': args.progress,
+            'log_task_details': not args.no_task_log
+        }
     }
     
     # Process file
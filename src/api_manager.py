@@ -3,13 +3,14 @@ import json
 import uuid
 import os
 from typing import Dict, Any, Optional, List, Callable
-from openai import OpenAI
+from openai import OpenAI, BadRequestError
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
 from dataclasses import dataclass
 from enum import Enum
 from src.utils import get_logger
-from src.utils import extract_json_from_text
+from src.utils import extract_json_from_text, repair_truncated_json
+from src.consistency import canonical_key, result_rows
 import poml  # 在全局导入poml
 
 # Use a new logger
@@ -36,6 +37,8 @@ class APITask:
     result: Optional[Dict] = None
     error: Optional[str] = None
     max_retries: int = 3
+    n: int = 1  # Samples requested in one call (multi-sample self-consistency)
+    response_format: Optional[Dict[str, Any]] = None  # Per-request override (structured output schema)
 
 class APIClient:
     """Simplified API client"""
@@ -49,7 +52,9 @@ class APIClient:
                  temperature: float = 0,
                  response_format: Optional[Dict[str, str]] = None,
                  extra_body: Optional[Dict[str, Any]] = None,  # Add extra_body parameter
-                 extra_params: Optional[Dict[str, Any]] = None):  # Add extra_params for API parameters
+                 extra_params: Optional[Dict[str, Any]] = None,  # Add extra_params for API parameters
+                 supports_n: bool = False,  # Provider accepts the `n` parameter (multiple samples per request)
+                 supports_json_schema: bool = False):  # Provider accepts response_format type json_schema
         self.client = OpenAI(api_key=api_key, base_url=base_url, timeout=timeout)
         self.model = model
         self.max_tokens = max_tokens
@@ -57,14 +62,23 @@ class APIClient:
         self.response_format = response_format or {}
         self.extra_body = extra_body or {}  # Store extra_body parameter
         self.extra_params = extra_params or {}  # Store extra_params (for qwen API etc.)
+        self.supports_n = supports_n
+        self.supports_json_schema = supports_json_schema
         self.logger = get_logger('APIClient')
     
     
     
     def call_api(self, prompt: str = None, input_text: str = None,
-                 mode: str = "traditional", poml_file: str = None) -> Dict[str, Any]:
-        """Single API call (optimized) - supports both traditional and POML modes"""
-
+                 mode: str = "traditional", poml_file: str = None, n: int = 1,
+                 response_format: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Single API call (optimized) - supports both traditional and POML modes.
+        With n > 1 the provider is asked for n samples in one request; every sample is
+        returned under 'choices' and the top-level fields mirror the first successful one.
+        response_format overrides the client's format for this call (e.g. a per-category json_schema).
+        """
+        response_format = response_format or self.response_format
+        start_time = time.time()
         try:
             if mode == "poml" and poml_file:
                 context = {'notam_text': input_text}
@@ -103,8 +117,8 @@ class APIClient:
                 }
             
             # 添加response_format和extra_body
-            if self.response_format:
-                params["response_format"] = self.response_format
+            if response_format:
+                params["response_format"] = response_format
 
             if self.extra_body:
                 params["extra_body"] = self.extra_body
@@ -153,12 +167,17 @@ class APIClient:
                     if self.extra_body:
                         api_params['extra_body'] = self.extra_body
                     
+                    if n > 1:
+                        api_params['n'] = n
+                    
                     response = self.client.chat.completions.create(**api_params)
                 except Exception as e:
                     self.logger.error(f"分离参数调用失败: {e}, 尝试原始调用")
                     # 确保在原始调用中也添加extra_body参数
                     if self.extra_body:
                         params['extra_body'] = self.extra_body
+                    if n > 1:
+                        params['n'] = n
                     
                     response = self.client.chat.completions.create(**params)
             except TypeError as e:
@@ -179,82 +198,130 @@ class APIClient:
                         raise e
                 else:
                     raise e
-            # 调试输出完整的响应结构
-            # 处理DMX API的特殊情况：有时JSON在refusal字段而不是content字段
-            message = response.choices[0].message
-            content = message.content
-            
-            # 如果content为None，检查refusal字段
-            if content is None and hasattr(message, 'refusal') and message.refusal:
-                content = message.refusal
-                
-                # 检查是否为自然语言解释而非JSON
-                if content and (content.startswith("I'm sorry") or 
-                                content.startswith("Sorry") or 
-                                "does not specify" in content or
-                                "no relevant" in content):
-                    self.logger.info("模型返回了解释而非JSON数据，返回空数组")
-                    # 对于不包含所需信息的NOTAM，返回空数组作为有效的JSON响应
-                    content = "[]"
-            
-            data_to_return = content
+            usage = response.usage.dict() if response.usage else None
+            latency = time.time() - start_time
             
-            # 仅当需要json时才尝试解析
-            if self.response_format.get('type') == 'json_object' and content:
-                try:
-                    # 检查是否已经是字符串形式的JSON格式，如果不是则尝试提取
-                    if content.strip().startswith('[') or content.strip().startswith('{'):
-                        data_to_return = json.loads(content)
-                    else:
-                        # 尝试从文本中提取JSON
-                        extracted = extract_json_from_text(content)
-                        if extracted:
-                            data_to_return = extracted
-                        else:
-                            # 如果无法提取JSON，返回空数组
-                            data_to_return = []
-                            self.logger.warning("无法提取JSON，返回空数组")
-                    
-                    # 对于NOTAM处理，确保结果始终是数组
-                    if isinstance(data_to_return, dict):
-                        data_to_return = [data_to_return]
-                        
-                except json.JSONDecodeError as e:
-                    self.logger.warning(f"JSON parsing failed, attempting extract_json_from_text: {e}")
-                    extracted_json = extract_json_from_text(content)
-                    if extracted_json is not None:
-                        data_to_return = extracted_json
-                    else:
-                        self.logger.error("All JSON parsing methods failed")
-                        return {
-                            'success': False,
-                            'error': f'JSON parsing failed: {e}',
-                            'raw_response': content
-                        }
-
-            # 统一的成功返回结构
-            # 如果是数组且只有一个元素，则直接使用该元素而不是数组
-            if isinstance(data_to_return, list) and len(data_to_return) == 1:
-                parse_data = data_to_return[0]
+            if n > 1:
+                # Multi-sample request: every choice is parsed like a separate call
+                if len(response.choices) < n:
+                    self.logger.warning(f"Provider returned {len(response.choices)}/{n} choices, disabling multi-sample requests")
+                    self.supports_n = False
+                choices = [self._parse_message(choice.message, response_format) for choice in response.choices]
+                successful = [choice for choice in choices if choice['success']]
+                result = {**(successful[0] if successful else choices[0]), 'choices': choices}
             else:
-                parse_data = data_to_return
-                
-            result = {
-                'success': True,
-                'data': parse_data,  # 使用处理后的数据
-                'raw_response': content,
-                'usage': response.usage.dict() if response.usage else None
-            }
+                result = self._parse_message(response.choices[0].message, response_format)
+            
+            if result['success']:
+                result['usage'] = usage
+                result['latency'] = latency
             
             return result
             
         except Exception as e:
             self.logger.error(f"API call failed: {e}")
-            return {
+            result = {
                 'success': False,
                 'error': str(e),
                 'raw_response': None
             }
+            if n > 1 and isinstance(e, BadRequestError):
+                # The provider rejected the request (400), e.g. for the `n` parameter: later rounds use
+                # separate calls. Timeouts, rate limits and connection errors are ordinary failures.
+                self.logger.warning("Multi-sample request rejected, disabling multi-sample requests for this client")
+                self.supports_n = False
+                result['multi_sample_rejected'] = True
+            return result
+
+    def _parse_message(self, message, response_format: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Parse one response message (choice) into the unified result structure"""
+        response_format = response_format or self.response_format
+        # 处理DMX API的特殊情况：有时JSON在refusal字段而不是content字段
+        content = message.content
+        
+        # 如果content为None，检查refusal字段
+        if content is None and hasattr(message, 'refusal') and message.refusal:
+            content = message.refusal
+            
+            # 检查是否为自然语言解释而非JSON
+            if content and (content.startswith("I'm sorry") or 
+                            content.startswith("Sorry") or 
+                            "does not specify" in content or
+                            "no relevant" in content):
+                self.logger.info("模型返回了解释而非JSON数据，返回空数组")
+                # 对于不包含所需信息的NOTAM，返回空数组作为有效的JSON响应
+                content = "[]"
+        
+        data_to_return = content
+        partial = False
+        
+        # 仅当需要json时才尝试解析
+        if response_format.get('type') in ('json_object', 'json_schema') and content:
+            try:
+                # 检查是否已经是字符串形式的JSON格式，如果不是则尝试提取
+                if content.strip().startswith('[') or content.strip().startswith('{'):
+                    data_to_return = json.loads(content)
+                else:
+                    # 尝试从文本中提取JSON
+                    extracted = extract_json_from_text(content)
+                    if extracted:
+                        data_to_return = extracted
+                    else:
+                        repaired = repair_truncated_json(content)
+                        if repaired is not None:
+                            self.logger.warning("Truncated JSON response, keeping the complete rows")
+                            data_to_return = repaired
+                            partial = True
+                        else:
+                            # 如果无法提取JSON，返回空数组
+                            data_to_return = []
+                            self.logger.warning("无法提取JSON，返回空数组")
+                
+                # 对于NOTAM处理，确保结果始终是数组
+                if isinstance(data_to_return, dict):
+                    data_to_return = [data_to_return]
+                    
+            except json.JSONDecodeError as e:
+                self.logger.warning(f"JSON parsing failed, attempting extract_json_from_text: {e}")
+                extracted_json = extract_json_from_text(content)
+                repaired = repair_truncated_json(content) if extracted_json is None else None
+                if extracted_json is not None:
+                    data_to_return = extracted_json
+                elif repaired is not None:
+                    # Cut off by max_tokens or a dropped stream: keep the complete rows instead of retrying
+                    self.logger.warning("Truncated JSON response, keeping the complete rows")
+                    data_to_return = repaired
+                    partial = True
+                else:
+                    self.logger.error("All JSON parsing methods failed")
+                    return {
+                        'success': False,
+                        'error': f'JSON parsing failed: {e}',
+                        'raw_response': content
+                    }
+
+        # 统一的成功返回结构
+        # 如果是数组且只有一个元素，则直接使用该元素而不是数组
+        if isinstance(data_to_return, list) and len(data_to_return) == 1:
+            parse_data = data_to_return[0]
+        else:
+            parse_data = data_to_return
+            
+        result = {
+            'success': True,
+            'data': parse_data,  # 使用处理后的数据
+            'raw_response': content
+        }
+        if partial:
+            result['partial'] = True
+        return result
+
+def _add_usage(first: Optional[Dict[str, Any]], second: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Token usage of two requests summed field by field"""
+    if not first or not second:
+        return first or second
+    return {key: (first.get(key) or 0) + (second.get(key) or 0)
+            for key in ('prompt_tokens', 'completion_tokens', 'total_tokens')}
 
 class APIManager:
     """API Manager - Concurrent calls and error handling"""
@@ -277,12 +344,25 @@ class APIManager:
             'successful_requests': 0,
             'failed_requests': 0,
             'retry_requests': 0,
-            'total_tokens': 0
+            'total_tokens': 0,
+            'partial_responses': 0,
+            'continuation_requests': 0
         }
         
+        # Per-client usage (requests/tokens), e.g. for cascade cost accounting
+        self.client_stats: Dict[str, Dict[str, int]] = {}
+        
         self._last_request_time = 0
         self._lock = threading.Lock()
         self.logger = get_logger('APIManager')
+        
+        # Optional live telemetry (see src/telemetry.py); per-task INFO logs can be turned off for long runs
+        self.telemetry = None
+        self.log_task_details = True
+        
+        # Truncated responses keep their complete rows (marked 'partial'); optionally one
+        # continuation request asks for the remaining rows only
+        self.continue_truncated = False
     
     def register_client(self, name: str, client: APIClient, is_default: bool = False):
         """Register a client"""
@@ -325,7 +405,10 @@ class APIManager:
                         temperature=provider_config.get('temperature', 0),
                         response_format=provider_config.get('response_format', {'type': 'json_object'}),
                         extra_body=provider_config.get('extra_body', {}),
-                        **{k: v for k, v in provider_config.items() if k not in ['api_key','base_url','model','timeout','max_tokens','temperature','response_format','extra_body']}
+                        # Opt-in, as for APIClient: not every OpenAI-compatible endpoint accepts these
+                        supports_n=provider_config.get('supports_n', False),
+                        supports_json_schema=provider_config.get('supports_json_schema', False),
+                        **{k: v for k, v in provider_config.items() if k not in ['api_key','base_url','model','timeout','max_tokens','temperature','response_format','extra_body','supports_n','supports_json_schema']}
                     )
                 elif provider == 'qdd':
                     use_json = provider_config.get('use_json_format', True)
@@ -402,7 +485,9 @@ class APIManager:
                     poml_file=req['poml_file'],
                     input_text=req['input_text'],
                     prompt=req.get('prompt', 'Please respond in JSON format.'),  # For response_format: json_object
-                    max_retries=req.get('max_retries', self.max_retries)
+                    max_retries=req.get('max_retries', self.max_retries),
+                    n=req.get('n', 1),
+                    response_format=req.get('response_format')
                 )
             else:
                 # Traditional mode task
@@ -411,7 +496,9 @@ class APIManager:
                     mode='traditional',
                     prompt=req['prompt'],
                     input_text=req['input_text'],
-                    max_retries=req.get('max_retries', self.max_retries)
+                    max_retries=req.get('max_retries', self.max_retries),
+                    n=req.get('n', 1),
+                    response_format=req.get('response_format')
                 )
             tasks.append(task)
         
@@ -476,29 +563,37 @@ class APIManager:
             return {'success': False, 'error': task.error}
         
         self.stats['total_requests'] += 1
+        if self.telemetry:
+            self.telemetry.task_started()
         
         # 执行任务并记录时间
         start_time = time.time()
         if task.mode == 'poml':
-            result = self._call_with_retry_poml(client, task.poml_file, task.input_text, task.max_retries, task.id)
+            result = self._call_with_retry_poml(client, task.poml_file, task.input_text, task.max_retries, task.id,
+                                                n=task.n, response_format=task.response_format)
         else:
-            result = self._call_with_retry(client, task.prompt, task.input_text, task.max_retries)
+            result = self._call_with_retry(client, task.prompt, task.input_text, task.max_retries,
+                                           n=task.n, response_format=task.response_format)
         execution_time = time.time() - start_time
         
         # 记录详细的结果
         task.status = TaskStatus.SUCCESS if result.get('success') else TaskStatus.FAILED
         task.result = result
+        self._record_client_usage(client, result)
+        if self.telemetry:
+            self.telemetry.task_finished(result)
         if not result.get('success'):
             task.error = result.get('error')
             self.logger.error(f"[Task {task.id}] Failed after {execution_time:.2f}s, error: {task.error}")
-        else:
-            token_usage = result.get('usage', {}).get('total_tokens', 0)
+        elif self.log_task_details:
+            token_usage = (result.get('usage') or {}).get('total_tokens', 0)
             self.logger.info(f"[Task {task.id}] Completed successfully in {execution_time:.2f}s, tokens: {token_usage}")
             
         return result
     
     def _call_with_retry_poml(self, client: APIClient, poml_file: str, 
-                            input_text: str, max_retries: Optional[int] = None, task_id: str = 'unknown') -> Dict[str, Any]:
+                            input_text: str, max_retries: Optional[int] = None, task_id: str = 'unknown',
+                            n: int = 1, response_format: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """API call with retries for POML mode - with detailed logging"""
         effective_max_retries = max_retries if max_retries is not None else self.max_retries
         last_result = {}
@@ -506,7 +601,8 @@ class APIManager:
         for attempt in range(effective_max_retries + 1):
             # 捕获可能的JSON错误
             try:
-                last_result = client.call_api(mode="poml", poml_file=poml_file, input_text=input_text)
+                last_result = client.call_api(mode="poml", poml_file=poml_file, input_text=input_text, n=n,
+                                              response_format=response_format)
             except Exception as e:
                 self.logger.error(f"[Task {task_id}] Exception in POML call: {str(e)}")
                 if "must be str, bytes or bytearray, not NoneType" in str(e):
@@ -516,10 +612,18 @@ class APIManager:
             if last_result.get('success'):
                 if attempt > 0:
                     self.logger.info(f"[Task {task_id}] POML retry succeeded, attempts: {attempt + 1}")
+                if last_result.get('partial'):
+                    with self._lock:
+                        self.stats['partial_responses'] += 1
+                return last_result
+            if last_result.get('multi_sample_rejected'):
+                # The caller falls back to separate calls; retrying the same request would fail again
                 return last_result
             
             if attempt < effective_max_retries:
                 self.stats['retry_requests'] += 1
+                if self.telemetry:
+                    self.telemetry.retry()
                 wait_time = self.retry_delay * (2 ** attempt)
                 self.logger.warning(
                     f"[Task {task_id}] POML call failed, retrying in {wait_time:.2f}s ({attempt + 1}/{effective_max_retries}). "
@@ -535,22 +639,34 @@ class APIManager:
                        prompt: str, 
                        input_text: str,
                        max_retries: Optional[int] = None,
-                       task_id: str = 'unknown') -> Dict[str, Any]:
+                       task_id: str = 'unknown',
+                       n: int = 1,
+                       response_format: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """API call with retries (optimized)"""
         effective_max_retries = max_retries if max_retries is not None else self.max_retries
         last_result = {}
 
         for attempt in range(effective_max_retries + 1):
 
-            last_result = client.call_api(prompt, input_text)
+            last_result = client.call_api(prompt, input_text, n=n, response_format=response_format)
             
             if last_result.get('success'):
                 if attempt > 0:
                     self.logger.info(f"Retry succeeded, attempts: {attempt + 1}")
+                if last_result.get('partial'):
+                    with self._lock:
+                        self.stats['partial_responses'] += 1
+                    if self.continue_truncated and n == 1:
+                        last_result = self._continue_partial(client, prompt, input_text, last_result, response_format)
+                return last_result
+            if last_result.get('multi_sample_rejected'):
+                # The caller falls back to separate calls; retrying the same request would fail again
                 return last_result
             
             if attempt < effective_max_retries:
                 self.stats['retry_requests'] += 1
+                if self.telemetry:
+                    self.telemetry.retry()
                 wait_time = self.retry_delay * (2 ** attempt)
                 self.logger.warning(
                     f"Call failed, retrying in {wait_time:.2f}s ({attempt + 1}/{effective_max_retries}). "
@@ -561,12 +677,65 @@ class APIManager:
         self.logger.error(f"All retries failed, final error: {last_result.get('error')}")
         return last_result # Return the last failed attempt
     
+    def _continue_partial(self, client: APIClient, prompt: str, input_text: str,
+                          result: Dict[str, Any], response_format: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Ask for the rows missing from a truncated response. The kept rows are sent back so the
+        model only generates the rest; the result stays partial if the continuation fails too.
+        """
+        rows = result_rows(result['data'])
+        continuation_input = (
+            f"{input_text}\n\nThe following {len(rows)} rows were already extracted from this NOTAM:\n"
+            f"{json.dumps(rows, ensure_ascii=False, separators=(',', ':'))}\n"
+            f"Return only the remaining rows, in the same JSON format."
+        )
+        with self._lock:
+            self.stats['continuation_requests'] += 1
+        continuation = client.call_api(prompt, continuation_input, response_format=response_format)
+        if not continuation.get('success'):
+            self.logger.warning(f"Continuation request failed, keeping {len(rows)} rows: {continuation.get('error')}")
+            return result
+        
+        # Rows repeated by the continuation are dropped
+        seen = {canonical_key(row) for row in rows}
+        extra = [row for row in result_rows(continuation['data']) if canonical_key(row) not in seen]
+        merged = {
+            **result,
+            'data': {'rows': rows + extra} if rows or extra else result['data'],
+            'raw_response': (result.get('raw_response') or '') + '\n' + (continuation.get('raw_response') or ''),
+            'usage': _add_usage(result.get('usage'), continuation.get('usage')),
+            'continued': True
+        }
+        if not continuation.get('partial'):
+            merged.pop('partial', None)
+        return merged
+    
+    def _record_client_usage(self, client: APIClient, result: Dict[str, Any]):
+        """Accumulate requests and tokens under the client's registered name"""
+        name = next((n for n, c in self.clients.items() if c is client), 'unknown')
+        with self._lock:
+            stats = self.client_stats.setdefault(name, {'requests': 0, 'successful_requests': 0, 'tokens': 0})
+            stats['requests'] += 1
+            if result.get('success'):
+                stats['successful_requests'] += 1
+            stats['tokens'] += (result.get('usage') or {}).get('total_tokens', 0) or 0
+    
     def _get_client(self, client_name: Optional[str] = None) -> Optional[APIClient]:
         """Get a client"""
         if client_name and client_name in self.clients:
             return self.clients[client_name]
         return self.default_client
     
+    def supports_multi_sample(self, client_name: Optional[str] = None) -> bool:
+        """Whether the client accepts `n` to return several samples from one request"""
+        client = self._get_client(client_name)
+        return bool(client and client.supports_n)
+    
+    def supports_json_schema(self, client_name: Optional[str] = None) -> bool:
+        """Whether the client accepts response_format type json_schema (structured output)"""
+        client = self._get_client(client_name)
+        return bool(client and client.supports_json_schema)
+    
     def get_stats(self) -> Dict[str, Any]:
         """Get statistics"""
         total = self.stats['total_requests']
@@ -581,6 +750,7 @@ class APIManager:
             **self.stats,
             'success_rate': f"{success_rate:.2%}",
             'clients': list(self.clients.keys()),
+            'client_stats': {name: dict(stats) for name, stats in self.client_stats.items()},
             'default_client': default_client_name
         }
         
@@ -0,0 +1,187 @@
+"""
+Content-addressed sidecar store for raw responses and per-round results
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from src.utils import get_logger
+
+# zstd is preferred; zlib keeps the store usable without the optional dependency
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+logger = get_logger('blob_store')
+
+REF_SUFFIX = '_ref'
+REFS_SUFFIX = '_refs'
+
+
+class BlobStore:
+    """Deduplicated, compressed blob store (sha256 -> compressed JSON blob)"""
+
+    def __init__(self, root: Union[str, Path], level: int = 3):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.level = level
+        self.codec = 'zstd' if ZSTD_AVAILABLE else 'zlib'
+        self.stats = {'puts': 0, 'blobs_written': 0, 'bytes_raw': 0, 'bytes_stored': 0}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_output(cls, output_file: Union[str, Path], **kwargs) -> 'BlobStore':
+        """Blob store placed next to an output file (<stem>_blobs/)"""
+        output_file = Path(output_file)
+        return cls(output_file.parent / f"{output_file.stem}_blobs", **kwargs)
+
+    def _path(self, digest: str) -> Path:
+        suffix = '.zst' if self.codec == 'zstd' else '.zz'
+        return self.root / digest[:2] / f"{digest}{suffix}"
+
+    def _find(self, digest: str) -> Optional[Path]:
+        """Locate a blob whatever codec wrote it"""
+        for suffix in ('.zst', '.zz'):
+            path = self.root / digest[:2] / f"{digest}{suffix}"
+            if path.exists():
+                return path
+        return None
+
+    def put(self, obj: Any) -> str:
+        """Store a JSON-serializable object, return its content hash"""
+        payload = json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8')
+        digest = hashlib.sha256(payload).hexdigest()
+        with self._lock:
+            self.stats['puts'] += 1
+
+        path = self._path(digest)
+        if path.exists():
+            return digest
+
+        compressed = self._compress(payload)
+        path.parent.mkdir(exist_ok=True)
+        # Unique temp file per writer: concurrent puts of the same blob each rename their own
+        # complete copy into place, and the last rename wins with identical content
+        with tempfile.NamedTemporaryFile(dir=path.parent, prefix=f".{digest}.", suffix='.tmp', delete=False) as tmp:
+            tmp.write(compressed)
+        try:
+            os.replace(tmp.name, path)
+        except OSError:
+            os.unlink(tmp.name)
+            if not path.exists():
+                raise
+            # Another writer stored the same content first
+            return digest
+
+        with self._lock:
+            self.stats['blobs_written'] += 1
+            self.stats['bytes_raw'] += len(payload)
+            self.stats['bytes_stored'] += len(compressed)
+        return digest
+
+    def _compress(self, payload: bytes) -> bytes:
+        if self.codec == 'zstd':
+            # ZstdCompressor instances are not safe to share between threads
+            return zstandard.ZstdCompressor(level=self.level).compress(payload)
+        return zlib.compress(payload, 6)
+
+    def get(self, digest: str) -> Any:
+        """Load an object by content hash"""
+        path = self._find(digest)
+        if path is None:
+            raise KeyError(f"Blob not found: {digest}")
+        data = path.read_bytes()
+        if path.suffix == '.zst':
+            if not ZSTD_AVAILABLE:
+                raise RuntimeError("Blob was written with zstd; install 'zstandard' to read it")
+            payload = zstandard.ZstdDecompressor().decompress(data)
+        else:
+            payload = zlib.decompress(data)
+        return json.loads(payload)
+
+    def __contains__(self, digest: str) -> bool:
+        return self._find(digest) is not None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Storage statistics for this run"""
+        return {
+            **self.stats,
+            'path': str(self.root),
+            'codec': self.codec,
+            'compression_ratio': self.stats['bytes_raw'] / self.stats['bytes_stored'] if self.stats['bytes_stored'] else 0
+        }
+
+
+def compact_record(record: Dict[str, Any], store: BlobStore) -> Dict[str, Any]:
+    """
+    Move bulky raw data out of a processed record into the blob store:
+    consistency_info.all_results -> all_results_refs, parse_fields.raw_response -> raw_response_ref
+    """
+    record = dict(record)
+
+    consistency_info = record.get('consistency_info')
+    if isinstance(consistency_info, dict) and 'all_results' in consistency_info:
+        consistency_info = dict(consistency_info)
+        consistency_info['all_results' + REFS_SUFFIX] = [store.put(r) for r in consistency_info.pop('all_results')]
+        record['consistency_info'] = consistency_info
+
+    parse_fields = record.get('parse_fields')
+    if isinstance(parse_fields, dict) and parse_fields.get('raw_response') is not None:
+        parse_fields = dict(parse_fields)
+        parse_fields['raw_response' + REF_SUFFIX] = store.put(parse_fields.pop('raw_response'))
+        record['parse_fields'] = parse_fields
+
+    return record
+
+
+class RawDataAccessor:
+    """Lazy access to the raw data of a compact output file; blobs are read on first use"""
+
+    def __init__(self, output_file: Union[str, Path], store: Optional[BlobStore] = None):
+        self.store = store or BlobStore.for_output(output_file)
+        self._cache: Dict[str, Any] = {}
+
+    def _get(self, digest: str) -> Any:
+        if digest not in self._cache:
+            self._cache[digest] = self.store.get(digest)
+        return self._cache[digest]
+
+    def all_results(self, record: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Per-round self-consistency results of a record (inline or from the store)"""
+        consistency_info = record.get('consistency_info') or {}
+        if 'all_results' in consistency_info:
+            return consistency_info['all_results']
+        return [self._get(digest) for digest in consistency_info.get('all_results' + REFS_SUFFIX, [])]
+
+    def raw_response(self, record: Dict[str, Any]) -> Optional[str]:
+        """Raw model response of a failed record (inline or from the store)"""
+        parse_fields = record.get('parse_fields')
+        if not isinstance(parse_fields, dict):
+            return None
+        if 'raw_response' in parse_fields:
+            return parse_fields['raw_response']
+        digest = parse_fields.get('raw_response' + REF_SUFFIX)
+        return self._get(digest) if digest else None
+
+    def expand(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Return a copy of a compact record with all references resolved inline"""
+        record = dict(record)
+        consistency_info = record.get('consistency_info')
+        if isinstance(consistency_info, dict) and ('all_results' + REFS_SUFFIX) in consistency_info:
+            consistency_info = dict(consistency_info)
+            consistency_info['all_results'] = self.all_results(record)
+            consistency_info.pop('all_results' + REFS_SUFFIX)
+            record['consistency_info'] = consistency_info
+        parse_fields = record.get('parse_fields')
+        if isinstance(parse_fields, dict) and ('raw_response' + REF_SUFFIX) in parse_fields:
+            parse_fields = dict(parse_fields)
+            parse_fields['raw_response'] = self._get(parse_fields.pop('raw_response' + REF_SUFFIX))
+            record['parse_fields'] = parse_fields
+        return record
@@ -0,0 +1,226 @@
+"""
+Bootstrap confidence intervals - record-level resampling of per-field accuracy and F1 as matrix products, paired run differences
+"""
+import argparse
+import sys
+import time
+import warnings
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+# Add project root directory to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.utils import get_logger, extract_field_values, load_processed_data, _serialize_for_comparison
+
+# Label counts are very sparse (a record touches a few labels per field); dense matrices otherwise
+try:
+    from scipy import sparse
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
+logger = get_logger('bootstrap')
+
+OVERALL = 'Overall'
+
+
+def record_arrays(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Per-record counts behind the evaluation metrics: correct values and samples per field
+    (records x fields) and true positive / true / predicted counts per (field, label)
+    column (records x labels). Records without evaluable output contribute zero rows.
+    """
+    per_record = [extract_field_values([record]) if record.get('manual_fields') else {} for record in records]
+    fields = sorted({name for data in per_record for name in data})
+    field_index = {name: k for k, name in enumerate(fields)}
+    labels: Dict[Tuple[int, str], int] = {}
+    correct = np.zeros((len(records), len(fields)))
+    samples = np.zeros((len(records), len(fields)))
+    entries = []
+    for r, data in enumerate(per_record):
+        for name, values in data.items():
+            k = field_index[name]
+            for true_value, pred_value in zip(values['y_true'], values['y_pred']):
+                true_label = labels.setdefault((k, _serialize_for_comparison(true_value)), len(labels))
+                pred_label = labels.setdefault((k, _serialize_for_comparison(pred_value)), len(labels))
+                samples[r, k] += 1
+                entries.append((r, true_label, pred_label))
+                if true_label == pred_label:
+                    correct[r, k] += 1
+
+    rows, true_labels, pred_labels = (np.array(column, dtype=np.int64) for column in zip(*entries)) if entries \
+        else (np.zeros(0, dtype=np.int64),) * 3
+    hit = true_labels == pred_labels
+    shape = (len(records), len(labels))
+    tp = _count_matrix(rows[hit], true_labels[hit], shape)
+    true = _count_matrix(rows, true_labels, shape)
+    pred = _count_matrix(rows, pred_labels, shape)
+    label_field = np.zeros((len(labels), len(fields)))
+    for (k, _), column in labels.items():
+        label_field[column, k] = 1.0
+    return {'fields': fields, 'correct': correct, 'samples': samples, 'tp': tp, 'true': true, 'pred': pred,
+            'label_field': label_field}
+
+
+def _count_matrix(rows: np.ndarray, columns: np.ndarray, shape: Tuple[int, int]):
+    """Occurrences of each (row, column) pair, sparse when scipy is available"""
+    if SCIPY_AVAILABLE:
+        return sparse.csr_matrix((np.ones(len(rows)), (rows, columns)), shape=shape)
+    matrix = np.zeros(shape)
+    np.add.at(matrix, (rows, columns), 1)
+    return matrix
+
+
+def select_fields(arrays: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    """The same counts restricted to some of the fields"""
+    index = [arrays['fields'].index(name) for name in fields]
+    label_field = arrays['label_field'][:, index]
+    keep = label_field.any(axis=1)
+    return {'fields': fields, 'correct': arrays['correct'][:, index], 'samples': arrays['samples'][:, index],
+            'tp': arrays['tp'][:, keep], 'true': arrays['true'][:, keep], 'pred': arrays['pred'][:, keep],
+            'label_field': label_field[keep]}
+
+
+def resample_weights(n_records: int, resamples: int, seed: int = 0) -> np.ndarray:
+    """How often each record is drawn in each resample (resamples x records), from one index matrix"""
+    rng = np.random.default_rng(seed)
+    indices = rng.integers(0, n_records, size=(resamples, n_records))
+    offsets = np.arange(resamples)[:, None] * n_records
+    return np.bincount((indices + offsets).ravel(), minlength=resamples * n_records) \
+        .reshape(resamples, n_records).astype(np.float64)
+
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """numerator / denominator, NaN where the denominator is 0"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator > 0, numerator / np.where(denominator > 0, denominator, 1.0), np.nan)
+
+
+def weighted_metrics(arrays: Dict[str, Any], weights: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Per-field accuracy and support-weighted F1 (as in the evaluation) for every row of
+    record weights, plus their mean over fields: (resamples x fields) and (resamples,)
+    """
+    samples = weights @ arrays['samples']
+    accuracy = _ratio(weights @ arrays['correct'], samples)
+    tp, true, pred = weights @ arrays['tp'], weights @ arrays['true'], weights @ arrays['pred']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        label_f1 = np.where(true + pred > 0, 2.0 * tp / (true + pred), 0.0)
+    f1 = _ratio((true * label_f1) @ arrays['label_field'], samples)
+    with warnings.catch_warnings():
+        # Fields that a resample happens to miss entirely are left out of its mean
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return {
+            'accuracy': accuracy,
+            'f1': f1,
+            'overall_accuracy': np.nanmean(accuracy, axis=1),
+            'overall_f1': np.nanmean(f1, axis=1)
+        }
+
+
+def _interval(point: float, samples: np.ndarray, confidence: float) -> Dict[str, float]:
+    tail = (1.0 - confidence) / 2.0 * 100.0
+    samples = samples[~np.isnan(samples)]
+    low, high = np.percentile(samples, [tail, 100.0 - tail]) if samples.size else (np.nan, np.nan)
+    return {'estimate': float(point), 'low': float(low), 'high': float(high)}
+
+
+def _intervals(point: Dict[str, np.ndarray], boot: Dict[str, np.ndarray], fields: List[str],
+               confidence: float) -> Dict[str, Dict[str, Dict[str, float]]]:
+    results = {
+        name: {metric: _interval(point[metric][0, k], boot[metric][:, k], confidence) for metric in ('accuracy', 'f1')}
+        for k, name in enumerate(fields) if not np.isnan(point['accuracy'][0, k])
+    }
+    results[OVERALL] = {metric: _interval(point[f'overall_{metric}'][0], boot[f'overall_{metric}'], confidence)
+                        for metric in ('accuracy', 'f1')}
+    return results
+
+
+def confidence_intervals(records: List[Dict[str, Any]], resamples: int = 2000, confidence: float = 0.95,
+                         seed: int = 0) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """Percentile intervals of accuracy and F1 per field and overall (mean over fields)"""
+    arrays = record_arrays(records)
+    point = weighted_metrics(arrays, np.ones((1, len(records))))
+    boot = weighted_metrics(arrays, resample_weights(len(records), resamples, seed))
+    return _intervals(point, boot, arrays['fields'], confidence)
+
+
+def align_records(records_a: List[Dict[str, Any]], records_b: List[Dict[str, Any]]) -> Tuple[List[Dict], List[Dict]]:
+    """Pair the records of two runs over the same input by id (by position when ids are missing)"""
+    ids_b = {record.get('id'): record for record in records_b if record.get('id') is not None}
+    if ids_b and all(record.get('id') is not None for record in records_a):
+        pairs = [(record, ids_b[record['id']]) for record in records_a if record['id'] in ids_b]
+    else:
+        pairs = list(zip(records_a, records_b))
+    return [a for a, _ in pairs], [b for _, b in pairs]
+
+
+def paired_difference(records_a: List[Dict[str, Any]], records_b: List[Dict[str, Any]], resamples: int = 2000,
+                      confidence: float = 0.95, seed: int = 0) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """
+    Intervals of (run B - run A) per field and overall. Both runs are scored on the same
+    resampled records, so per-record difficulty cancels out. p_not_better is the share
+    of resamples in which B does not beat A.
+    """
+    records_a, records_b = align_records(records_a, records_b)
+    arrays_a, arrays_b = record_arrays(records_a), record_arrays(records_b)
+    fields = [name for name in arrays_a['fields'] if name in arrays_b['fields']]
+    arrays_a, arrays_b = select_fields(arrays_a, fields), select_fields(arrays_b, fields)
+    ones = np.ones((1, len(records_a)))
+    weights = resample_weights(len(records_a), resamples, seed)
+    point_a, point_b = weighted_metrics(arrays_a, ones), weighted_metrics(arrays_b, ones)
+    boot_a, boot_b = weighted_metrics(arrays_a, weights), weighted_metrics(arrays_b, weights)
+    point = {key: point_b[key] - point_a[key] for key in point_a}
+    boot = {key: boot_b[key] - boot_a[key] for key in boot_a}
+    results = _intervals(point, boot, fields, confidence)
+    for name, metrics in results.items():
+        for metric, interval in metrics.items():
+            diffs = boot[f'overall_{metric}'] if name == OVERALL else boot[metric][:, fields.index(name)]
+            diffs = diffs[~np.isnan(diffs)]
+            interval['p_not_better'] = float((diffs <= 0).mean()) if diffs.size else float('nan')
+    return results
+
+
+def print_intervals(results: Dict[str, Dict[str, Dict[str, float]]], confidence: float, paired: bool = False):
+    """Table of estimate [low, high] for accuracy and F1, overall row last"""
+    extra = f" {'P(no gain)':>12}" if paired else ''
+    print(f"{'Field':<28} {'Accuracy':>8} {f'{confidence:.0%} CI':>17} {'F1':>8} {f'{confidence:.0%} CI':>17}{extra}")
+    print("-" * (83 + len(extra)))
+    for name in sorted(results, key=lambda name: name == OVERALL):
+        accuracy, f1 = results[name]['accuracy'], results[name]['f1']
+        line = (f"{name:<28} {accuracy['estimate']:>8.3f} [{accuracy['low']:>6.3f}, {accuracy['high']:>6.3f}] "
+                f"{f1['estimate']:>8.3f} [{f1['low']:>6.3f}, {f1['high']:>6.3f}]")
+        if paired:
+            line += f" {accuracy['p_not_better']:>12.3f}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bootstrap confidence intervals of evaluation metrics')
+    parser.add_argument('run', help='Processed output file')
+    parser.add_argument('baseline', nargs='?', default=None,
+                        help='Second output file over the same input: report intervals of (run - baseline)')
+    parser.add_argument('--resamples', type=int, default=2000, help='Bootstrap resamples (default: 2000)')
+    parser.add_argument('--confidence', type=float, default=0.95, help='Interval coverage (default: 0.95)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+    args = parser.parse_args()
+
+    records = load_processed_data(args.run)
+    start = time.perf_counter()
+    if args.baseline:
+        results = paired_difference(load_processed_data(args.baseline), records, args.resamples, args.confidence, args.seed)
+        print(f"\n=== Paired difference: {args.run} - {args.baseline} ===")
+    else:
+        results = confidence_intervals(records, args.resamples, args.confidence, args.seed)
+        print(f"\n=== Bootstrap intervals: {args.run} ===")
+    seconds = time.perf_counter() - start
+    print_intervals(results, args.confidence, paired=bool(args.baseline))
+    print(f"\n{len(records)} records, {args.resamples} resamples in {seconds:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
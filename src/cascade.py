@@ -0,0 +1,140 @@
+"""
+Model cascade - run a cheap tier first and escalate records that fail local checks
+"""
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from src.columnar import category_columns
+from src.consistency import result_rows
+from src.schema import validate_parse_fields
+from src.utils import get_logger, extract_field_values, _serialize_for_comparison
+
+logger = get_logger('cascade')
+
+# Local checks in the order they are applied; the first failing one is the escalation reason
+ESCALATION_REASONS = ('extraction_failed', 'schema_violation', 'disagreement', 'low_coverage')
+
+
+class CascadePolicy:
+    """
+    Ordered model tiers (API client names) per category and the local checks that decide
+    whether a record is accepted at its current tier or escalated to the next one.
+    """
+
+    def __init__(self,
+                 tiers: List[str],
+                 category_tiers: Optional[Dict[str, List[str]]] = None,
+                 min_coverage: float = 0.8,
+                 min_agreement: float = 1.0,
+                 prices: Optional[Dict[str, float]] = None):
+        self.tiers = list(tiers)
+        self.category_tiers = {k.lower(): list(v) for k, v in (category_tiers or {}).items()}
+        self.min_coverage = min_coverage
+        self.min_agreement = min_agreement
+        self.prices = prices or {}  # tier -> price per 1K tokens
+
+    def tiers_for(self, category: Optional[str]) -> List[str]:
+        """Tiers for a category, cheapest first"""
+        return self.category_tiers.get((category or '').lower(), self.tiers)
+
+    def check(self, record: Dict[str, Any], category: Optional[str]) -> Optional[str]:
+        """Escalation reason for a processed record, or None if it is accepted"""
+        parse_fields = record.get('parse_fields')
+        if parse_fields is None or (isinstance(parse_fields, dict) and 'error' in parse_fields):
+            return 'extraction_failed'
+        if not isinstance(parse_fields, (dict, list)):
+            # Text that never became JSON
+            return 'extraction_failed'
+
+        if category and validate_parse_fields(parse_fields, category):
+            return 'schema_violation'
+
+        agreement = (record.get('consistency_info') or {}).get('agreement')
+        if agreement is not None and agreement < self.min_agreement:
+            return 'disagreement'
+
+        rows = result_rows(parse_fields)
+        columns = set(category_columns(category)) if category else set()
+        if not rows:
+            return 'low_coverage'
+        if columns:
+            coverage = sum(
+                sum(1 for column in columns if row.get(column) is not None) / len(columns) for row in rows
+            ) / len(rows)
+            if coverage < self.min_coverage:
+                return 'low_coverage'
+        return None
+
+
+def count_accurate_fields(records: List[Dict[str, Any]]) -> tuple[int, int]:
+    """(accurate, evaluated) field counts for records with manual labels, as in calculate_metrics"""
+    field_data = extract_field_values([r for r in records if r.get('manual_fields')])
+    accurate = evaluated = 0
+    for data in field_data.values():
+        for y_true, y_pred in zip(data['y_true'], data['y_pred']):
+            evaluated += 1
+            accurate += _serialize_for_comparison(y_true) == _serialize_for_comparison(y_pred)
+    return accurate, evaluated
+
+
+def new_cascade_stats() -> Dict[str, Any]:
+    return {
+        'records': 0,
+        'escalated': 0,
+        'reasons': Counter(),
+        'tier_attempts': Counter(),
+        'final_tier': Counter(),
+        'accurate_fields': 0,
+        'evaluated_fields': 0
+    }
+
+
+def cascade_report(stats: Dict[str, Any], policy: CascadePolicy, client_stats: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Escalation rate, per-tier usage and cost per accurate field"""
+    tiers = {}
+    total_cost = 0.0
+    priced = True
+    for tier in dict.fromkeys(policy.tiers + [t for ts in policy.category_tiers.values() for t in ts]):
+        tokens = (client_stats.get(tier) or {}).get('tokens', 0)
+        price = policy.prices.get(tier)
+        cost = tokens / 1000 * price if price is not None else None
+        if cost is None:
+            priced = False
+        else:
+            total_cost += cost
+        tiers[tier] = {
+            'attempts': stats['tier_attempts'][tier],
+            'final_records': stats['final_tier'][tier],
+            'tokens': tokens,
+            'cost': cost
+        }
+
+    return {
+        'records': stats['records'],
+        'escalated': stats['escalated'],
+        'escalation_rate': stats['escalated'] / stats['records'] if stats['records'] else 0.0,
+        'reasons': dict(stats['reasons']),
+        'tiers': tiers,
+        'total_cost': total_cost if priced else None,
+        'accurate_fields': stats['accurate_fields'],
+        'evaluated_fields': stats['evaluated_fields'],
+        'cost_per_accurate_field': total_cost / stats['accurate_fields'] if priced and stats['accurate_fields'] else None
+    }
+
+
+def print_cascade_report(report: Dict[str, Any]):
+    """Print the cascade report"""
+    print("\n=== Model Cascade Report ===")
+    print(f"Records: {report['records']}, escalated: {report['escalated']} ({report['escalation_rate']:.1%})")
+    if report['reasons']:
+        print("Escalation reasons: " + ", ".join(f"{k}={v}" for k, v in sorted(report['reasons'].items())))
+    print(f"\n{'Tier':<28} {'Attempts':>9} {'Final':>7} {'Tokens':>10} {'Cost':>10}")
+    print("-" * 68)
+    for tier, row in report['tiers'].items():
+        cost = f"{row['cost']:.4f}" if row['cost'] is not None else 'n/a'
+        print(f"{tier:<28} {row['attempts']:>9} {row['final_records']:>7} {row['tokens']:>10} {cost:>10}")
+    if report['evaluated_fields']:
+        print(f"\nAccurate fields: {report['accurate_fields']}/{report['evaluated_fields']} "
+              f"({report['accurate_fields'] / report['evaluated_fields']:.1%})")
+    if report['cost_per_accurate_field'] is not None:
+        print(f"Cost per accurate field: {report['cost_per_accurate_field']:.6f}")
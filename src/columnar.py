@@ -0,0 +1,233 @@
+"""
+Columnar export - flatten parse_fields rows into per-category Arrow tables and partitioned Parquet
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Add project root directory to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from config.settings import Config
+from src.consistency import result_rows
+from src.utils import get_logger
+
+# Arrow/Parquet support is optional; the pipeline runs without it
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+logger = get_logger('columnar')
+
+# Low-cardinality columns stored dictionary-encoded
+DICTIONARY_COLUMNS = {'airport', 'status_type', 'flight_type', 'runway', 'category',
+                      'navaid_type', 'procedure_type', 'approach_type', 'area_type', 'restriction_Type'}
+# Record-level columns written before the category fields
+BASE_COLUMNS = ['record_id', 'row_index', 'success']
+EXTRA_COLUMN = 'extra_fields'
+UNKNOWN_CATEGORY = 'unknown'
+ROWS_PER_FILE = 100_000
+
+
+def category_columns(category: str) -> List[str]:
+    """Row columns of a category in Config.CATEGORY_FIELDS order (discarded/None and telex columns dropped)"""
+    fields = Config.CATEGORY_FIELDS.get(category)
+    if fields is None:
+        # Category keys are case-sensitive in Config (e.g. 'RVR')
+        fields = next((v for k, v in Config.CATEGORY_FIELDS.items() if k.lower() == category.lower()), [])
+    columns = []
+    for field in fields:
+        if field and field != 'telex' and field not in columns and field not in BASE_COLUMNS:
+            columns.append(field)
+    return columns
+
+
+def _cell(value: Any) -> Optional[str]:
+    """Parsed values are heterogeneous (str, number, list...); store them as text"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, default=str)
+
+
+def flatten_record(record: Dict[str, Any], columns: List[str]) -> List[Dict[str, Any]]:
+    """One flat row per parse_fields row; fields outside the schema go to extra_fields as JSON"""
+    parse_fields = record.get('parse_fields')
+    success = parse_fields is not None and not (isinstance(parse_fields, dict) and 'error' in parse_fields)
+    record_id = _cell(record.get('id'))
+    rows = result_rows(parse_fields) if success else []
+    if not rows:
+        # Keep failed / empty records visible as a single row without fields
+        rows = [{}]
+
+    flat_rows = []
+    for row_index, row in enumerate(rows):
+        flat = {'record_id': record_id, 'row_index': row_index, 'success': success}
+        for column in columns:
+            flat[column] = _cell(row.get(column))
+        extra = {k: v for k, v in row.items() if k not in flat}
+        flat[EXTRA_COLUMN] = json.dumps(extra, ensure_ascii=False, default=str) if extra else None
+        flat_rows.append(flat)
+    return flat_rows
+
+
+def arrow_schema(columns: List[str]) -> 'pa.Schema':
+    """Schema for a category table: dictionary<int32, string> for repetitive columns, string otherwise"""
+    fields = [pa.field('record_id', pa.string()), pa.field('row_index', pa.int32()), pa.field('success', pa.bool_())]
+    for column in columns + [EXTRA_COLUMN]:
+        column_type = pa.dictionary(pa.int32(), pa.string()) if column in DICTIONARY_COLUMNS else pa.string()
+        fields.append(pa.field(column, column_type))
+    return pa.schema(fields)
+
+
+def rows_to_table(flat_rows: List[Dict[str, Any]], columns: List[str]) -> 'pa.Table':
+    """Arrow table from flattened rows"""
+    schema = arrow_schema(columns)
+    arrays = []
+    for field in schema:
+        values = [row.get(field.name) for row in flat_rows]
+        if pa.types.is_dictionary(field.type):
+            arrays.append(pa.array(values, type=pa.string()).dictionary_encode())
+        else:
+            arrays.append(pa.array(values, type=field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+class ParquetExporter:
+    """
+    Pipeline sink: buffers flattened rows per category and writes Parquet files under
+    <root>/category=<category>/run=<run_id>/part-NNNNN.parquet (hive partitioning).
+    """
+
+    def __init__(self, root: str, run_id: Optional[str] = None, default_category: Optional[str] = None,
+                 rows_per_file: int = ROWS_PER_FILE):
+        if not PYARROW_AVAILABLE:
+            raise RuntimeError("Parquet export requires 'pyarrow' (pip install pyarrow)")
+        self.root = Path(root)
+        self.run_id = run_id or time.strftime('%Y%m%d_%H%M%S')
+        self.default_category = default_category or UNKNOWN_CATEGORY
+        self.rows_per_file = rows_per_file
+        self._buffers: Dict[str, List[Dict[str, Any]]] = {}
+        self._parts: Dict[str, int] = {}
+        self.stats = {'records': 0, 'rows': 0, 'files': 0}
+
+    def add_records(self, records: Iterable[Dict[str, Any]]):
+        for record in records:
+            category = record.get('category') or self.default_category
+            buffer = self._buffers.setdefault(category, [])
+            buffer.extend(flatten_record(record, category_columns(category)))
+            self.stats['records'] += 1
+            if len(buffer) >= self.rows_per_file:
+                self._flush(category)
+
+    def _flush(self, category: str):
+        rows = self._buffers.pop(category, [])
+        if not rows:
+            return
+        part = self._parts.get(category, 0)
+        self._parts[category] = part + 1
+        directory = self.root / f"category={category}" / f"run={self.run_id}"
+        directory.mkdir(parents=True, exist_ok=True)
+        table = rows_to_table(rows, category_columns(category))
+        pq.write_table(table, directory / f"part-{part:05d}.parquet", compression='zstd',
+                       use_dictionary=[c for c in table.column_names if c in DICTIONARY_COLUMNS])
+        self.stats['rows'] += len(rows)
+        self.stats['files'] += 1
+
+    def close(self) -> Dict[str, Any]:
+        """Write remaining buffers, return export statistics"""
+        for category in list(self._buffers):
+            self._flush(category)
+        logger.info(f"Parquet export: {self.stats['rows']} rows from {self.stats['records']} records "
+                    f"in {self.stats['files']} files under {self.root}")
+        return {**self.stats, 'path': str(self.root), 'run_id': self.run_id}
+
+
+_OPERATORS = {
+    '==': lambda field, value: field == value,
+    '!=': lambda field, value: field != value,
+    '<': lambda field, value: field < value,
+    '<=': lambda field, value: field <= value,
+    '>': lambda field, value: field > value,
+    '>=': lambda field, value: field >= value,
+    'in': lambda field, value: field.isin(value),
+}
+
+
+def read_rows(root: str, category: str, filters: Optional[List[Tuple[str, str, Any]]] = None,
+              columns: Optional[List[str]] = None) -> 'pa.Table':
+    """
+    Read one category (all runs) with predicates pushed down to the Parquet scan,
+    e.g. filters=[('airport', '==', 'ZBAA'), ('run', '==', '20250101_120000')].
+    """
+    if not PYARROW_AVAILABLE:
+        raise RuntimeError("Parquet reading requires 'pyarrow' (pip install pyarrow)")
+    dataset = ds.dataset(Path(root) / f"category={category}", format='parquet', partitioning='hive')
+    expression = None
+    for column, op, value in filters or []:
+        term = _OPERATORS[op](ds.field(column), value)
+        expression = term if expression is None else expression & term
+    return dataset.to_table(columns=columns, filter=expression)
+
+
+def category_from_path(file_path: str) -> Optional[str]:
+    """Category named by a file such as runway_test.json or runway_test_output.json"""
+    stem = Path(file_path).stem.split('_')[0]
+    return next((k for k in Config.CATEGORY_FIELDS if k.lower() == stem.lower()), None)
+
+
+def export_file(input_file: str, root: str, run_id: Optional[str] = None,
+                category: Optional[str] = None) -> Dict[str, Any]:
+    """Standalone conversion of a processed JSON/JSONL output file"""
+    from src.streaming import iter_records
+
+    exporter = ParquetExporter(root, run_id=run_id or Path(input_file).stem,
+                               default_category=category or category_from_path(input_file))
+    exporter.add_records(iter_records(input_file))
+    return exporter.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export processed NOTAM rows to partitioned Parquet, or query them')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    convert = subparsers.add_parser('convert', help='Convert processed output files to Parquet')
+    convert.add_argument('files', nargs='+', help='Processed output files (JSON or JSONL)')
+    convert.add_argument('--out', default='data/parquet', help='Dataset root directory (default: data/parquet)')
+    convert.add_argument('--run', help='Run partition value (default: input file stem)')
+    convert.add_argument('--category', help='Category for records without a category field (default: from file name)')
+
+    query = subparsers.add_parser('query', help='Read rows of one category with predicates')
+    query.add_argument('category', help='Category partition to read')
+    query.add_argument('--root', default='data/parquet', help='Dataset root directory (default: data/parquet)')
+    query.add_argument('--where', action='append', default=[], metavar='COLUMN=VALUE', help='Equality predicate (repeatable)')
+    query.add_argument('--limit', type=int, default=20, help='Rows to print (default: 20)')
+    args = parser.parse_args()
+
+    if not PYARROW_AVAILABLE:
+        parser.error("pyarrow is not installed (pip install pyarrow)")
+
+    if args.command == 'convert':
+        for file_path in args.files:
+            stats = export_file(file_path, args.out, run_id=args.run, category=args.category)
+            print(f"{file_path}: {stats['rows']} rows from {stats['records']} records -> {stats['path']} (run={stats['run_id']})")
+    else:
+        filters = [(clause.split('=', 1)[0], '==', clause.split('=', 1)[1]) for clause in args.where]
+        start = time.time()
+        table = read_rows(args.root, args.category, filters=filters)
+        elapsed = time.time() - start
+        print(table.slice(0, args.limit).to_pandas().to_string())
+        print(f"\n{table.num_rows} rows in {elapsed * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""
+Row-set comparison - rows canonicalized to hashable keys and compared as multisets (exact, subset or key-field modes)
+"""
+import argparse
+import glob
+import json
+import random
+import sys
+import time
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Add project root directory to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.utils import get_logger, canonical_form
+
+# config.yaml holds the per-type field mappings used by the key mode
+try:
+    import yaml
+    YAML_AVAILABLE = True
+except ImportError:
+    YAML_AVAILABLE = False
+
+logger = get_logger('comparison')
+
+CONFIG_FILE = project_root / 'config.yaml'
+MODES = ('exact', 'subset', 'key')
+
+
+@lru_cache(maxsize=None)
+def load_comparison_config(path: str = str(CONFIG_FILE)) -> Dict[str, Any]:
+    """The comparison section of config.yaml ({} when missing or pyyaml is not installed)"""
+    if not YAML_AVAILABLE or not Path(path).exists():
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return (yaml.safe_load(f) or {}).get('comparison', {}) or {}
+
+
+def field_mapping(data_type: Optional[str], config: Optional[Dict[str, Any]] = None) -> Dict[str, List[str]]:
+    """core_fields, optional_fields and exclude_fields (global + per type) of a data type"""
+    config = load_comparison_config() if config is None else config
+    mapping = ((config.get('field_mappings') or {}).get(data_type) or {}) if data_type else {}
+    return {
+        'core_fields': list(mapping.get('core_fields') or []),
+        'optional_fields': list(mapping.get('optional_fields') or []),
+        'exclude_fields': list(config.get('global_exclude_fields') or []) + list(mapping.get('exclude_fields') or [])
+    }
+
+
+def as_rows(data: Any) -> List[Any]:
+    """A parsed result ({'rows': [...]}, a list of rows or a single row) as a list of rows"""
+    if isinstance(data, dict):
+        return data['rows'] if isinstance(data.get('rows'), list) else [data]
+    if isinstance(data, list):
+        return data
+    return [] if data is None else [data]
+
+
+def row_key(row: Any, fields: Optional[Iterable[str]] = None, exclude: Iterable[str] = ()) -> Tuple:
+    """
+    Hashable canonical form of a row: sorted (field, canonical value) pairs over the given
+    fields (all fields of the row when None). Values compare as in the evaluation.
+    """
+    if not isinstance(row, dict):
+        return (('', canonical_form(row)),)
+    if fields is None:
+        fields = [name for name in row if name not in exclude]
+    return tuple(sorted((name, canonical_form(row.get(name))) for name in fields))
+
+
+def _difference(api_rows: List[Any], gold_rows: List[Any], fields: Optional[List[str]],
+                exclude: List[str]) -> Tuple[List[Any], List[Any]]:
+    """(API rows without a gold counterpart, gold rows without an API counterpart) over the fields"""
+    api_keys = [row_key(row, fields, exclude) for row in api_rows]
+    gold_keys = [row_key(row, fields, exclude) for row in gold_rows]
+    counts = Counter(api_keys)
+    counts.subtract(gold_keys)
+    if not any(counts.values()):
+        return [], []
+    return _take(api_rows, api_keys, +counts), _take(gold_rows, gold_keys, -counts)
+
+
+def _take(rows: List[Any], keys: List[Tuple], counts: Counter) -> List[Any]:
+    """The rows whose keys are left over in counts (as many as are left over)"""
+    counts = Counter(counts)
+    selected = []
+    for row, key in zip(rows, keys):
+        if counts[key] > 0:
+            counts[key] -= 1
+            selected.append(row)
+    return selected
+
+
+def compare_rows(api_json: Any, gold_json: Any, mode: str = 'exact', data_type: Optional[str] = None,
+                 config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Compare two row sets as multisets, ignoring row order. Modes:
+      exact  - every field (minus the configured exclude_fields) must agree
+      subset - only the fields the API rows carry are compared, so omitted fields are not errors
+      key    - only the type's core_fields decide the match; optional_fields of rows that match
+               on the core fields are compared and reported without affecting the result
+    Returns match, the compared fields, unexpected (API) rows and missing (gold) rows.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown comparison mode: {mode} (expected one of {MODES})")
+    mapping = field_mapping(data_type, config)
+    exclude = mapping['exclude_fields']
+    api_rows, gold_rows = as_rows(api_json), as_rows(gold_json)
+
+    if mode == 'exact':
+        fields = None
+    elif mode == 'subset':
+        fields = sorted({name for row in api_rows if isinstance(row, dict) for name in row} - set(exclude))
+    else:
+        if not mapping['core_fields']:
+            raise ValueError(f"No core_fields configured for data type: {data_type}")
+        fields = [name for name in mapping['core_fields'] if name not in exclude]
+
+    unexpected, missing = _difference(api_rows, gold_rows, fields, exclude)
+    result = {
+        'match': not unexpected and not missing,
+        'mode': mode,
+        'fields': fields,
+        'api_rows': len(api_rows),
+        'gold_rows': len(gold_rows),
+        'unexpected': unexpected,
+        'missing': missing
+    }
+    if mode == 'key':
+        result['optional_mismatches'] = _optional_mismatches(api_rows, gold_rows, fields, mapping['optional_fields'])
+    return result
+
+
+def _optional_mismatches(api_rows: List[Any], gold_rows: List[Any], core_fields: List[str],
+                         optional_fields: List[str]) -> List[Dict[str, Any]]:
+    """Per core key shared by both sides: the API and gold rows whose optional fields differ"""
+    optional_fields = [name for name in optional_fields if name not in core_fields]
+    if not optional_fields:
+        return []
+    groups: Dict[Tuple, Tuple[List[Any], List[Any]]] = {}
+    for side, rows in enumerate((api_rows, gold_rows)):
+        for row in rows:
+            if isinstance(row, dict):
+                groups.setdefault(row_key(row, core_fields), ([], []))[side].append(row)
+    mismatches = []
+    for key, (api_group, gold_group) in groups.items():
+        if api_group and gold_group:
+            unexpected, missing = _difference(api_group, gold_group, optional_fields, [])
+            if unexpected or missing:
+                mismatches.append({'key': dict(key), 'api': unexpected, 'gold': missing})
+    return mismatches
+
+
+def legacy_compare(api_json: Any, gold_json: Any) -> bool:
+    """The former compare_json_results: nested scan, each API row needs some gold row agreeing on its keys"""
+    if not isinstance(api_json, list) or not isinstance(gold_json, list) or len(api_json) != len(gold_json):
+        return False
+    for api_item in api_json:
+        if not isinstance(api_item, dict):
+            return False
+        if not any(isinstance(gold_item, dict) and all(api_item.get(key) == gold_item.get(key) for key in api_item)
+                   for gold_item in gold_json):
+            return False
+    return True
+
+
+def scaling_benchmark(sizes: List[int] = (10, 50, 200), seed: int = 0) -> List[Dict[str, Any]]:
+    """Time of both comparisons on NOTAMs with many rows: dataset rows, parsed in shuffled order"""
+    rng = random.Random(seed)
+    rows = []
+    for file_path in sorted(glob.glob(str(project_root / 'dataset' / '*_test.json'))):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            rows.extend(row for item in json.load(f) for row in as_rows(json.loads(item['output'])) if isinstance(row, dict))
+    results = []
+    for size in sizes:
+        gold = rng.sample(rows, size)
+        api = rng.sample(gold, size)
+        timings = {}
+        for name, compare in (('former', legacy_compare), ('multiset', lambda a, g: compare_rows(a, g)['match'])):
+            start = time.perf_counter()
+            compare(api, gold)
+            timings[name] = time.perf_counter() - start
+        results.append({'rows': size, **timings})
+    return results
+
+
+def _file_pairs(file_path: str) -> List[Tuple[Any, Any]]:
+    """(parse_fields, manual_fields) of the labelled records of an output file"""
+    from src.utils import load_processed_data
+    return [(record.get('parse_fields'), record['manual_fields'])
+            for record in load_processed_data(file_path) if record.get('manual_fields')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare parsed rows with the labels of an output file')
+    parser.add_argument('files', nargs='*', help='Processed output files (default: synthetic predictions over dataset/*_test.json)')
+    parser.add_argument('--mode', choices=MODES, default='exact', help='Comparison mode (default: exact)')
+    parser.add_argument('--data-type', default=None,
+                        help='Type in config.yaml comparison.field_mappings (default: from the file name)')
+    parser.add_argument('--show', type=int, default=3, help='Differing records to print per file (default: 3)')
+    args = parser.parse_args()
+
+    if args.files:
+        sources = [(f, _file_pairs(f)) for f in args.files]
+    else:
+        from src.metrics import synthetic_records
+        sources = [('synthetic', [(r['parse_fields'], r['manual_fields']) for r in synthetic_records(0.05)])]
+
+    for name, pairs in sources:
+        data_type = args.data_type or Path(name).stem.split('_')[0]
+        start = time.perf_counter()
+        try:
+            results = [compare_rows(api, gold, args.mode, data_type) for api, gold in pairs]
+        except ValueError as e:
+            print(f"\n{name}: {e}")
+            continue
+        seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        legacy = [legacy_compare(as_rows(api), as_rows(gold)) for api, gold in pairs]
+        legacy_seconds = time.perf_counter() - start
+
+        matched = sum(result['match'] for result in results)
+        print(f"\n=== {name} ({args.mode}, {data_type}) ===")
+        print(f"Records: {len(pairs)}, matching: {matched} ({matched / len(pairs) if pairs else 0:.1%}); "
+              f"former comparison: {sum(legacy)} matching")
+        print(f"Time: {seconds * 1e3:.1f} ms (former: {legacy_seconds * 1e3:.1f} ms)")
+        for result in [r for r in results if not r['match']][:args.show]:
+            print(f"  {result['gold_rows']} gold / {result['api_rows']} parsed rows")
+            for row in result['missing']:
+                print(f"    missing:    {row}")
+            for row in result['unexpected']:
+                print(f"    unexpected: {row}")
+
+    print(f"\n{'Rows':>6} {'Former ms':>10} {'Multiset ms':>12}")
+    for row in scaling_benchmark():
+        print(f"{row['rows']:>6} {row['former'] * 1e3:>10.2f} {row['multiset'] * 1e3:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
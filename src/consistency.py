@@ -0,0 +1,183 @@
+"""
+Self-consistency helpers - field-level consensus voting and adaptive agreement checks
+"""
+import json
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.utils import get_logger, canonical_form
+
+logger = get_logger('consistency')
+
+
+def canonical_key(data: Any) -> str:
+    """Stable key for a parsed result, independent of dict key order and spacing"""
+    try:
+        return json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+    except (TypeError, ValueError):
+        return str(data)
+
+
+def result_rows(data: Any) -> List[Dict[str, Any]]:
+    """Normalize a parsed result (dict, {'rows': [...]} or list) into a list of row dicts"""
+    if isinstance(data, dict):
+        if 'rows' in data and isinstance(data['rows'], list):
+            return [row for row in data['rows'] if isinstance(row, dict)]
+        return [data]
+    if isinstance(data, list):
+        return [row for row in data if isinstance(row, dict)]
+    return []
+
+
+def canonical_value(value: Any) -> str:
+    """Canonical form of a single field value, the same (memoized) form the evaluation compares"""
+    return canonical_form(value)
+
+
+def _row_hashes(row: Dict[str, Any]) -> Dict[str, int]:
+    """Hash every field value of a row once"""
+    return {field_name: hash(canonical_value(value)) for field_name, value in row.items()}
+
+
+def _align_rows(reference: List[Dict[str, int]], rows: List[Dict[str, int]]) -> List[Optional[int]]:
+    """Map each reference row to a row of another round: identical rows first, then by position"""
+    row_keys = [frozenset(hashes.items()) for hashes in rows]
+    by_key: Dict[frozenset, List[int]] = {}
+    for idx, key in enumerate(row_keys):
+        by_key.setdefault(key, []).append(idx)
+
+    aligned: List[Optional[int]] = [None] * len(reference)
+    used = set()
+    for ref_idx, hashes in enumerate(reference):
+        candidates = by_key.get(frozenset(hashes.items()))
+        if candidates:
+            aligned[ref_idx] = candidates.pop(0)
+            used.add(aligned[ref_idx])
+
+    remaining = (idx for idx in range(len(rows)) if idx not in used)
+    for ref_idx in range(len(reference)):
+        if aligned[ref_idx] is None:
+            aligned[ref_idx] = next(remaining, None)
+    return aligned
+
+
+def _with_rows(template: Any, rows: List[Dict[str, Any]]) -> Any:
+    """Rebuild a result in the same shape as template ({'rows': [...]}, list or single dict)"""
+    if isinstance(template, dict) and 'rows' in template and isinstance(template['rows'], list):
+        return {**template, 'rows': rows}
+    if isinstance(template, list):
+        return rows
+    return rows[0] if len(rows) == 1 else rows
+
+
+def vote_fields(datas: List[Any]) -> Dict[str, Any]:
+    """
+    Field-level plurality vote over the parsed results of several rounds.
+    Rows are aligned to the first round with the plurality row count; every field
+    value is canonicalized and hashed once, and each (row, field) slot takes the
+    value most rounds agree on.
+    Returns {'data', 'agreement', 'field_agreement', 'row_count_agreement'}.
+    """
+    if not datas:
+        return {'data': None, 'agreement': 0.0, 'field_agreement': {}, 'row_count_agreement': 0.0}
+
+    all_rows = [result_rows(data) for data in datas]
+    all_hashes = [[_row_hashes(row) for row in rows] for rows in all_rows]
+
+    count_votes = Counter(len(rows) for rows in all_rows)
+    row_count, row_count_votes = count_votes.most_common(1)[0]
+    row_count_agreement = row_count_votes / len(datas)
+    reference = next(idx for idx, rows in enumerate(all_rows) if len(rows) == row_count)
+
+    alignments = [
+        _align_rows(all_hashes[reference], hashes) if idx != reference else list(range(row_count))
+        for idx, hashes in enumerate(all_hashes)
+    ]
+
+    consensus_rows = []
+    field_agreement: Dict[str, float] = {}
+    for row_idx in range(row_count):
+        votes: Dict[str, Counter] = {}
+        first_value: Dict[Tuple[str, int], Any] = {}
+        for round_idx, alignment in enumerate(alignments):
+            aligned = alignment[row_idx]
+            if aligned is None:
+                continue
+            row = all_rows[round_idx][aligned]
+            for field_name, value_hash in all_hashes[round_idx][aligned].items():
+                votes.setdefault(field_name, Counter())[value_hash] += 1
+                first_value.setdefault((field_name, value_hash), row[field_name])
+
+        consensus_row = {}
+        for field_name in all_rows[reference][row_idx]:
+            value_hash, count = votes[field_name].most_common(1)[0]
+            consensus_row[field_name] = first_value[(field_name, value_hash)]
+            share = count / len(datas)
+            field_agreement[field_name] = min(field_agreement.get(field_name, 1.0), share)
+        consensus_rows.append(consensus_row)
+
+    agreement = min([row_count_agreement, *field_agreement.values()])
+    return {
+        'data': _with_rows(datas[reference], consensus_rows) if row_count else datas[reference],
+        'agreement': agreement,
+        'field_agreement': field_agreement,
+        'row_count_agreement': row_count_agreement
+    }
+
+
+def record_agreement(datas: List[Any]) -> float:
+    """Share of rounds that returned exactly the plurality answer"""
+    if not datas:
+        return 0.0
+    counts = Counter(canonical_key(data) for data in datas)
+    return counts.most_common(1)[0][1] / len(datas)
+
+
+def field_agreement(datas: List[Any]) -> float:
+    """Weakest per-field plurality share across rounds (field-level quorum)"""
+    return vote_fields(datas)['agreement']
+
+
+class AdaptiveConsistencyPolicy:
+    """Decide when a record has enough agreeing rounds to stop sampling"""
+
+    LEVELS = ('record', 'field')
+
+    def __init__(self,
+                 min_rounds: int = 2,
+                 max_rounds: int = 5,
+                 threshold: float = 1.0,
+                 level: str = 'record'):
+        if level not in self.LEVELS:
+            logger.warning(f"Unknown agreement level: {level}, using record")
+            level = 'record'
+        self.max_rounds = max(1, max_rounds)
+        self.min_rounds = max(1, min(min_rounds, self.max_rounds))
+        self.threshold = threshold
+        self.level = level
+
+    def agreement(self, round_results: List[Dict]) -> float:
+        """Agreement score of the successful rounds collected so far"""
+        datas = [r['result'].get('data') for r in round_results if r['result'].get('success')]
+        if self.level == 'field':
+            return field_agreement(datas)
+        return record_agreement(datas)
+
+    def is_settled(self, round_results: List[Dict]) -> bool:
+        """True when no further rounds should be issued for this record"""
+        if len(round_results) >= self.max_rounds:
+            return True
+        successful = sum(1 for r in round_results if r['result'].get('success'))
+        if successful < self.min_rounds:
+            return False
+        return self.agreement(round_results) >= self.threshold
+
+    def next_rounds(self, round_results: List[Dict]) -> int:
+        """Number of rounds to issue in the next wave (0 when settled)"""
+        if not round_results:
+            return self.min_rounds
+        if self.is_settled(round_results):
+            return 0
+        successful = sum(1 for r in round_results if r['result'].get('success'))
+        missing = max(1, self.min_rounds - successful)
+        return min(missing, self.max_rounds - len(round_results))
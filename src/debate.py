@@ -3,6 +3,7 @@ import time
 import random
 from typing import List, Dict, Any
 from api_manager import create_api_manager, APIManager
+from serialization import dump_json, load_json
 
 # API Configuration
 API_CONFIG = {
@@ -198,8 +199,7 @@ class DebateSystem:
 
     def load_initial_data(self) -> List[Dict]:
         """Load and deduplicate initial data."""
-        with open(self.input_file, 'r', encoding='utf-8') as f:
-            initial_data = json.load(f)
+        initial_data = load_json(self.input_file)
         
         # Initial deduplication to handle duplicate dirty data during loading
         field_dict = {}
@@ -218,8 +218,7 @@ class DebateSystem:
     def save_intermediate_result(self, stage: str, data: any):
         """Save intermediate results."""
         filename = f"data/output/intermediate_{stage}.json"
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        dump_json(data, filename)
         print(f"💾 Intermediate results saved to {filename}")
 
     def _get_proposals_from_llm(self, agent_name: str, current_fields: List[Dict], context_prompt: str = "", batch_size: int = 50) -> List[Dict]:
@@ -447,8 +446,7 @@ if __name__ == "__main__":
         result = debate_system.run_debate(use_batch_processing=True)
         
         # Save results
-        with open(output_filename, 'w', encoding='utf-8') as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
+        dump_json(result, output_filename)
         
         print(f"\n✅ Debate completed!")
         print(f"📊 Field count reduced from {result['initial_count']} to {result['final_count']}")
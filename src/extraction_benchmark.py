@@ -0,0 +1,200 @@
+"""
+JSON extraction benchmark - speed and recovery rate of extract_json_from_text against the former regex cascade
+"""
+import argparse
+import glob
+import json
+import logging
+import random
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Add project root directory to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.utils import get_logger, extract_json_from_text, ORJSON_AVAILABLE
+
+logger = get_logger('extraction_benchmark')
+
+# Sentinel for responses that hold no complete JSON document
+UNRECOVERABLE = object()
+
+_LEGACY_PATTERNS = [
+    r'```json\n(.*?)\n```',
+    r'```\s*json\s*\n(.*?)\n\s*```',
+    r'json\n([\s\S]*)',
+    r'(?:json)?\s*\n?\s*(\[[\s\S]*?\])',
+    r'(?:json)?\s*\n?\s*(\{[\s\S]*?\})'
+]
+
+
+def legacy_extract(content: str) -> Any:
+    """The regex cascade extract_json_from_text used before the scanner (logging removed)"""
+    if not content:
+        return None
+    content = content.strip()
+    for pattern in _LEGACY_PATTERNS:
+        match = re.search(pattern, content, re.DOTALL)
+        if match:
+            try:
+                return json.loads(match.group(1).strip().replace('\\"', '"'))
+            except json.JSONDecodeError:
+                continue
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError:
+        pass
+    if content.startswith('"') and content.endswith('"'):
+        try:
+            return json.loads(content[1:-1].replace('\\"', '"'))
+        except json.JSONDecodeError:
+            pass
+    return None
+
+
+# Response shapes seen from chat models asked for JSON, each wrapping the expected value
+def _fenced(value, rng):
+    return f"```json\n{json.dumps(value, ensure_ascii=False, indent=2)}\n```"
+
+def _fenced_with_prose(value, rng):
+    return (f"Here is the extracted information:\n\n```\n{json.dumps(value, ensure_ascii=False)}\n```\n\n"
+            f"Fields not stated in the NOTAM are set to null.")
+
+def _preamble_and_braced_note(value, rng):
+    return (f"Based on the NOTAM, the parsed result is: {json.dumps(value, ensure_ascii=False)}\n"
+            f"Note: values such as {{runway}} follow the [designator] format of item E).")
+
+def _reasoning(value, rng):
+    return (f"<think>\nThe NOTAM mentions a closure, so the output is {{\"status\": ...}} with the [fields] "
+            f"listed.\n</think>\n\n{json.dumps(value, ensure_ascii=False)}")
+
+def _double_encoded(value, rng):
+    return json.dumps(json.dumps(value, ensure_ascii=False), ensure_ascii=False)
+
+def _schema_echo(value, rng):
+    return ("The output format is {field: value}.\n\n"
+            f"```json\n{json.dumps(value, ensure_ascii=False)}\n```")
+
+def _brackets_in_strings(value, rng):
+    if isinstance(value, dict):
+        value = {**value, 'remark': 'see [AIP] {section 2} "quoted" \\ end'}
+    return f"Result:\n{json.dumps(value, ensure_ascii=False)}\nDone."
+
+def _truncated(value, rng):
+    text = json.dumps(value, ensure_ascii=False, indent=2)
+    return f"```json\n{text[:max(1, int(len(text) * rng.uniform(0.3, 0.9)))]}"
+
+SHAPES: Dict[str, Tuple[Callable[[Any, random.Random], str], bool]] = {
+    'fenced': (_fenced, True),
+    'fenced_with_prose': (_fenced_with_prose, True),
+    'preamble_braced_note': (_preamble_and_braced_note, True),
+    'reasoning_block': (_reasoning, True),
+    'double_encoded': (_double_encoded, True),
+    'schema_echo': (_schema_echo, True),
+    'brackets_in_strings': (_brackets_in_strings, True),
+    'truncated': (_truncated, False),
+}
+
+
+def synthetic_corpus(per_shape: int = 200, seed: int = 0) -> List[Tuple[str, str, Any]]:
+    """(shape, response, expected) built from dataset outputs in every response shape"""
+    rng = random.Random(seed)
+    outputs = []
+    for file_path in sorted(glob.glob(str(project_root / 'dataset' / '*_test.json'))):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            outputs.extend(json.loads(item['output']) for item in json.load(f))
+    corpus = []
+    for shape, (build, recoverable) in SHAPES.items():
+        for value in rng.sample(outputs, min(per_shape, len(outputs))):
+            response = build(value, rng)
+            if shape == 'brackets_in_strings' and isinstance(value, dict):
+                value = {**value, 'remark': 'see [AIP] {section 2} "quoted" \\ end'}
+            corpus.append((shape, response, value if recoverable else UNRECOVERABLE))
+    return corpus
+
+
+def pathological_corpus(size: int = 20000) -> List[Tuple[str, str, Any]]:
+    """Long malformed responses: a cut-off row list, and many unclosed brackets ahead of the JSON"""
+    rows = '{"rows": [' + '{"stand": "1", "status": "closed"}, ' * (size // 36)
+    prose = 'row [' * (size // 5)
+    return [
+        ('long_truncated', rows, UNRECOVERABLE),
+        ('bracketed_prose', prose + ' result: {"airport": "ZBAA"}', {'airport': 'ZBAA'}),
+    ]
+
+
+def load_corpus(files: List[str]) -> List[Tuple[str, str, Any]]:
+    """
+    Real responses: processed output files (parse_fields.raw_response) or JSONL with a
+    raw_response field. Their expected value is unknown, so only recovery is scored.
+    """
+    corpus = []
+    for file_path in files:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            if file_path.endswith('.jsonl'):
+                rows = [json.loads(line) for line in f if line.strip()]
+            else:
+                data = json.load(f)
+                rows = data.get('records', []) if isinstance(data, dict) else data
+        for row in rows:
+            raw = row.get('raw_response')
+            if raw is None and isinstance(row.get('parse_fields'), dict):
+                raw = row['parse_fields'].get('raw_response')
+            if isinstance(raw, str):
+                corpus.append((Path(file_path).name, raw, None))
+    return corpus
+
+
+def run(extract: Callable[[str], Any], corpus: List[Tuple[str, str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Per shape: responses, correct extractions and microseconds per response"""
+    stats: Dict[str, Dict[str, Any]] = {}
+    for shape, response, expected in corpus:
+        start = time.perf_counter()
+        value = extract(response)
+        elapsed = time.perf_counter() - start
+        row = stats.setdefault(shape, {'responses': 0, 'correct': 0, 'seconds': 0.0})
+        row['responses'] += 1
+        row['seconds'] += elapsed
+        if expected is UNRECOVERABLE:
+            row['correct'] += value is None
+        elif expected is None:
+            row['correct'] += value is not None
+        else:
+            row['correct'] += value == expected
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark JSON extraction from model responses')
+    parser.add_argument('corpus', nargs='*', help='Output/JSONL files with raw responses (default: synthetic corpus from dataset/)')
+    parser.add_argument('--per-shape', type=int, default=200, help='Synthetic responses per shape (default: 200)')
+    parser.add_argument('--pathological-size', type=int, default=20000, help='Length of the long malformed responses (default: 20000)')
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus) if args.corpus else synthetic_corpus(args.per_shape)
+    corpus += pathological_corpus(args.pathological_size)
+    # The scanner logs a warning for every unrecoverable response; keep that out of the timings
+    get_logger('JSONProcessor').setLevel(logging.ERROR)
+
+    legacy, scanner = run(legacy_extract, corpus), run(extract_json_from_text, corpus)
+    print(f"\n{'Shape':<24} {'N':>5} {'Legacy ok':>10} {'Scanner ok':>11} {'Legacy us':>11} {'Scanner us':>11}")
+    print("-" * 78)
+    for shape in legacy:
+        old, new = legacy[shape], scanner[shape]
+        n = old['responses']
+        print(f"{shape:<24} {n:>5} {old['correct'] / n:>10.1%} {new['correct'] / n:>11.1%} "
+              f"{old['seconds'] / n * 1e6:>11.1f} {new['seconds'] / n * 1e6:>11.1f}")
+    total = len(corpus)
+    for name, stats in (('Legacy', legacy), ('Scanner', scanner)):
+        correct = sum(row['correct'] for row in stats.values())
+        seconds = sum(row['seconds'] for row in stats.values())
+        print(f"{name}: {correct}/{total} correct ({correct / total:.1%}), {seconds * 1e3:.1f} ms total")
+    print(f"Decoder: {'orjson' if ORJSON_AVAILABLE else 'json'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+Retrieval-based few-shot prompts - per-category TF-IDF index over training pairs, top-k examples per record
+"""
+import argparse
+import glob
+import json
+import math
+import re
+import sys
+import tempfile
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+# Add project root directory to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from config.prompts import CATEGORY_PROMPTS
+from src.columnar import category_from_path
+from src.normalize import canonical_notam_text
+from src.utils import get_logger, count_tokens, TIKTOKEN_AVAILABLE
+
+logger = get_logger('fewshot')
+
+# NOTAM tokens keep slashes and digits together (RWY 18L/36R, U/S, 2401010000)
+TOKEN_PATTERN = r"[A-Z0-9][A-Z0-9/.]*"
+# Start of the fixed example section in the *_PROMPT_ICL prompts ("Example 1:", "**Examples:**", ...)
+EXAMPLES_HEADING = re.compile(r"^[ \t]*(?:#+[ \t]*|\*\*)?Examples?\b", re.M | re.I)
+MAX_EXAMPLE_TOKENS = 400
+# Retrieval only looks at the opening of long NOTAMs (route and coordinate lists)
+MAX_QUERY_CHARS = 600
+
+
+def _query_text(raw_text: str) -> str:
+    """E) item of a NOTAM in canonical form; headers (series, times, Q-line) only add noise"""
+    text = canonical_notam_text(raw_text)
+    start = text.find('E)')
+    return (text[start + 2:] if start >= 0 else text)[:MAX_QUERY_CHARS]
+
+
+class ExampleIndex:
+    """
+    TF-IDF index over the training inputs of one category. The vectorizer is only used to fit
+    the vocabulary and idf weights; queries are weighted by hand and scored against a column
+    (term-major) sparse matrix, which avoids the per-call overhead of vectorizer.transform.
+    """
+
+    def __init__(self, examples: List[Dict[str, str]]):
+        self.examples = examples
+        self.keys = [canonical_notam_text(e['input']) for e in examples]
+        vectorizer = TfidfVectorizer(token_pattern=TOKEN_PATTERN, lowercase=False,
+                                     ngram_range=(1, 2), sublinear_tf=True)
+        # Rows are L2-normalised, so a sparse dot product is the cosine similarity
+        self.matrix = vectorizer.fit_transform([_query_text(e['input']) for e in examples]).tocsc()
+        self.analyzer = vectorizer.build_analyzer()
+        self.vocabulary = vectorizer.vocabulary_
+        self.idf = vectorizer.idf_
+
+    def _query_vector(self, raw_text: str) -> Tuple[List[int], np.ndarray]:
+        counts: Dict[int, int] = {}
+        for term in self.analyzer(_query_text(raw_text)):
+            column = self.vocabulary.get(term)
+            if column is not None:
+                counts[column] = counts.get(column, 0) + 1
+        columns = list(counts)
+        weights = np.array([(1 + math.log(counts[c])) * self.idf[c] for c in columns])
+        norm = np.linalg.norm(weights)
+        return columns, weights / norm if norm else weights
+
+    def top_k(self, raw_text: str, k: int, exclude_self: bool = False) -> List[Tuple[float, Dict[str, str]]]:
+        """k most similar training pairs, best first"""
+        columns, weights = self._query_vector(raw_text)
+        scores = self.matrix[:, columns] @ weights if columns else np.zeros(len(self.examples))
+        if exclude_self:
+            # Leave-one-out when the query is itself a training record
+            key = canonical_notam_text(raw_text)
+            scores = np.where([other == key for other in self.keys], -1.0, scores)
+        k = min(k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(float(scores[i]), self.examples[i]) for i in best]
+
+
+def instructions_for(category: Optional[str]) -> Optional[str]:
+    """The category's ICL prompt without its fixed example section"""
+    prompt = next((v for c, v in CATEGORY_PROMPTS.items() if category and c.lower() == category.lower()), None)
+    if prompt is None:
+        return None
+    match = EXAMPLES_HEADING.search(prompt)
+    return (prompt[:match.start()] if match else prompt).strip().rstrip('-').strip()
+
+
+def _example_input(raw_text: str) -> str:
+    """Example NOTAM from item A) on; the telex header and Q) line cost tokens and teach nothing"""
+    start = raw_text.find('A)')
+    return (raw_text[start:] if start >= 0 else raw_text).strip()
+
+
+def _compact_output(output: str) -> str:
+    """Training outputs are pretty-printed; one line is the same JSON in fewer tokens"""
+    try:
+        return json.dumps(json.loads(output), ensure_ascii=False, separators=(',', ':'))
+    except (json.JSONDecodeError, TypeError):
+        return output.strip()
+
+
+def assemble_prompt(instructions: str, examples: List[Dict[str, str]]) -> str:
+    """Category instructions followed by the retrieved input/output pairs"""
+    parts = [instructions, "", "Examples of similar NOTAMs and their JSON output:"]
+    for i, example in enumerate(examples, 1):
+        parts += ["", f"Example {i} input:", _example_input(example['input']), f"Example {i} output:",
+                  _compact_output(example['output'])]
+    parts += ["", "Now extract the fields from the following NOTAM text and output only the JSON."]
+    return "\n".join(parts)
+
+
+class FewShotPromptBuilder:
+    """
+    Builds a compact per-record prompt: the category instructions (the *_PROMPT_ICL text
+    without its examples) plus up to k training examples most similar to the record, as many
+    as fit in max_example_tokens (the best match is always kept). Indexes are built lazily
+    per category from dataset/<category>_train.json.
+    """
+
+    def __init__(self, k: int = 2, max_example_tokens: int = MAX_EXAMPLE_TOKENS, dataset_dir: Optional[str] = None):
+        self.k = k
+        self.max_example_tokens = max_example_tokens
+        self.dataset_dir = Path(dataset_dir) if dataset_dir else project_root / 'dataset'
+        self._indexes: Dict[str, Optional[ExampleIndex]] = {}
+        self.stats = {'queries': 0, 'seconds': 0.0, 'fallbacks': 0}
+        self._lock = threading.Lock()
+
+    def index_for(self, category: Optional[str]) -> Optional[ExampleIndex]:
+        if not category:
+            return None
+        key = category.lower()
+        with self._lock:
+            return self._index_locked(category, key)
+
+    def _index_locked(self, category: str, key: str) -> Optional[ExampleIndex]:
+        if key not in self._indexes:
+            files = [f for f in glob.glob(str(self.dataset_dir / '*_train.json'))
+                     if (category_from_path(f) or '').lower() == key]
+            examples = []
+            for file_path in files:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    examples.extend({'input': item['input'], 'output': item['output']} for item in json.load(f))
+            self._indexes[key] = ExampleIndex(examples) if examples else None
+            if examples:
+                logger.info(f"Few-shot index for {category}: {len(examples)} examples")
+        return self._indexes[key]
+
+    def build_prompt(self, raw_text: str, category: Optional[str], fallback: Optional[str] = None,
+                     exclude_self: bool = False) -> Optional[str]:
+        """Retrieved prompt for a record, or the fallback for categories without instructions or examples"""
+        instructions = instructions_for(category)
+        index = self.index_for(category) if instructions else None
+        if index is None:
+            with self._lock:
+                self.stats['fallbacks'] += 1
+            return fallback
+        start = time.perf_counter()
+        retrieved = index.top_k(raw_text, self.k, exclude_self=exclude_self)
+        with self._lock:
+            self.stats['seconds'] += time.perf_counter() - start
+            self.stats['queries'] += 1
+
+        examples = []
+        budget = self.max_example_tokens
+        for _, example in retrieved:
+            cost = self._example_tokens(example)
+            if examples and cost > budget:
+                break
+            examples.append(example)
+            budget -= cost
+        return assemble_prompt(instructions, examples)
+
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _cached_tokens(text: str) -> int:
+        return count_tokens(text)
+
+    def _example_tokens(self, example: Dict[str, str]) -> int:
+        return self._cached_tokens(_example_input(example['input'])) + self._cached_tokens(_compact_output(example['output']))
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.stats
+        return {**stats, 'k': self.k, 'max_example_tokens': self.max_example_tokens,
+                'us_per_query': stats['seconds'] / stats['queries'] * 1e6 if stats['queries'] else 0.0}
+
+
+# --- benchmark ----------------------------------------------------------------
+
+def _static_prompt(category: str) -> Optional[str]:
+    return next((v for c, v in CATEGORY_PROMPTS.items() if c.lower() == category.lower()), None)
+
+
+def _dataset_records(items: List[Dict[str, Any]], category: str) -> List[Dict[str, Any]]:
+    """Dataset pairs as pipeline records with manual labels"""
+    records = []
+    for i, item in enumerate(items):
+        try:
+            manual_fields = json.loads(item['output'])
+        except json.JSONDecodeError:
+            continue
+        if isinstance(manual_fields, list):
+            manual_fields = {'rows': manual_fields}
+        records.append({'id': str(i), 'category': category, 'raw_text': item['input'], 'manual_fields': manual_fields})
+    return records
+
+
+def _run_accuracy(records: List[Dict[str, Any]], prompt: Optional[str], api_config: Dict[str, Any],
+                  k: Optional[int], max_example_tokens: int = MAX_EXAMPLE_TOKENS) -> Dict[str, Any]:
+    """Field accuracy and API tokens of one prompt style on labelled records"""
+    import main as main_module
+    from main import DataProcessor
+    from src.cascade import count_accurate_fields
+
+    main_module.print_evaluation_report = lambda *args, **kwargs: None
+    config = {
+        'api_config': {'benchmark': api_config},
+        'fewshot': {'enabled': k is not None, 'k': k or 0, 'max_example_tokens': max_example_tokens}
+    }
+    processor = DataProcessor(config)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_file = str(Path(tmp_dir) / 'records.json')
+        output_file = str(Path(tmp_dir) / 'output.json')
+        with open(input_file, 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False)
+        processor.process_json_file(input_file, output_file, prompt, batch_size=50)
+        with open(output_file, 'r', encoding='utf-8') as f:
+            processed = json.load(f)['records']
+    accurate, evaluated = count_accurate_fields(processed)
+    return {'field_accuracy': accurate / evaluated if evaluated else 0.0,
+            'api_tokens': processor.api_manager.get_stats()['total_tokens']}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark retrieved few-shot prompts against the static *_PROMPT_ICL prompts')
+    parser.add_argument('files', nargs='*', help='Labelled dataset files (default: dataset/*_test.json)')
+    parser.add_argument('--k', type=int, default=2, help='Retrieved examples per record (default: 2)')
+    parser.add_argument('--max-example-tokens', type=int, default=MAX_EXAMPLE_TOKENS,
+                        help=f'Token budget for retrieved examples (default: {MAX_EXAMPLE_TOKENS})')
+    parser.add_argument('--sample', type=int, default=None, help='Records per file (default: all)')
+    parser.add_argument('--api-key', default=None, help='Also compare field accuracy through the API (costs requests)')
+    parser.add_argument('--model', default='qwen3-8b', help='Model for the accuracy run (default: qwen3-8b)')
+    parser.add_argument('--base-url', default='https://dashscope.aliyuncs.com/compatible-mode/v1', help='API base URL')
+    args = parser.parse_args()
+    if args.k < 1:
+        parser.error("--k must be at least 1")
+
+    files = args.files or sorted(glob.glob(str(project_root / 'dataset' / '*_test.json')))
+    builder = FewShotPromptBuilder(k=args.k, max_example_tokens=args.max_example_tokens)
+    api_config = None
+    if args.api_key:
+        api_config = {'api_key': args.api_key, 'base_url': args.base_url, 'model': args.model,
+                      'temperature': 0.0, 'response_format': {'type': 'json_object'}}
+
+    print(f"\n{'File':<24} {'Records':>8} {'Static tok':>11} {'Dynamic tok':>12} {'Saved':>7} {'us/query':>9}"
+          + (f" {'Static acc':>11} {'Dynamic acc':>12} {'Static API':>11} {'Dynamic API':>12}" if api_config else ''))
+    print("-" * (76 + (50 if api_config else 0)))
+    for file_path in files:
+        category = category_from_path(file_path)
+        static_prompt = _static_prompt(category) if category else None
+        if not static_prompt or builder.index_for(category) is None:
+            print(f"{Path(file_path).name:<24} skipped (no training examples or prompt for category)")
+            continue
+        with open(file_path, 'r', encoding='utf-8') as f:
+            items = json.load(f)[:args.sample]
+
+        static_tokens = count_tokens(static_prompt)
+        queries_before, seconds_before = builder.stats['queries'], builder.stats['seconds']
+        dynamic_tokens = [count_tokens(builder.build_prompt(item['input'], category)) for item in items]
+        queries = builder.stats['queries'] - queries_before
+        us_per_query = (builder.stats['seconds'] - seconds_before) / queries * 1e6 if queries else 0.0
+        mean_dynamic = sum(dynamic_tokens) / len(dynamic_tokens) if dynamic_tokens else 0.0
+        line = (f"{Path(file_path).name:<24} {len(items):>8} {static_tokens:>11} {mean_dynamic:>12.0f} "
+                f"{1 - mean_dynamic / static_tokens:>7.1%} {us_per_query:>9.0f}")
+        if api_config:
+            records = _dataset_records(items, category)
+            static = _run_accuracy(records, static_prompt, api_config, None)
+            dynamic = _run_accuracy(records, static_prompt, api_config, args.k, args.max_example_tokens)
+            line += (f" {static['field_accuracy']:>11.1%} {dynamic['field_accuracy']:>12.1%}"
+                     f" {static['api_tokens']:>11} {dynamic['api_tokens']:>12}")
+        print(line)
+    print("\nPrompt tokens are per request (system prompt only), "
+          + ("counted with tiktoken" if TIKTOKEN_AVAILABLE else "estimated (tiktoken not installed)")
+          + ("; API tokens are the totals reported by the provider." if api_config else "."))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,25 @@
 """
 JSON文件处理器
 """
-import json
 from pathlib import Path
-from typing import List, Union, Dict, Any
+from typing import List, Union, Dict, Any, Optional
 from src.models import NOTAMRecord, ProcessingBatch
+from src.serialization import Serializer, get_serializer
 from src.utils import get_logger
 
 class JSONHandler:
     """JSON文件处理器"""
     
-    def __init__(self):
+    def __init__(self, serializer: Optional[Serializer] = None):
         self.logger = get_logger('JSONHandler')
+        self.serializer = serializer or get_serializer()
     
     def read(self, file_path: Union[str, Path]) -> List[NOTAMRecord]:
         """读取JSON文件"""
         file_path = Path(file_path)
         self.logger.info(f"读取JSON文件: {file_path}")
         
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = self.serializer.load(file_path)
         
         records_data = data.get('records', data) if isinstance(data, dict) else data
         records = [NOTAMRecord.from_dict(item) for item in records_data]
@@ -41,7 +41,6 @@ class JSONHandler:
         }
         
         file_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+        self.serializer.dump(data, file_path)
         
         self.logger.info(f"写入完成: {len(records)} 条记录")
\ No newline at end of file
@@ -0,0 +1,197 @@
+"""
+Multi-run evaluation - per-file metrics in a process pool, cached by content hash, rendered as a runs x fields leaderboard
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# Add project root directory to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.utils import get_logger, calculate_metrics, EVALUATION_VERSION
+
+logger = get_logger('leaderboard')
+
+CACHE_FILE = project_root / 'data' / 'metrics_cache.jsonl'
+METRICS = ('accuracy', 'precision', 'recall', 'f1')
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    """sha256 of the file contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _stat_key(path: str) -> str:
+    """(path, size, mtime) fingerprint that lets unchanged files skip hashing"""
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class MetricsCache:
+    """
+    Per-file metrics keyed by content hash and evaluation version, appended to a JSONL file.
+    Entries written by another version of the evaluation are ignored.
+    """
+
+    def __init__(self, path: Path, version: int = EVALUATION_VERSION):
+        self.path = Path(path)
+        self.version = version
+        self.entries: Dict[str, Any] = {}
+        self.digests: Dict[str, str] = {}
+        self.hits = self.misses = 0
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        if entry.get('version') == self.version:
+                            self.entries[entry['digest']] = entry['metrics']
+                        if entry.get('stat'):
+                            self.digests[entry['stat']] = entry['digest']
+
+    def digest(self, path: str) -> str:
+        """Content hash of path, rehashed only when its size or mtime changed"""
+        stat = _stat_key(path)
+        if stat not in self.digests:
+            self.digests[stat] = file_digest(path)
+        return self.digests[stat]
+
+    def get(self, digest: str) -> Tuple[bool, Any]:
+        if digest in self.entries:
+            self.hits += 1
+            return True, self.entries[digest]
+        self.misses += 1
+        return False, None
+
+    def put(self, path: str, digest: str, metrics: Any):
+        self.entries[digest] = metrics
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'digest': digest, 'version': self.version, 'stat': _stat_key(path), 'file': str(path),
+                                'metrics': metrics}, ensure_ascii=False) + '\n')
+
+
+def _evaluate_file(path: str) -> Optional[Dict[str, Dict[str, Any]]]:
+    """Process pool worker: load and evaluate one result file"""
+    return calculate_metrics(path)
+
+
+class EvaluationService:
+    """
+    Metrics for many result files. Cached files are answered from the cache; the rest are
+    evaluated in parallel across a process pool. Files the pipeline has just written are
+    evaluated from the in-memory records and cached under the written file's hash.
+    """
+
+    def __init__(self, cache_path: Optional[Path] = CACHE_FILE, workers: Optional[int] = None):
+        self.cache = MetricsCache(cache_path) if cache_path else None
+        self.workers = workers or os.cpu_count() or 1
+
+    def evaluate(self, files: List[str]) -> Dict[str, Optional[Dict[str, Dict[str, Any]]]]:
+        """File -> per-field metrics (None when a file holds no evaluable records)"""
+        results: Dict[str, Any] = {}
+        pending: Dict[str, Optional[str]] = {}
+        for path in files:
+            digest = self.cache.digest(path) if self.cache else None
+            found, metrics = self.cache.get(digest) if self.cache else (False, None)
+            if found:
+                results[path] = metrics
+            else:
+                pending[path] = digest
+
+        if len(pending) > 1 and self.workers > 1:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(pending))) as pool:
+                computed = dict(zip(pending, pool.map(_evaluate_file, pending)))
+        else:
+            computed = {path: _evaluate_file(path) for path in pending}
+
+        for path, digest in pending.items():
+            results[path] = computed[path]
+            if self.cache and computed[path] is not None:
+                self.cache.put(path, digest, computed[path])
+        logger.info(f"Evaluated {len(files)} files: {len(files) - len(pending)} cached, {len(pending)} computed")
+        return {path: results[path] for path in files}
+
+    def store(self, path: str, metrics: Optional[Dict[str, Dict[str, Any]]]):
+        """Cache metrics computed in memory for a file that has already been written"""
+        if self.cache and metrics:
+            self.cache.put(path, self.cache.digest(path), metrics)
+
+
+def run_summary(metrics: Dict[str, Dict[str, Any]], metric: str = 'accuracy') -> Dict[str, Any]:
+    """Mean of one metric over a run's fields (as in the evaluation report) and its sample count"""
+    return {
+        'mean': sum(m[metric] for m in metrics.values()) / len(metrics),
+        'samples': sum(m['total_samples'] for m in metrics.values())
+    }
+
+
+def run_names(files: List[str]) -> Dict[str, str]:
+    """Short unique run names: file stems, or paths where stems collide"""
+    stems = [Path(f).stem for f in files]
+    return {f: stem if stems.count(stem) == 1 else str(f) for f, stem in zip(files, stems)}
+
+
+def render_leaderboard(results: Dict[str, Optional[Dict[str, Dict[str, Any]]]], metric: str = 'accuracy',
+                       fields: Optional[List[str]] = None) -> str:
+    """Runs (best mean first) x fields table of one metric; '-' where a run lacks the field"""
+    runs = {path: metrics for path, metrics in results.items() if metrics}
+    if not runs:
+        return "No evaluable result files"
+    if fields is None:
+        fields = sorted({name for metrics in runs.values() for name in metrics})
+    names = run_names(list(runs))
+    summaries = {path: run_summary(metrics, metric) for path, metrics in runs.items()}
+    order = sorted(runs, key=lambda path: summaries[path]['mean'], reverse=True)
+
+    name_width = max(len('Run'), *(len(names[path]) for path in runs))
+    widths = [max(6, len(name)) for name in fields]
+    lines = [f"{'#':>3} {'Run':<{name_width}} {'Mean':>6} {'Samples':>8} " +
+             ' '.join(f"{name:>{w}}" for name, w in zip(fields, widths))]
+    lines.append('-' * len(lines[0]))
+    for rank, path in enumerate(order, 1):
+        cells = [f"{runs[path][name][metric]:>{w}.3f}" if name in runs[path] else f"{'-':>{w}}"
+                 for name, w in zip(fields, widths)]
+        lines.append(f"{rank:>3} {names[path]:<{name_width}} {summaries[path]['mean']:>6.3f} "
+                     f"{summaries[path]['samples']:>8} " + ' '.join(cells))
+    skipped = [path for path, metrics in results.items() if not metrics]
+    if skipped:
+        lines.append(f"No evaluable records: {', '.join(skipped)}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Leaderboard of field metrics across result files')
+    parser.add_argument('files', nargs='+', help='Processed output files (e.g. data/output/*_processed.json)')
+    parser.add_argument('--metric', choices=METRICS, default='accuracy', help='Metric shown in the table (default: accuracy)')
+    parser.add_argument('--fields', default=None, help='Comma-separated fields to show (default: all)')
+    parser.add_argument('--workers', type=int, default=None, help='Evaluation processes (default: CPU count)')
+    parser.add_argument('--cache', default=str(CACHE_FILE), help='Metrics cache file')
+    parser.add_argument('--no-cache', action='store_true', help='Recompute every file and leave the cache untouched')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    service = EvaluationService(None if args.no_cache else Path(args.cache), args.workers)
+    results = service.evaluate(args.files)
+    seconds = time.perf_counter() - start
+
+    fields = args.fields.split(',') if args.fields else None
+    print(f"\n=== Leaderboard ({args.metric}) ===")
+    print(render_leaderboard(results, args.metric, fields))
+    cached = service.cache.hits if service.cache else 0
+    print(f"\n{len(args.files)} files in {seconds:.2f} s ({cached} from cache)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""
+Vectorized evaluation engine - per-field accuracy and weighted precision/recall/F1 from bincount confusion counts
+"""
+import argparse
+import glob
+import json
+import random
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Add project root directory to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.utils import get_logger, extract_field_values, load_processed_data, _serialize_for_comparison, canonical_stats
+
+logger = get_logger('metrics')
+
+METRICS = ('accuracy', 'precision', 'recall', 'f1')
+
+
+def confusion_counts(y_true: List[str], y_pred: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    (labels, tp, true count, predicted count) per label. Values are encoded to integer codes
+    once (labels sorted as in sklearn) and every count is a single bincount.
+    """
+    n = len(y_true)
+    labels, codes = np.unique(np.array(y_true + y_pred, dtype=object), return_inverse=True)
+    codes = codes.ravel()
+    true_codes, pred_codes = codes[:n], codes[n:]
+    k = len(labels)
+    tp_sum = np.bincount(true_codes[true_codes == pred_codes], minlength=k)
+    return labels, tp_sum, np.bincount(true_codes, minlength=k), np.bincount(pred_codes, minlength=k)
+
+
+def _divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """numerator / denominator, 0 where the denominator is 0 (sklearn zero_division=0)"""
+    denominator = denominator.astype(np.float64)
+    mask = denominator == 0.0
+    denominator[mask] = 1.0
+    result = numerator / denominator
+    result[mask] = 0.0
+    return result
+
+
+def field_metrics(y_true: List[str], y_pred: List[str]) -> Dict[str, float]:
+    """
+    Accuracy and support-weighted precision, recall and F1, equal to sklearn's
+    accuracy_score and *_score(average='weighted', zero_division=0) on the same labels
+    """
+    _, tp_sum, true_sum, pred_sum = confusion_counts(y_true, y_pred)
+    precision = _divide(tp_sum, pred_sum)
+    recall = _divide(tp_sum, true_sum)
+    f1 = _divide(2.0 * tp_sum.astype(np.float64), 1.0 * true_sum.astype(np.float64) + pred_sum.astype(np.float64))
+    return {
+        'accuracy': float(tp_sum.sum() / len(y_true)),
+        'precision': float(np.average(precision, weights=true_sum)),
+        'recall': float(np.average(recall, weights=true_sum)),
+        'f1': float(np.average(f1, weights=true_sum))
+    }
+
+
+def evaluate_fields(field_data: Dict[str, Dict[str, List]]) -> Dict[str, Dict[str, Any]]:
+    """Metrics per field of extract_field_values() output, values serialized once"""
+    results = {}
+    for field_name, data in field_data.items():
+        y_true = [_serialize_for_comparison(val) for val in data['y_true']]
+        y_pred = [_serialize_for_comparison(val) for val in data['y_pred']]
+        if not y_true:
+            continue
+        results[field_name] = {**field_metrics(y_true, y_pred), 'total_samples': len(y_true)}
+    return results
+
+
+class IncrementalEvaluator:
+    """
+    Running per-field confusion counts over completed records. Each value updates the
+    counts of at most two labels and their share of the weighted precision/F1 sums, so
+    accuracy and F1 are current after every record. With min_accuracy set, should_abort()
+    turns true once min_records have been evaluated and the mean field accuracy is below it.
+    """
+
+    def __init__(self, min_accuracy: Optional[float] = None, min_records: int = 50):
+        self.min_accuracy = min_accuracy
+        self.min_records = min_records
+        self.fields: Dict[str, Dict[str, Any]] = {}
+        self.records = 0
+        self.skipped = 0
+        self.aborted = False
+
+    @staticmethod
+    def _new_field() -> Dict[str, Any]:
+        return {'n': 0, 'correct': 0, 'tp': Counter(), 'true': Counter(), 'pred': Counter(),
+                'precision_sum': 0.0, 'f1_sum': 0.0}
+
+    @staticmethod
+    def _weighted(state: Dict[str, Any], label: str) -> Tuple[float, float]:
+        """Support-weighted precision and F1 of one label"""
+        tp, true, pred = state['tp'][label], state['true'][label], state['pred'][label]
+        return (true * tp / pred if pred else 0.0), (true * 2.0 * tp / (true + pred) if true + pred else 0.0)
+
+    def add_value(self, field_name: str, y_true: str, y_pred: str):
+        """Count one (canonical) true/predicted value pair"""
+        state = self.fields.setdefault(field_name, self._new_field())
+        labels = {y_true, y_pred}
+        for label in labels:
+            precision, f1 = self._weighted(state, label)
+            state['precision_sum'] -= precision
+            state['f1_sum'] -= f1
+        state['n'] += 1
+        state['true'][y_true] += 1
+        state['pred'][y_pred] += 1
+        if y_true == y_pred:
+            state['correct'] += 1
+            state['tp'][y_true] += 1
+        for label in labels:
+            precision, f1 = self._weighted(state, label)
+            state['precision_sum'] += precision
+            state['f1_sum'] += f1
+
+    def update(self, record: Dict[str, Any]) -> bool:
+        """Add a completed record; False when it has no labels or no evaluable output"""
+        if not record.get('manual_fields'):
+            return False
+        field_data = extract_field_values([record])
+        if not field_data:
+            self.skipped += 1
+            return False
+        self.records += 1
+        for field_name, data in field_data.items():
+            for true_value, pred_value in zip(data['y_true'], data['y_pred']):
+                self.add_value(field_name, _serialize_for_comparison(true_value), _serialize_for_comparison(pred_value))
+        return True
+
+    def field_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Current metrics per field, in the format of evaluate_fields()"""
+        results = {}
+        for field_name, state in self.fields.items():
+            n = state['n']
+            results[field_name] = {
+                'accuracy': state['correct'] / n,
+                'precision': state['precision_sum'] / n,
+                # Support-weighted recall is the accuracy
+                'recall': state['correct'] / n,
+                'f1': state['f1_sum'] / n,
+                'total_samples': n
+            }
+        return results
+
+    def summary(self) -> Dict[str, Any]:
+        """Records evaluated and mean field accuracy/F1, as in the evaluation report"""
+        fields = self.fields.values()
+        return {
+            'records': self.records,
+            'skipped_records': self.skipped,
+            'fields': len(self.fields),
+            'accuracy': sum(s['correct'] / s['n'] for s in fields) / len(self.fields) if self.fields else None,
+            'f1': sum(s['f1_sum'] / s['n'] for s in fields) / len(self.fields) if self.fields else None
+        }
+
+    def should_abort(self) -> bool:
+        """True from the first check that finds accuracy below the floor (the decision is kept)"""
+        if self.aborted or self.min_accuracy is None or self.records < self.min_records or not self.fields:
+            return self.aborted
+        self.aborted = self.summary()['accuracy'] < self.min_accuracy
+        return self.aborted
+
+
+def sklearn_field_metrics(y_true: List[str], y_pred: List[str]) -> Dict[str, float]:
+    """Reference implementation (the former calculate_metrics body)"""
+    from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
+    return {
+        'accuracy': accuracy_score(y_true, y_pred),
+        'precision': precision_score(y_true, y_pred, average='weighted', zero_division=0),
+        'recall': recall_score(y_true, y_pred, average='weighted', zero_division=0),
+        'f1': f1_score(y_true, y_pred, average='weighted', zero_division=0)
+    }
+
+
+def synthetic_records(error_rate: float = 0.2, copies: int = 1, seed: int = 0) -> List[Dict[str, Any]]:
+    """Dataset labels as manual_fields and randomly corrupted copies as parse_fields"""
+    rng = random.Random(seed)
+    records = []
+    for file_path in sorted(glob.glob(str(project_root / 'dataset' / '*_test.json'))):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            outputs = [json.loads(item['output']) for item in json.load(f)]
+        values: Dict[str, List[Any]] = {}
+        for output in outputs:
+            for row in output.get('rows', [output]) if isinstance(output, dict) else output:
+                for name, value in row.items():
+                    values.setdefault(name, []).append(value)
+        for _ in range(copies):
+            for output in outputs:
+                rows = output.get('rows', [output]) if isinstance(output, dict) else output
+                predicted = [
+                    {name: rng.choice(values[name]) if rng.random() < error_rate else value for name, value in row.items()}
+                    for row in rows
+                ]
+                records.append({'manual_fields': output, 'parse_fields': {'rows': predicted}})
+    return records
+
+
+def parity_check(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Largest difference between the engine and sklearn over all fields, and both timings"""
+    field_data = extract_field_values(records)
+    serialized = {
+        name: ([_serialize_for_comparison(v) for v in data['y_true']], [_serialize_for_comparison(v) for v in data['y_pred']])
+        for name, data in field_data.items() if data['y_true']
+    }
+    start = time.perf_counter()
+    engine = {name: field_metrics(*pair) for name, pair in serialized.items()}
+    engine_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    reference = {name: sklearn_field_metrics(*pair) for name, pair in serialized.items()}
+    sklearn_seconds = time.perf_counter() - start
+
+    max_diff = max((abs(engine[name][m] - reference[name][m]) for name in engine for m in METRICS), default=0.0)
+    return {
+        'fields': len(engine),
+        'samples': sum(len(pair[0]) for pair in serialized.values()),
+        'max_abs_diff': max_diff,
+        'identical': all(engine[name][m] == reference[name][m] for name in engine for m in METRICS),
+        'engine_seconds': engine_seconds,
+        'sklearn_seconds': sklearn_seconds
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the vectorized metrics against sklearn and time both')
+    parser.add_argument('files', nargs='*', help='Processed output files (default: synthetic predictions over dataset/*_test.json)')
+    parser.add_argument('--error-rate', type=float, default=0.2, help='Synthetic field corruption rate (default: 0.2)')
+    parser.add_argument('--copies', type=int, default=20, help='Synthetic copies of the dataset (default: 20)')
+    args = parser.parse_args()
+
+    sources = [(f, load_processed_data(f)) for f in args.files] or \
+              [('synthetic', synthetic_records(args.error_rate, args.copies))]
+    print(f"\n{'Source':<32} {'Fields':>7} {'Samples':>9} {'Identical':>10} {'Max diff':>10} {'Engine s':>9} {'sklearn s':>10} {'Speedup':>8}")
+    print("-" * 102)
+    failed = False
+    for name, records in sources:
+        result = parity_check(records)
+        failed |= result['max_abs_diff'] > 1e-12
+        print(f"{Path(name).name:<32} {result['fields']:>7} {result['samples']:>9} {str(result['identical']):>10} "
+              f"{result['max_abs_diff']:>10.1e} {result['engine_seconds']:>9.3f} {result['sklearn_seconds']:>10.3f} "
+              f"{result['sklearn_seconds'] / result['engine_seconds'] if result['engine_seconds'] else 0:>7.1f}x")
+    canonical = canonical_stats()
+    print(f"Canonicalization: {canonical['calls']} values, {canonical['json_decodes']} JSON decodes, "
+          f"{canonical['hit_rate']:.1%} memo hits, ~{canonical['seconds_saved']:.3f} s saved")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
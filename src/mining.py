@@ -1,4 +1,3 @@
-import json
 import time
 import logging
 from typing import Dict, Any, List, Optional
@@ -6,6 +5,7 @@ from pathlib import Path
 import pandas as pd
 
 from .api_manager import create_api_manager
+from .serialization import dump_json
 from .agents import create_agents, ExtractedField
 
 logger = logging.getLogger(__name__)
@@ -170,8 +170,7 @@ class FieldMiner:
         output_path.parent.mkdir(parents=True, exist_ok=True)
         
         # Save full results
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(results, f, ensure_ascii=False, indent=2)
+        dump_json(results, output_path)
         
         # Save recommendations as CSV
         recommendations = results.get('final_recommendations', [])
@@ -0,0 +1,138 @@
+"""
+Canonical NOTAM normalization and deduplication of records before API calls
+"""
+import argparse
+import glob
+import hashlib
+import json
+import re
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Add project root directory to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.utils import get_logger
+
+logger = get_logger('normalize')
+
+# ")" closing the message and the "NNNN" end marker (")NNNN", ")\nNNNN" or a lone ")" line)
+_TRAILER_PATTERN = re.compile(r'(?:\s*\))?\s*NNNN\s*$|\n\s*\)\s*$')
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+def canonical_notam_text(raw_text: str) -> str:
+    """Canonical form of a NOTAM: trailer removed, line breaks and runs of whitespace collapsed"""
+    if not raw_text:
+        return ""
+    text = raw_text.replace('\r\n', '\n').replace('\r', '\n')
+    text = _TRAILER_PATTERN.sub('', text)
+    return _WHITESPACE_PATTERN.sub(' ', text).strip()
+
+
+def notam_hash(canonical_text: str) -> str:
+    """Content hash of a canonical NOTAM text"""
+    return hashlib.sha1(canonical_text.encode('utf-8')).hexdigest()
+
+
+def record_text(record: Dict[str, Any]) -> Optional[str]:
+    """Raw NOTAM text of a record (processing input uses raw_text, dataset files use input)"""
+    text = record.get('raw_text', record.get('input'))
+    return text if isinstance(text, str) else None
+
+
+def group_records(records: List[Dict[str, Any]]) -> Dict[str, List[int]]:
+    """
+    Group record indices by the hash of their canonical text, in first-seen order.
+    Records without text stay in their own group.
+    """
+    groups: Dict[str, List[int]] = {}
+    for i, record in enumerate(records):
+        text = record_text(record)
+        key = notam_hash(canonical_notam_text(text)) if text is not None else f"__no_text_{i}"
+        groups.setdefault(key, []).append(i)
+    return groups
+
+
+def deduplicate_records(records: List[Dict[str, Any]]) -> tuple[List[Dict[str, Any]], Dict[str, List[int]]]:
+    """
+    One representative per canonical text (with raw_text replaced by the canonical form)
+    plus the groups needed to fan results back out.
+    """
+    groups = group_records(records)
+    representatives = []
+    for indices in groups.values():
+        representative = dict(records[indices[0]])
+        if 'raw_text' in representative and isinstance(representative['raw_text'], str):
+            representative['raw_text'] = canonical_notam_text(representative['raw_text'])
+        representatives.append(representative)
+    return representatives, groups
+
+
+def fan_out_results(records: List[Dict[str, Any]],
+                    groups: Dict[str, List[int]],
+                    representatives: List[Dict[str, Any]],
+                    processed: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Copy the fields added by processing each representative onto every duplicate, in input order"""
+    results: List[Optional[Dict[str, Any]]] = [None] * len(records)
+    for indices, representative, processed_record in zip(groups.values(), representatives, processed):
+        # processed records are shallow copies, so untouched input fields are the same objects
+        added = {key: value for key, value in processed_record.items()
+                 if key not in representative or representative[key] is not value}
+        for i in indices:
+            results[i] = {**records[i], **added}
+    return results
+
+
+def dedup_stats(groups: Dict[str, List[int]]) -> Dict[str, Any]:
+    """Deduplication summary for a set of groups"""
+    total = sum(len(indices) for indices in groups.values())
+    unique = len(groups)
+    return {
+        'records': total,
+        'unique': unique,
+        'duplicates': total - unique,
+        'dedup_ratio': total / unique if unique else 0.0,
+        'requests_saved_rate': (total - unique) / total if total else 0.0
+    }
+
+
+def _load_any(file_path: str) -> List[Dict[str, Any]]:
+    with open(file_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict) and 'records' in data:
+        return data['records']
+    return data if isinstance(data, list) else [data]
+
+
+def _print_stats_row(name: str, stats: Dict[str, Any]):
+    print(f"{name:<32} {stats['records']:>8} {stats['unique']:>8} {stats['duplicates']:>6} "
+          f"{stats['dedup_ratio']:>6.2f}x {stats['requests_saved_rate']:>6.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Dry-run NOTAM deduplication - report the dedup ratio per file')
+    parser.add_argument('files', nargs='*', help='Input JSON files (default: dataset/*_test.json)')
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob.glob(str(project_root / 'dataset' / '*_test.json')))
+
+    print(f"\n{'File':<32} {'Records':>8} {'Unique':>8} {'Dups':>6} {'Ratio':>7} {'Saved':>7}")
+    print("-" * 72)
+    all_records = []
+    for file_path in files:
+        records = _load_any(file_path)
+        all_records.extend(records)
+        _print_stats_row(Path(file_path).name, dedup_stats(group_records(records)))
+
+    if files:
+        # Duplicates shared between files count too when the files are processed together
+        print("-" * 72)
+        _print_stats_row('All files (cross-dataset)', dedup_stats(group_records(all_records)))
+
+
+
+if __name__ == "__main__":
+    main()
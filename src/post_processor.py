@@ -12,6 +12,7 @@ from datetime import datetime
 from typing import Dict, Any, List
 from api_manager import create_api_manager
 from utils import get_logger, print_evaluation_report
+from serialization import dump_json, load_json
 from handler.json_handler import JSONHandler
 from models import ProcessingBatch
 from config.prompts import AREA_POST_PROCESSING_ENHANCED_PROMPT_EN
@@ -44,8 +45,7 @@ class PostProcessor:
         logger.info(f"Starting post-processing: {input_file} -> {output_file}")
         
         # 1. Read parsed data
-        with open(input_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = load_json(input_file)
         
         records = data.get('records', [])
         metadata = data.get('metadata', {})
@@ -113,8 +113,7 @@ class PostProcessor:
             }
         }
         
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(final_output_data, f, ensure_ascii=False, indent=2, default=str)
+        dump_json(final_output_data, output_file)
         
         logger.info(f"Post-processing completed: {total_success_count}/{len(records_to_process)} successful")
         
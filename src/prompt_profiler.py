@@ -0,0 +1,320 @@
+"""
+Prompt token profiler and ICL example ablation - token footprint of every prompt and pruned example sets
+"""
+import argparse
+import hashlib
+import json
+import re
+import sys
+from itertools import combinations
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Add project root directory to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import config.prompts as prompts
+from src.columnar import category_from_path
+from src.fewshot import EXAMPLES_HEADING, _dataset_records
+from src.utils import get_logger, count_tokens, TIKTOKEN_AVAILABLE
+
+logger = get_logger('prompt_profiler')
+
+CACHE_FILE = project_root / 'data' / 'prompt_cache.jsonl'
+PRUNED_PROMPTS_FILE = project_root / 'config' / 'pruned_prompts.py'
+EXHAUSTIVE_LIMIT = 5
+
+# Numbered example headers ("Example 1:", "**Example Input 2**:", "**Example 3 (Circle):**");
+# prompts without numbering separate their examples with "Input:" lines
+_NUMBERED_EXAMPLE = re.compile(r"^[ \t]*(?:#+[ \t]*|\*\*)?Example(?: Input)? ?\d+\b", re.M | re.I)
+_INPUT_LINE = re.compile(r"^[ \t]*(?:\*\*)?Input\b", re.M | re.I)
+_PARAGRAPH_BREAK = re.compile(r"\n[ \t]*\n")
+
+
+def prompt_variants() -> Dict[str, str]:
+    """
+    All prompt strings the pipeline can send, by name: those defined in config/prompts.py
+    (including the mixed-case *_Vanilla ones) and the saved pruned variants
+    """
+    variants = {name: value for name, value in vars(prompts).items() if 'PROMPT' in name and isinstance(value, str)}
+    variants.update((name, value) for name, value in prompts.PRUNED_PROMPTS.items() if isinstance(value, str))
+    return variants
+
+
+def split_examples(prompt: str) -> Optional[Tuple[str, List[str], str]]:
+    """
+    (instructions, example blocks, closing instruction) of an ICL prompt, or None if the
+    prompt has no separable examples. Joining the parts gives back the prompt.
+    """
+    section = EXAMPLES_HEADING.search(prompt)
+    if section is None:
+        return None
+    body = prompt[section.start():]
+    starts = [m.start() for m in _NUMBERED_EXAMPLE.finditer(body)] or [m.start() for m in _INPUT_LINE.finditer(body)]
+    if not starts:
+        return None
+
+    # The closing instruction is the last paragraph, if it is prose rather than example JSON
+    breaks = list(_PARAGRAPH_BREAK.finditer(body))
+    tail_start = len(body)
+    if breaks and breaks[-1].end() > starts[-1] and body[breaks[-1].end():].lstrip()[:1].isalpha():
+        tail_start = breaks[-1].start()
+
+    head = prompt[:section.start()] + body[:starts[0]]
+    blocks = [body[start:end] for start, end in zip(starts, starts[1:] + [tail_start])]
+    return head, blocks, body[tail_start:]
+
+
+def join_examples(head: str, blocks: Sequence[str], tail: str) -> str:
+    """Prompt with a subset of its example blocks (renumbering is left to the reader of the prompt)"""
+    if not blocks:
+        # Without examples the "Examples:" heading would dangle
+        section = EXAMPLES_HEADING.search(head)
+        head = head[:section.start()] if section else head
+    return head + ''.join(blocks) + tail
+
+
+def profile(names: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Token footprint per prompt: total, instructions and each example"""
+    rows = []
+    for name, prompt in prompt_variants().items():
+        if names and name not in names:
+            continue
+        parts = split_examples(prompt)
+        row = {'name': name, 'tokens': count_tokens(prompt), 'examples': [], 'instruction_tokens': None}
+        if parts:
+            head, blocks, tail = parts
+            row['instruction_tokens'] = count_tokens(head) + count_tokens(tail)
+            row['examples'] = [count_tokens(block) for block in blocks]
+        rows.append(row)
+    return sorted(rows, key=lambda r: r['tokens'], reverse=True)
+
+
+class ResponseCache:
+    """Parsed API responses keyed by (model, prompt, input), appended to a JSONL file"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.entries: Dict[str, Any] = {}
+        self.hits = self.misses = 0
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry['key']] = entry['data']
+
+    @staticmethod
+    def key(model: str, prompt: str, input_text: str) -> str:
+        return hashlib.sha256('\x00'.join([model, prompt, input_text]).encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        if key in self.entries:
+            self.hits += 1
+            return True, self.entries[key]
+        self.misses += 1
+        return False, None
+
+    def put_many(self, items: Dict[str, Any]):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for key, data in items.items():
+                self.entries[key] = data
+                f.write(json.dumps({'key': key, 'data': data}, ensure_ascii=False) + '\n')
+
+
+class PromptEvaluator:
+    """
+    Field accuracy of a prompt on labelled records; only uncached (prompt, input) pairs hit
+    the API. Without an API manager every response must already be cached.
+    """
+
+    def __init__(self, api_manager, model: str, records: List[Dict[str, Any]], cache: ResponseCache):
+        self.api_manager = api_manager
+        self.model = model
+        self.records = records
+        self.cache = cache
+        self.api_calls = 0
+
+    def __call__(self, prompt: str) -> float:
+        from src.cascade import count_accurate_fields
+
+        results: Dict[int, Any] = {}
+        missing: List[Tuple[int, str]] = []
+        for i, record in enumerate(self.records):
+            key = ResponseCache.key(self.model, prompt, record['raw_text'])
+            found, data = self.cache.get(key)
+            if found:
+                results[i] = data
+            else:
+                missing.append((i, key))
+
+        if missing and self.api_manager is None:
+            raise RuntimeError(f"{len(missing)} responses are not cached; an API key is needed")
+        if missing:
+            requests = [{'prompt': prompt, 'input_text': self.records[i]['raw_text'], 'max_retries': 3}
+                        for i, _ in missing]
+            responses = self.api_manager.batch_call(requests)
+            self.api_calls += len(requests)
+            fresh = {}
+            for (i, key), response in zip(missing, responses):
+                result = response['result']
+                data = result.get('data') if result.get('success') else None
+                results[i] = data
+                # Failed calls are not cached so a re-run retries them
+                if data is not None:
+                    fresh[key] = data
+            self.cache.put_many(fresh)
+
+        processed = [{**record, 'parse_fields': results[i] if results[i] is not None else {'error': 'no response'}}
+                     for i, record in enumerate(self.records)]
+        accurate, evaluated = count_accurate_fields(processed)
+        return accurate / evaluated if evaluated else 0.0
+
+
+def smallest_subset(n: int, evaluate: Callable[[Tuple[int, ...]], float], baseline: float,
+                    tolerance: float, exhaustive_limit: int = EXHAUSTIVE_LIMIT) -> Tuple[Tuple[int, ...], float]:
+    """
+    Smallest example subset whose accuracy stays within tolerance of the full set. Up to
+    exhaustive_limit examples all subsets are tried by increasing size; beyond that examples
+    are removed greedily, the least useful first.
+    """
+    floor = baseline - tolerance
+    if n <= exhaustive_limit:
+        for size in range(n):
+            passing = [(evaluate(subset), subset) for subset in combinations(range(n), size)]
+            passing = [(accuracy, subset) for accuracy, subset in passing if accuracy >= floor]
+            if passing:
+                accuracy, subset = max(passing)
+                return subset, accuracy
+        return tuple(range(n)), baseline
+
+    subset, accuracy = tuple(range(n)), baseline
+    while subset:
+        candidates = [(evaluate(tuple(i for i in subset if i != drop)), drop) for drop in subset]
+        best_accuracy, drop = max(candidates)
+        if best_accuracy < floor:
+            break
+        subset, accuracy = tuple(i for i in subset if i != drop), best_accuracy
+    return subset, accuracy
+
+
+def _prompt_category(name: str) -> Optional[str]:
+    """Category named by a prompt constant such as RUNWAY_PROMPT_ICL"""
+    return category_from_path(name.split('_PROMPT')[0].lower() + '.json')
+
+
+def tuning_records(category: str, blocks: Sequence[str], split_file: Optional[str] = None,
+                   test_split: bool = False, sample: int = 40) -> List[Dict[str, Any]]:
+    """
+    Labelled records the ablation is scored on: the given file, the test split when asked
+    for, or by default a held-out slice (the tail) of the training split. Records whose
+    input appears among the prompt's own examples are left out.
+    """
+    held_out = split_file is None and not test_split
+    if split_file is None:
+        split_file = str(project_root / 'dataset' / f"{category.lower()}_{'test' if test_split else 'train'}.json")
+    with open(split_file, 'r', encoding='utf-8') as f:
+        items = json.load(f)
+    examples = '\n'.join(blocks)
+    items = [item for item in items if not item.get('input') or item['input'].strip() not in examples]
+    items = items[-sample:] if held_out else items[:sample]
+    return _dataset_records(items, category)
+
+
+def write_pruned_prompts(pruned: Dict[str, str], path: Path = PRUNED_PROMPTS_FILE):
+    """Pruned variants as a module of named prompts, merged with any written before"""
+    existing = {}
+    if path.exists():
+        namespace: Dict[str, Any] = {}
+        exec(path.read_text(encoding='utf-8'), namespace)
+        existing = namespace.get('PRUNED_PROMPTS', {})
+    merged = {**existing, **pruned}
+    lines = ['"""', 'Pruned ICL prompt variants - generated by src/prompt_profiler.py, do not edit', '"""', '']
+    for name, prompt in sorted(merged.items()):
+        lines += [f"{name} = {json.dumps(prompt, ensure_ascii=False)}", '']
+    lines += ['PRUNED_PROMPTS = {']
+    lines += [f"    {name!r}: {name}," for name in sorted(merged)]
+    lines += ['}', '']
+    path.write_text('\n'.join(lines), encoding='utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Token footprint of config/prompts.py and ICL example ablation')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    profile_parser = subparsers.add_parser('profile', help='Tokens per prompt and per example')
+    profile_parser.add_argument('names', nargs='*', help='Prompt names (default: all)')
+
+    prune = subparsers.add_parser('prune', help='Find the smallest example subset within an accuracy tolerance')
+    prune.add_argument('names', nargs='+', help='ICL prompt names, e.g. RUNWAY_PROMPT_ICL')
+    prune.add_argument('--split', default=None,
+                       help='Labelled file to tune on (default: the last --sample records of dataset/<category>_train.json)')
+    prune.add_argument('--test-split', action='store_true',
+                       help='Tune on dataset/<category>_test.json instead (its scores are then no longer held out)')
+    prune.add_argument('--sample', type=int, default=40, help='Held-out records used (default: 40)')
+    prune.add_argument('--tolerance', type=float, default=0.01, help='Allowed field accuracy drop (default: 0.01)')
+    prune.add_argument('--cache', default=str(CACHE_FILE), help='Response cache file')
+    prune.add_argument('--write', action='store_true', help=f'Write <NAME>_PRUNED prompts to {PRUNED_PROMPTS_FILE.relative_to(project_root)}')
+    prune.add_argument('--api-key', default=None, help='API key (not needed when all responses are cached)')
+    prune.add_argument('--model', default='qwen3-8b', help='Model (default: qwen3-8b)')
+    prune.add_argument('--base-url', default='https://dashscope.aliyuncs.com/compatible-mode/v1', help='API base URL')
+    args = parser.parse_args()
+
+    if args.command == 'profile':
+        rows = profile(args.names or None)
+        print(f"\n{'Prompt':<42} {'Tokens':>7} {'Instr.':>7} {'Examples (tokens each)'}")
+        print("-" * 90)
+        for row in rows:
+            instructions = row['instruction_tokens'] if row['instruction_tokens'] is not None else '-'
+            examples = ', '.join(str(t) for t in row['examples']) or '-'
+            print(f"{row['name']:<42} {row['tokens']:>7} {instructions:>7} {examples}")
+        print(f"\nTokens {'counted with tiktoken (cl100k_base)' if TIKTOKEN_AVAILABLE else 'estimated (tiktoken not installed)'}.")
+        return
+
+    from src.api_manager import create_api_manager
+
+    cache = ResponseCache(Path(args.cache))
+    api_manager = create_api_manager({'profiler': {
+        'api_key': args.api_key, 'base_url': args.base_url, 'model': args.model,
+        'temperature': 0.0, 'response_format': {'type': 'json_object'}
+    }}) if args.api_key else None
+    variants = prompt_variants()
+    pruned = {}
+    for name in args.names:
+        parts = split_examples(variants.get(name, ''))
+        category = _prompt_category(name)
+        if parts is None or category is None:
+            print(f"{name}: no separable examples or unknown category, skipped")
+            continue
+        try:
+            records = tuning_records(category, blocks=parts[1], split_file=args.split,
+                                     test_split=args.test_split, sample=args.sample)
+        except FileNotFoundError as e:
+            print(f"{name}: {e.filename} not found, skipped")
+            continue
+
+        head, blocks, tail = parts
+        evaluator = PromptEvaluator(api_manager, args.model, records, cache)
+        def evaluate(subset: Tuple[int, ...]) -> float:
+            return evaluator(join_examples(head, [blocks[i] for i in subset], tail))
+
+        baseline = evaluate(tuple(range(len(blocks))))
+        subset, accuracy = smallest_subset(len(blocks), evaluate, baseline, args.tolerance)
+        pruned_prompt = join_examples(head, [blocks[i] for i in subset], tail)
+        full_tokens, pruned_tokens = count_tokens(variants[name]), count_tokens(pruned_prompt)
+        print(f"{name}: examples {len(blocks)} -> {len(subset)} (kept {[i + 1 for i in subset]}), "
+              f"field accuracy {baseline:.1%} -> {accuracy:.1%}, tokens {full_tokens} -> {pruned_tokens} "
+              f"({1 - pruned_tokens / full_tokens:.0%} saved), API calls {evaluator.api_calls}")
+        if len(subset) < len(blocks):
+            pruned[f"{name}_PRUNED"] = pruned_prompt
+
+    print(f"\nResponse cache: {cache.hits} hits, {cache.misses} misses ({cache.path})")
+    if args.write and pruned:
+        write_pruned_prompts(pruned)
+        print(f"Wrote {', '.join(pruned)} to {PRUNED_PROMPTS_FILE}")
+
+
+if __name__ == "__main__":
+    main()
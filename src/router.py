@@ -0,0 +1,240 @@
+"""
+Category router - hashed n-gram features and a one-vs-rest linear model that assigns NOTAMs to categories
+"""
+import argparse
+import glob
+import json
+import sys
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Add project root directory to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.columnar import category_from_path
+from src.normalize import canonical_notam_text
+from src.utils import get_logger
+
+logger = get_logger('router')
+
+ROUTER_FILE = project_root / 'data' / 'category_router.npz'
+N_FEATURES = 1 << 13
+CHAR_NGRAMS = (3, 4, 5)
+# Long NOTAMs (airway lists, coordinates) are cut; the category shows in the opening words
+MAX_BODY_CHARS = 400
+
+
+def _body(raw_text: str) -> str:
+    """E) item of a NOTAM (whole text if there is none); the airport code carries no category signal"""
+    text = canonical_notam_text(raw_text)
+    start = text.find('E)')
+    return (text[start + 2:] if start >= 0 else text)[:MAX_BODY_CHARS]
+
+
+def hashed_features(raw_text: str, n_features: int = N_FEATURES) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Sparse (indices, values) feature vector: word unigrams/bigrams and character n-grams,
+    hashed with crc32 (stable across processes, unlike hash()) and L2-normalised.
+    """
+    body = _body(raw_text)
+    words = body.split()
+    grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    padded = f" {body} "
+    for n in CHAR_NGRAMS:
+        grams.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+    indices = np.fromiter((zlib.crc32(g.encode('utf-8')) % n_features for g in grams), dtype=np.int64, count=len(grams))
+    indices, counts = np.unique(indices, return_counts=True)
+    values = np.log1p(counts).astype(np.float32)
+    norm = np.linalg.norm(values)
+    return indices, values / norm if norm else values
+
+
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+class CategoryRouter:
+    """
+    One-vs-rest logistic regression over hashed features. Each category gets an independent
+    probability, so a NOTAM spanning categories (e.g. a stand closure on a taxiway) can be
+    routed to several of them. Only categories with training data (dataset/<category>_train.json)
+    can be predicted: records of any other category (light, area) go to the closest trained one.
+    """
+
+    def __init__(self, categories: List[str], weights: np.ndarray, bias: np.ndarray,
+                 n_features: int = N_FEATURES, threshold: float = 0.5):
+        self.categories = list(categories)
+        self.weights = weights  # (n_features, n_categories)
+        self.bias = bias
+        self.n_features = n_features
+        self.threshold = threshold
+
+    @classmethod
+    def train(cls, examples: List[Tuple[str, List[str]]], n_features: int = N_FEATURES,
+              epochs: int = 15, learning_rate: float = 2.0, seed: int = 0) -> 'CategoryRouter':
+        """Sparse per-example SGD on (raw_text, categories) examples, learning rate decayed per epoch"""
+        categories = sorted({c for _, labels in examples for c in labels})
+        column = {c: j for j, c in enumerate(categories)}
+        features = [hashed_features(text, n_features) for text, _ in examples]
+        targets = np.zeros((len(examples), len(categories)), dtype=np.float32)
+        for i, (_, labels) in enumerate(examples):
+            for label in labels:
+                targets[i, column[label]] = 1.0
+
+        weights = np.zeros((n_features, len(categories)), dtype=np.float32)
+        bias = np.zeros(len(categories), dtype=np.float32)
+        rng = np.random.default_rng(seed)
+        for epoch in range(epochs):
+            rate = learning_rate / (1 + epoch)
+            for i in rng.permutation(len(examples)):
+                indices, values = features[i]
+                error = _sigmoid(values @ weights[indices] + bias) - targets[i]
+                weights[indices] -= rate * np.outer(values, error)
+                bias -= rate * error
+        return cls(categories, weights, bias, n_features)
+
+    def predict_proba(self, raw_text: str) -> Dict[str, float]:
+        indices, values = hashed_features(raw_text, self.n_features)
+        scores = values @ self.weights[indices] + self.bias
+        return dict(zip(self.categories, _sigmoid(scores).tolist()))
+
+    def route(self, raw_text: str) -> List[Tuple[str, float]]:
+        """Categories above the threshold, most probable first (the best one always included)"""
+        ranked = sorted(self.predict_proba(raw_text).items(), key=lambda kv: kv[1], reverse=True)
+        return [ranked[0]] + [(c, p) for c, p in ranked[1:] if p >= self.threshold]
+
+    def save(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(path, weights=self.weights.astype(np.float16), bias=self.bias,
+                            categories=np.array(self.categories), n_features=self.n_features)
+
+    @classmethod
+    def load(cls, path: str, threshold: float = 0.5) -> 'CategoryRouter':
+        data = np.load(path)
+        return cls([str(c) for c in data['categories']], data['weights'].astype(np.float32),
+                   data['bias'], int(data['n_features']), threshold)
+
+    @classmethod
+    def load_or_train(cls, path: Optional[str] = None, threshold: float = 0.5) -> 'CategoryRouter':
+        """Load the artifact, training it from dataset/*_train.json first if it does not exist"""
+        path = Path(path or ROUTER_FILE)
+        if not path.exists():
+            logger.info(f"Router artifact {path} not found, training from dataset/*_train.json")
+            cls.train(load_examples(_dataset_files('train'))).save(str(path))
+        router = cls.load(str(path), threshold)
+        untrained = untrained_categories(router.categories)
+        if untrained:
+            logger.warning(f"Router has no training data for {', '.join(untrained)}: such records cannot be routed "
+                           f"and are parsed with the prompt of the closest trained category")
+        return router
+
+
+def untrained_categories(categories: List[str]) -> List[str]:
+    """Categories with a prompt in config/prompts.py that the router was not trained on"""
+    from config.prompts import CATEGORY_PROMPTS
+    return sorted(set(CATEGORY_PROMPTS) - set(categories))
+
+
+def _dataset_files(split: str) -> List[str]:
+    return sorted(glob.glob(str(project_root / 'dataset' / f'*_{split}.json')))
+
+
+def load_examples(files: List[str]) -> List[Tuple[str, List[str]]]:
+    """(raw_text, categories) pairs; a NOTAM labelled in several category files gets all of them"""
+    labels: Dict[str, List[str]] = {}
+    texts: Dict[str, str] = {}
+    for file_path in files:
+        category = category_from_path(file_path)
+        if category is None:
+            continue
+        with open(file_path, 'r', encoding='utf-8') as f:
+            items = json.load(f)
+        for item in items:
+            key = canonical_notam_text(item['input'])
+            texts.setdefault(key, item['input'])
+            if category not in labels.setdefault(key, []):
+                labels[key].append(category)
+    return [(texts[key], labels[key]) for key in texts]
+
+
+def evaluate(router: CategoryRouter, examples: List[Tuple[str, List[str]]]) -> Dict[str, Any]:
+    """
+    Top-1 accuracy (best category among the labels), label-set exact match and latency.
+    Examples labelled only with categories the router was not trained on cannot be routed
+    correctly; they are counted as unroutable and left out of both scores.
+    """
+    known = set(router.categories)
+    routable = [(text, labels) for text, labels in examples if known.intersection(labels)]
+    top1 = exact = 0
+    start = time.perf_counter()
+    for text, labels in routable:
+        routed = [c for c, _ in router.route(text)]
+        top1 += routed[0] in labels
+        exact += set(routed) == set(labels)
+    elapsed = time.perf_counter() - start
+    n = len(routable)
+    return {
+        'examples': n,
+        'top1_accuracy': top1 / n if n else 0.0,
+        'exact_match': exact / n if n else 0.0,
+        'us_per_record': elapsed / n * 1e6 if n else 0.0,
+        'unroutable': len(examples) - n,
+        'unroutable_categories': sorted({c for _, labels in examples for c in labels} - known)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train, evaluate or query the local NOTAM category router')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    train = subparsers.add_parser('train', help='Train on dataset/*_train.json and evaluate on dataset/*_test.json')
+    train.add_argument('--out', default=str(ROUTER_FILE), help=f'Artifact path (default: {ROUTER_FILE.relative_to(project_root)})')
+    train.add_argument('--epochs', type=int, default=15, help='SGD epochs (default: 15)')
+
+    evaluate_parser = subparsers.add_parser('evaluate', help='Evaluate an artifact on dataset files')
+    evaluate_parser.add_argument('files', nargs='*', help='Labelled files (default: dataset/*_test.json)')
+    evaluate_parser.add_argument('--model', default=str(ROUTER_FILE), help='Artifact path')
+    evaluate_parser.add_argument('--threshold', type=float, default=0.5, help='Multi-label threshold (default: 0.5)')
+
+    route = subparsers.add_parser('route', help='Route one NOTAM text')
+    route.add_argument('text', help='Raw NOTAM text')
+    route.add_argument('--model', default=str(ROUTER_FILE), help='Artifact path')
+    args = parser.parse_args()
+
+    if args.command == 'train':
+        start = time.time()
+        router = CategoryRouter.train(load_examples(_dataset_files('train')), epochs=args.epochs)
+        router.save(args.out)
+        print(f"Trained {len(router.categories)} categories in {time.time() - start:.1f}s -> {args.out} "
+              f"({Path(args.out).stat().st_size / 1024:.0f} KB)")
+        print(f"Test: {evaluate(router, load_examples(_dataset_files('test')))}")
+        untrained = untrained_categories(router.categories)
+        if untrained:
+            print(f"No training data for {', '.join(untrained)}: these categories are never predicted")
+    elif args.command == 'evaluate':
+        router = CategoryRouter.load(args.model, args.threshold)
+        files = args.files or _dataset_files('test')
+        print(f"\n{'File':<24} {'Records':>8} {'Top-1':>8} {'Exact':>8} {'us/rec':>8} {'Unroutable':>11}")
+        print("-" * 72)
+        for file_path in files:
+            result = evaluate(router, load_examples([file_path]))
+            print(f"{Path(file_path).name:<24} {result['examples']:>8} {result['top1_accuracy']:>8.1%} "
+                  f"{result['exact_match']:>8.1%} {result['us_per_record']:>8.1f} {result['unroutable']:>11}")
+        result = evaluate(router, load_examples(files))
+        print(f"\nAll: {result}")
+        if result['unroutable']:
+            print(f"{result['unroutable']} records of {', '.join(result['unroutable_categories'])} are unroutable "
+                  f"(no training data) and excluded from the scores")
+    else:
+        router = CategoryRouter.load(args.model)
+        for category, probability in router.route(args.text):
+            print(f"{category:<12} {probability:.3f}")
+
+
+if __name__ == "__main__":
+    main()
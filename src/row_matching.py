@@ -0,0 +1,198 @@
+"""
+Row matching for multi-row evaluation - value-code similarity matrix and optimal (Hungarian) assignment
+"""
+import argparse
+import glob
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+# Add project root directory to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.utils import get_logger, _serialize_for_comparison
+
+# linear_sum_assignment ships with scipy (an sklearn dependency); greedy matching otherwise
+try:
+    from scipy.optimize import linear_sum_assignment
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
+logger = get_logger('row_matching')
+
+
+def similarity_matrix(manual_rows: List[Dict], parse_rows: List[Dict]) -> np.ndarray:
+    """
+    Share of each manual row's fields that a parse row reproduces, for every pair. Values
+    are canonicalized once (as in the evaluation) and compared as integer codes.
+    """
+    fields = sorted({name for row in manual_rows for name in row if name != 'rows'})
+    codes: Dict[str, int] = {}
+    manual = np.full((len(manual_rows), len(fields)), -1, dtype=np.int64)
+    parse = np.empty((len(parse_rows), len(fields)), dtype=np.int64)
+    for i, row in enumerate(manual_rows):
+        for k, name in enumerate(fields):
+            if name in row:
+                manual[i, k] = codes.setdefault(_serialize_for_comparison(row[name]), len(codes))
+    for j, row in enumerate(parse_rows):
+        for k, name in enumerate(fields):
+            parse[j, k] = codes.setdefault(_serialize_for_comparison(row.get(name)), len(codes))
+
+    present = manual >= 0
+    matches = ((manual[:, None, :] == parse[None, :, :]) & present[:, None, :]).sum(axis=2)
+    counts = present.sum(axis=1, keepdims=True)
+    return np.divide(matches, counts, out=np.zeros(matches.shape), where=counts > 0)
+
+
+def match_rows(manual_rows: List[Dict], parse_rows: List[Dict]) -> List[Tuple[int, int]]:
+    """
+    (manual_idx, parse_idx) pairs maximizing the total similarity (min(len) pairs of dict
+    rows). Indices refer to the lists as passed in; non-dict rows are never matched.
+    """
+    manual_index = [i for i, row in enumerate(manual_rows) if isinstance(row, dict)]
+    parse_index = [j for j, row in enumerate(parse_rows) if isinstance(row, dict)]
+    if not manual_index or not parse_index:
+        return []
+    scores = similarity_matrix([manual_rows[i] for i in manual_index], [parse_rows[j] for j in parse_index])
+    if SCIPY_AVAILABLE:
+        rows, cols = linear_sum_assignment(scores, maximize=True)
+        pairs = zip(rows.tolist(), cols.tolist())
+    else:
+        pairs = _greedy(scores)
+    return [(manual_index[i], parse_index[j]) for i, j in pairs]
+
+
+def _greedy(scores: np.ndarray) -> List[Tuple[int, int]]:
+    """Best remaining pair first (the former matching rule)"""
+    order = sorted(((scores[i, j], i, j) for i in range(scores.shape[0]) for j in range(scores.shape[1])), reverse=True)
+    used_manual, used_parse, matches = set(), set(), []
+    for _, i, j in order:
+        if i not in used_manual and j not in used_parse:
+            matches.append((i, j))
+            used_manual.add(i)
+            used_parse.add(j)
+    return matches
+
+
+def _legacy_row_similarity(manual_row: Dict, parse_row: Dict) -> float:
+    """The former _calculate_row_similarity: str() comparison, json.loads per mismatching pair"""
+    if not manual_row or not parse_row:
+        return 0.0
+    total = matching = 0
+    for name, manual_value in manual_row.items():
+        if name == 'rows':
+            continue
+        total += 1
+        parse_value = parse_row.get(name)
+        manual_str = str(manual_value) if manual_value is not None else "null"
+        parse_str = str(parse_value) if parse_value is not None else "null"
+        if manual_str == parse_str:
+            matching += 1
+        elif isinstance(manual_value, (str, dict)) and isinstance(parse_value, (str, dict)) \
+                and not (isinstance(manual_value, dict) and isinstance(parse_value, dict)):
+            try:
+                left = json.loads(manual_value) if isinstance(manual_value, str) else manual_value
+                right = json.loads(parse_value) if isinstance(parse_value, str) else parse_value
+                matching += left == right
+            except (json.JSONDecodeError, TypeError):
+                pass
+    return matching / total if total else 0.0
+
+
+def legacy_greedy_matches(manual_rows: List[Dict], parse_rows: List[Dict]) -> List[Tuple[int, int]]:
+    """The former _find_best_row_matches: per-pair similarity in Python, sorted, matched greedily"""
+    if not manual_rows or not parse_rows:
+        return []
+    scores = sorted(((_legacy_row_similarity(m, p), i, j) for i, m in enumerate(manual_rows)
+                     for j, p in enumerate(parse_rows)), reverse=True)
+    used_manual, used_parse, matches = set(), set(), []
+    for _, i, j in scores:
+        if i not in used_manual and j not in used_parse:
+            matches.append((i, j))
+            used_manual.add(i)
+            used_parse.add(j)
+    return matches
+
+
+def _shuffled_predictions(rows: List[Dict], values: Dict[str, List[Any]], rng: random.Random,
+                          error_rate: float) -> List[Dict]:
+    """Rows in random order with corrupted fields, one row dropped and one duplicated at random"""
+    predicted = [{name: rng.choice(values[name]) if rng.random() < error_rate else value for name, value in row.items()}
+                 for row in rows]
+    rng.shuffle(predicted)
+    if len(predicted) > 2 and rng.random() < 0.3:
+        predicted.pop()
+    if rng.random() < 0.3:
+        predicted.append(dict(rng.choice(predicted)))
+    return predicted
+
+
+def multi_row_pairs(error_rate: float = 0.3, seed: int = 0) -> List[Tuple[List[Dict], List[Dict]]]:
+    """(manual rows, predicted rows) for every multi-row NOTAM in dataset/*_test.json"""
+    rng = random.Random(seed)
+    pairs = []
+    for file_path in sorted(glob.glob(str(project_root / 'dataset' / '*_test.json'))):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            outputs = [json.loads(item['output']) for item in json.load(f)]
+        row_lists = [o['rows'] if isinstance(o, dict) and isinstance(o.get('rows'), list) else o for o in outputs]
+        row_lists = [rows for rows in row_lists if isinstance(rows, list) and len(rows) > 1]
+        values: Dict[str, List[Any]] = {}
+        for rows in row_lists:
+            for row in rows:
+                for name, value in row.items():
+                    values.setdefault(name, []).append(value)
+        pairs.extend((rows, _shuffled_predictions(rows, values, rng, error_rate)) for rows in row_lists)
+    return pairs
+
+
+def matched_fields(manual_rows: List[Dict], parse_rows: List[Dict], pairs: List[Tuple[int, int]]) -> Tuple[int, int]:
+    """(correct, total) field values over the matched pairs, compared as in the evaluation"""
+    correct = total = 0
+    for i, j in pairs:
+        for name, value in manual_rows[i].items():
+            if name == 'rows':
+                continue
+            total += 1
+            correct += _serialize_for_comparison(value) == _serialize_for_comparison(parse_rows[j].get(name))
+    return correct, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Hungarian vs greedy row matching on multi-row NOTAMs')
+    parser.add_argument('--error-rate', type=float, default=0.3, help='Field corruption rate of the predictions (default: 0.3)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+    args = parser.parse_args()
+
+    pairs = multi_row_pairs(args.error_rate, args.seed)
+    results = {}
+    for name, matcher in (('greedy (former)', legacy_greedy_matches), ('hungarian', match_rows)):
+        start = time.perf_counter()
+        matchings = [matcher(manual, parse) for manual, parse in pairs]
+        seconds = time.perf_counter() - start
+        correct = total = 0
+        for (manual, parse), matching in zip(pairs, matchings):
+            c, t = matched_fields(manual, parse, matching)
+            correct += c
+            total += t
+        results[name] = (seconds, correct, total, matchings)
+
+    print(f"\n{len(pairs)} multi-row NOTAMs, {sum(len(m) for m, _ in pairs)} labelled rows"
+          f"{'' if SCIPY_AVAILABLE else ' (scipy not installed: greedy fallback)'}")
+    print(f"{'Matcher':<18} {'ms total':>9} {'us/NOTAM':>9} {'Field accuracy':>15}")
+    print("-" * 55)
+    for name, (seconds, correct, total, _) in results.items():
+        print(f"{name:<18} {seconds * 1e3:>9.1f} {seconds / len(pairs) * 1e6:>9.1f} {correct / total if total else 0:>15.2%}")
+    greedy, optimal = results['greedy (former)'][3], results['hungarian'][3]
+    changed = sum(sorted(g) != sorted(o) for g, o in zip(greedy, optimal))
+    print(f"Matchings that differ: {changed}/{len(pairs)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Deterministic rule-based fast path - template NOTAMs parsed locally without an LLM call
+"""
+import argparse
+import glob
+import json
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Add project root directory to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.columnar import category_from_path
+from src.consistency import result_rows
+from src.normalize import canonical_notam_text
+from src.utils import get_logger, _serialize_for_comparison
+
+logger = get_logger('rules')
+
+# Item A) and runway designators as in apps/backend/app/services/notam_parser.py, precompiled
+AIRPORT_PATTERN = re.compile(r"A\)\s*([A-Z0-9]{4})")
+BODY_PATTERN = re.compile(r"\bE\)\s*(.*)$")
+_RWY = r"[0-9]{2}[LRC]?"
+_REASON_TAIL = r"(?:\s*-?\s*DUE(?: TO)? [A-Z ]+)?\.?"
+
+# The whole E) item must match a template; anything else is left to the LLM
+RUNWAY_CLOSURE = re.compile(rf"^(?:[A-Z]{{3}} )?RWY ({_RWY})(?:/({_RWY}))?\s*-?\s*(?:CLSD|CLOSED){_REASON_TAIL}$")
+RVR_UNSERVICEABLE = re.compile(
+    rf"^(?:[A-Z]{{3}} )?RWY ({_RWY}) RVR[TMR]? (?:U/S|UNREL|NOT AVBL)\.?$"
+    rf"|^RVR ({_RWY})(?: [A-C])? (?:U/S|UNREL|NOT AVBL)\.?$"
+)
+_STAND = r"(?:NR )?[A-Z]?[0-9]+[A-Z]?"
+STAND_CLOSURE = re.compile(
+    rf"^(?:ACFT )?STANDS? ({_STAND}(?:(?:, ?| AND | TO | ){_STAND})*)"
+    rf"(?: (?:COMMERCIAL|GEN|GENERAL|MIL|MILITARY|CARGO|OVERNIGHT)(?: AVIATION)? APN)? (?:CLSD|CLOSED){_REASON_TAIL}$"
+)
+_STAND_TOKEN = re.compile(r"[A-Z]?[0-9]+[A-Z]?(?: TO [A-Z]?[0-9]+[A-Z]?)?")
+_STAND_RANGE = re.compile(r"^([0-9]+) TO ([0-9]+)$")
+
+RUNWAY_CLOSURE_ROW = {
+    'affect_region': 'TAKEOFFS,LANDINGS',
+    'flight_type': 'international, domestic, regional',
+    'status_type': 'ltd',
+    'ppr': '0',
+    'aip': '0',
+    'tora': None,
+    'toda': None,
+    'asda': None,
+    'lda': None,
+    'distance_chg': '0'
+}
+
+# Rule output: (parse_fields, confidence)
+RuleResult = Tuple[Any, float]
+
+
+def _split_notam(raw_text: str) -> Tuple[Optional[str], Optional[str]]:
+    """(airport, E) item) of a NOTAM in canonical form"""
+    text = canonical_notam_text(raw_text)
+    airport = AIRPORT_PATTERN.search(text)
+    body = BODY_PATTERN.search(text)
+    return (airport.group(1) if airport else None), (body.group(1).strip() if body else None)
+
+
+def _rows(rows: List[Dict[str, Any]]) -> Any:
+    """Single rows are stored flat, several under 'rows' (as in the dataset outputs)"""
+    return rows[0] if len(rows) == 1 else {'rows': rows}
+
+
+def runway_rule(airport: str, body: str) -> Optional[RuleResult]:
+    """RWY 14/32 CLSD [DUE ...] -> one closure row per runway end"""
+    match = RUNWAY_CLOSURE.match(body)
+    if not match:
+        return None
+    ends = [end for end in match.groups() if end]
+    return _rows([{**RUNWAY_CLOSURE_ROW, 'airport': airport, 'runway': end} for end in ends]), 0.95
+
+
+def rvr_rule(airport: str, body: str) -> Optional[RuleResult]:
+    """RWY 27 RVRR U/S / RVR 07 NOT AVBL -> all RVR positions unavailable on that runway"""
+    match = RVR_UNSERVICEABLE.match(body)
+    if not match:
+        return None
+    runway = match.group(1) or match.group(2)
+    return {
+        'airport': airport,
+        'runway': runway,
+        'touchdown_zone_unavailable': '1',
+        'midpoint_unavailable': '1',
+        'stop_end_unavailable': '1'
+    }, 0.95
+
+
+def stand_rule(airport: str, body: str) -> Optional[RuleResult]:
+    """ACFT STANDS 206, 207 AND 208 CLSD -> one closure row per stand"""
+    match = STAND_CLOSURE.match(body)
+    if not match:
+        return None
+    stands = []
+    for part in _STAND_TOKEN.findall(match.group(1)):
+        stand_range = _STAND_RANGE.match(part)
+        if stand_range:
+            first, last = int(stand_range.group(1)), int(stand_range.group(2))
+            if last < first or last - first > 50:
+                return None
+            stands.extend(str(s) for s in range(first, last + 1))
+        elif ' TO ' in part:
+            # Ranges of lettered stands are left to the LLM
+            return None
+        else:
+            stands.append(part)
+    rows = [
+        # Numeric stands are integers in the labels (leading zeros dropped)
+        {'stand_split_info': int(s) if s.isdigit() else s, 'stand_status': 'stand_closure', 'airport': airport}
+        for s in stands
+    ]
+    return _rows(rows), 0.9
+
+
+RULES: Dict[str, Callable[[str, str], Optional[RuleResult]]] = {
+    'runway': runway_rule,
+    'RVR': rvr_rule,
+    'stand': stand_rule,
+}
+
+
+def apply_rules(raw_text: str, category: Optional[str]) -> Optional[RuleResult]:
+    """(parse_fields, confidence) if a rule of the category matches the NOTAM, else None"""
+    rule = next((r for c, r in RULES.items() if category and c.lower() == category.lower()), None)
+    if rule is None or not raw_text:
+        return None
+    airport, body = _split_notam(raw_text)
+    if not airport or not body:
+        return None
+    return rule(airport, body)
+
+
+class RuleFastPath:
+    """Confidence gate in front of the API: records a rule answers confidently skip the LLM"""
+
+    def __init__(self, min_confidence: float = 0.9):
+        self.min_confidence = min_confidence
+        self.stats = {'records': 0, 'matched': 0, 'accepted': 0, 'seconds': 0.0}
+        self._lock = threading.Lock()
+
+    def try_parse(self, record: Dict[str, Any], category: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Processed copy of the record if the fast path answers it, else None"""
+        start = time.perf_counter()
+        result = apply_rules(record.get('raw_text'), category) if isinstance(record.get('raw_text'), str) else None
+        accepted = result is not None and result[1] >= self.min_confidence
+        with self._lock:
+            self.stats['records'] += 1
+            self.stats['seconds'] += time.perf_counter() - start
+            self.stats['matched'] += result is not None
+            self.stats['accepted'] += accepted
+        if not accepted:
+            return None
+        parse_fields, confidence = result
+        return {**record, 'parse_fields': parse_fields, 'fast_path': {'confidence': confidence}}
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.stats
+        return {
+            **stats,
+            'coverage': stats['accepted'] / stats['records'] if stats['records'] else 0.0,
+            'us_per_record': stats['seconds'] / stats['records'] * 1e6 if stats['records'] else 0.0
+        }
+
+
+def _rows_match(predicted: Any, expected: Any) -> bool:
+    """Same rows in any order, values compared as in the evaluation"""
+    def key(rows):
+        return sorted(json.dumps({k: _serialize_for_comparison(v) for k, v in row.items()}, sort_keys=True)
+                      for row in result_rows(rows))
+    return key(predicted) == key(expected)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Coverage and accuracy of the rule-based fast path on dataset files')
+    parser.add_argument('files', nargs='*', help='Dataset files (default: dataset/*_test.json)')
+    parser.add_argument('--min-confidence', type=float, default=0.9, help='Confidence gate (default: 0.9)')
+    parser.add_argument('--show-errors', type=int, default=0, help='Print up to N mismatching records')
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob.glob(str(project_root / 'dataset' / '*_test.json')))
+
+    print(f"\n{'File':<24} {'Records':>8} {'Fast path':>10} {'Coverage':>9} {'Exact':>7} {'Field acc':>10} {'us/rec':>8}")
+    print("-" * 82)
+    errors_shown = 0
+    for file_path in files:
+        category = category_from_path(file_path)
+        with open(file_path, 'r', encoding='utf-8') as f:
+            items = json.load(f)
+        fast_path = RuleFastPath(args.min_confidence)
+        exact = 0
+        fields = Counter()
+        for item in items:
+            processed = fast_path.try_parse({'raw_text': item['input']}, category)
+            if processed is None:
+                continue
+            expected = json.loads(item['output'])
+            if _rows_match(processed['parse_fields'], expected):
+                exact += 1
+            elif errors_shown < args.show_errors:
+                errors_shown += 1
+                print(f"  MISMATCH {item['input']!r}\n    got {processed['parse_fields']}\n    exp {expected}")
+            # Field accuracy over rows paired in sorted order
+            for got, exp in zip(sorted(result_rows(processed['parse_fields']), key=str),
+                                sorted(result_rows(expected), key=str)):
+                for name, value in exp.items():
+                    fields['total'] += 1
+                    fields['correct'] += _serialize_for_comparison(got.get(name)) == _serialize_for_comparison(value)
+        stats = fast_path.get_stats()
+        accepted = stats['accepted']
+        print(f"{Path(file_path).name:<24} {len(items):>8} {accepted:>10} {stats['coverage']:>8.1%} "
+              f"{exact / accepted if accepted else 0:>7.1%} "
+              f"{fields['correct'] / fields['total'] if fields['total'] else 0:>10.1%} {stats['us_per_record']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
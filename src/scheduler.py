@@ -0,0 +1,153 @@
+"""
+Cost-aware scheduling - estimate per-record cost and dispatch expensive records first (LPT)
+"""
+import argparse
+import glob
+import heapq
+import json
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Add project root directory to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.utils import get_logger
+from src.normalize import record_text
+
+logger = get_logger('scheduler')
+
+# Decoding an output character costs far more time than reading an input character
+INPUT_WEIGHT = 0.1
+OUTPUT_WEIGHT = 1.0
+DEFAULT_CATEGORY = 'default'
+
+
+class CostEstimator:
+    """
+    Per-category online least-squares fit of output size against input size.
+    Estimated cost = INPUT_WEIGHT * input_chars + OUTPUT_WEIGHT * predicted_output_chars.
+    """
+
+    def __init__(self):
+        self._sums: Dict[str, List[float]] = {}  # category -> [n, sx, sy, sxy, sxx]
+        self._lock = threading.Lock()
+
+    def observe(self, category: Optional[str], input_chars: int, output_chars: int):
+        """Add one observed (input size, output size) pair to the category history"""
+        with self._lock:
+            for key in {category or DEFAULT_CATEGORY, DEFAULT_CATEGORY}:
+                sums = self._sums.setdefault(key, [0.0, 0.0, 0.0, 0.0, 0.0])
+                sums[0] += 1
+                sums[1] += input_chars
+                sums[2] += output_chars
+                sums[3] += input_chars * output_chars
+                sums[4] += input_chars * input_chars
+
+    def seed_from_dataset(self, pattern: str = None) -> int:
+        """Seed the history from dataset/*_train.json input/output pairs (category from file name)"""
+        pattern = pattern or str(project_root / 'dataset' / '*_train.json')
+        seeded = 0
+        for file_path in sorted(glob.glob(pattern)):
+            category = Path(file_path).stem.rsplit('_', 1)[0]
+            with open(file_path, 'r', encoding='utf-8') as f:
+                items = json.load(f)
+            for item in items:
+                if isinstance(item.get('input'), str) and isinstance(item.get('output'), str):
+                    self.observe(category, len(item['input']), len(item['output']))
+                    seeded += 1
+        return seeded
+
+    def predict_output(self, category: Optional[str], input_chars: int) -> float:
+        """Predicted output size for an input of this size"""
+        with self._lock:
+            sums = self._sums.get(category or DEFAULT_CATEGORY) or self._sums.get(DEFAULT_CATEGORY)
+            if not sums or not sums[0]:
+                return float(input_chars)
+            n, sx, sy, sxy, sxx = sums
+            denominator = n * sxx - sx * sx
+            if n < 2 or denominator == 0:
+                return sy / n
+            slope = (n * sxy - sx * sy) / denominator
+            intercept = (sy - slope * sx) / n
+            return max(intercept + slope * input_chars, 0.0)
+
+    def estimate(self, record: Dict[str, Any], category: Optional[str] = None) -> float:
+        """Estimated relative cost of processing a record of the given category"""
+        text = record_text(record) or ''
+        return INPUT_WEIGHT * len(text) + OUTPUT_WEIGHT * self.predict_output(category, len(text))
+
+
+def lpt_order(costs: List[float]) -> List[int]:
+    """Indices ordered longest-processing-time first (stable for equal costs)"""
+    return sorted(range(len(costs)), key=lambda i: -costs[i])
+
+
+def restore_order(items: List[Any], order: List[int]) -> List[Any]:
+    """Undo a permutation: items[k] belongs at position order[k]"""
+    restored: List[Any] = [None] * len(items)
+    for position, item in zip(order, items):
+        restored[position] = item
+    return restored
+
+
+def simulate_makespan(durations: List[float], workers: int, batch_size: Optional[int] = None) -> float:
+    """
+    Makespan of greedy list scheduling on `workers` parallel slots, tasks taken in list order.
+    With batch_size, batches run one after another (as in DataProcessor).
+    """
+    batch_size = batch_size or len(durations) or 1
+    total = 0.0
+    for batch_start in range(0, len(durations), batch_size):
+        slots = [0.0] * workers
+        for duration in durations[batch_start:batch_start + batch_size]:
+            heapq.heappush(slots, heapq.heappop(slots) + duration)
+        total += max(slots)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare FIFO and LPT makespan on a simulated server')
+    parser.add_argument('files', nargs='*', help='Dataset files with input/output pairs (default: dataset/*_test.json)')
+    parser.add_argument('--workers', type=int, default=10, help='Concurrent requests (default: 10)')
+    parser.add_argument('--batch-size', type=int, default=100, help='DataProcessor batch size (default: 100)')
+    parser.add_argument('--base-latency', type=float, default=0.5, help='Fixed seconds per request (default: 0.5)')
+    parser.add_argument('--chars-per-second', type=float, default=200.0,
+                        help='Simulated decode speed in output characters per second (default: 200)')
+    args = parser.parse_args()
+
+    estimator = CostEstimator()
+    seeded = estimator.seed_from_dataset()
+    logger.info(f"Cost history seeded with {seeded} training pairs")
+
+    files = args.files or sorted(glob.glob(str(project_root / 'dataset' / '*_test.json')))
+
+    print(f"\n{'File':<24} {'Records':>8} {'FIFO (s)':>10} {'LPT (s)':>10} {'Speedup':>8}")
+    print("-" * 64)
+    fifo_total = lpt_total = 0.0
+    for file_path in files:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            items = json.load(f)
+        category = Path(file_path).stem.rsplit('_', 1)[0]
+        # Simulated service time uses the true output size; the scheduler only sees its estimate
+        durations = [
+            args.base_latency + (INPUT_WEIGHT * len(item.get('input', '')) + len(item.get('output', ''))) / args.chars_per_second
+            for item in items
+        ]
+        costs = [estimator.estimate({'raw_text': item.get('input', '')}, category) for item in items]
+        order = lpt_order(costs)
+
+        fifo = simulate_makespan(durations, args.workers, args.batch_size)
+        lpt = simulate_makespan([durations[i] for i in order], args.workers, args.batch_size)
+        fifo_total += fifo
+        lpt_total += lpt
+        print(f"{Path(file_path).name:<24} {len(items):>8} {fifo:>10.1f} {lpt:>10.1f} {fifo / lpt if lpt else 0:>7.2f}x")
+
+    print("-" * 64)
+    print(f"{'Total':<24} {'':>8} {fifo_total:>10.1f} {lpt_total:>10.1f} {fifo_total / lpt_total if lpt_total else 0:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
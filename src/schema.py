@@ -0,0 +1,257 @@
+"""
+Per-category JSON Schemas for parsed NOTAM output and a compiled local validator
+"""
+import argparse
+import glob
+import json
+import sys
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+# Add project root directory to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from config.settings import Config
+from src.columnar import category_columns, category_from_path
+from src.utils import get_logger
+
+logger = get_logger('schema')
+
+SCHEMA_DIR = project_root / 'config' / 'schemas'
+DEFAULT_FIELD_TYPES = ['string', 'null']
+_JSON_TYPES = {str: 'string', bool: 'boolean', int: 'integer', float: 'number', list: 'array', dict: 'object', type(None): 'null'}
+
+
+def _json_type(value: Any) -> str:
+    return _JSON_TYPES.get(type(value), 'string')
+
+
+def _observed_field_types(category: str) -> Dict[str, set]:
+    """JSON types seen per field in the dataset outputs of a category"""
+    observed: Dict[str, set] = {}
+    for file_path in sorted(glob.glob(str(project_root / 'dataset' / '*.json'))):
+        if (category_from_path(file_path) or '').lower() != category.lower():
+            continue
+        with open(file_path, 'r', encoding='utf-8') as f:
+            items = json.load(f)
+        for item in items:
+            try:
+                output = json.loads(item.get('output', ''))
+            except (json.JSONDecodeError, TypeError):
+                continue
+            rows = output.get('rows', [output]) if isinstance(output, dict) else output
+            for row in rows if isinstance(rows, list) else []:
+                if isinstance(row, dict):
+                    for field, value in row.items():
+                        observed.setdefault(field, set()).add(_json_type(value))
+    return observed
+
+
+def build_category_schema(category: str) -> Dict[str, Any]:
+    """
+    Row schema of a category: Config.CATEGORY_FIELDS columns (plus any dataset-only fields),
+    typed by the values seen in the dataset outputs; every field required, no extra fields.
+    """
+    observed = _observed_field_types(category)
+    fields = category_columns(category) + [f for f in observed if f not in category_columns(category)]
+    properties = {}
+    for field in fields:
+        types = sorted(observed.get(field, set()) | {'null'}) if field in observed else DEFAULT_FIELD_TYPES
+        properties[field] = {'type': types}
+    row = {'type': 'object', 'properties': properties, 'required': fields, 'additionalProperties': False}
+    # Root is an object so the schema is accepted by strict structured-output APIs
+    return {
+        'type': 'object',
+        'properties': {'rows': {'type': 'array', 'items': row}},
+        'required': ['rows'],
+        'additionalProperties': False
+    }
+
+
+def get_category_schema(category: str) -> Optional[Dict[str, Any]]:
+    """Schema for a category: config/schemas/<category>.json if present, else generated"""
+    # Config keys are case-sensitive (e.g. 'RVR') while record categories may not be
+    return _category_schema(next((k for k in Config.CATEGORY_FIELDS if k.lower() == category.lower()), category))
+
+
+@lru_cache(maxsize=None)
+def _category_schema(category: str) -> Optional[Dict[str, Any]]:
+    schema_file = SCHEMA_DIR / f"{category}.json"
+    if schema_file.exists():
+        with open(schema_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    if not category_columns(category) and not _observed_field_types(category):
+        return None
+    return build_category_schema(category)
+
+
+def response_format_for(category: str) -> Optional[Dict[str, Any]]:
+    """`response_format` payload requesting structured output for a category"""
+    schema = get_category_schema(category)
+    if schema is None:
+        return None
+    return {
+        'type': 'json_schema',
+        'json_schema': {'name': f"notam_{category.lower()}", 'strict': True, 'schema': schema}
+    }
+
+
+# --- compiled validator -------------------------------------------------------
+
+Validator = Callable[[Any, str, List[str]], None]
+
+_TYPE_CHECKS = {
+    'string': lambda v: isinstance(v, str),
+    'integer': lambda v: isinstance(v, int) and not isinstance(v, bool),
+    'number': lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    'boolean': lambda v: isinstance(v, bool),
+    'null': lambda v: v is None,
+    'array': lambda v: isinstance(v, list),
+    'object': lambda v: isinstance(v, dict),
+}
+
+
+def compile_schema(schema: Dict[str, Any]) -> Validator:
+    """
+    Compile the schema subset used here (type, properties, required, additionalProperties,
+    items, anyOf, enum) into nested closures, so validation does no schema interpretation.
+    The compiled function appends error messages to `errors`.
+    """
+    checks: List[Validator] = []
+
+    if 'type' in schema:
+        types = schema['type'] if isinstance(schema['type'], list) else [schema['type']]
+        type_checks = [_TYPE_CHECKS[t] for t in types]
+
+        def check_type(value, path, errors):
+            if not any(check(value) for check in type_checks):
+                errors.append(f"{path}: expected {'/'.join(types)}, got {_json_type(value)}")
+        checks.append(check_type)
+
+    if 'enum' in schema:
+        allowed = schema['enum']
+
+        def check_enum(value, path, errors):
+            if value not in allowed:
+                errors.append(f"{path}: {value!r} not in enum")
+        checks.append(check_enum)
+
+    if 'properties' in schema or 'required' in schema or 'additionalProperties' in schema:
+        properties = {name: compile_schema(sub) for name, sub in schema.get('properties', {}).items()}
+        required = list(schema.get('required', []))
+        closed = schema.get('additionalProperties', True) is False
+
+        def check_object(value, path, errors):
+            if not isinstance(value, dict):
+                return
+            for name in required:
+                if name not in value:
+                    errors.append(f"{path}: missing field '{name}'")
+            for name, item in value.items():
+                validator = properties.get(name)
+                if validator is not None:
+                    validator(item, f"{path}.{name}", errors)
+                elif closed:
+                    errors.append(f"{path}: unexpected field '{name}'")
+        checks.append(check_object)
+
+    if 'items' in schema:
+        item_validator = compile_schema(schema['items'])
+
+        def check_items(value, path, errors):
+            if isinstance(value, list):
+                for i, item in enumerate(value):
+                    item_validator(item, f"{path}[{i}]", errors)
+        checks.append(check_items)
+
+    if 'anyOf' in schema:
+        options = [compile_schema(sub) for sub in schema['anyOf']]
+
+        def check_any_of(value, path, errors):
+            for option in options:
+                option_errors: List[str] = []
+                option(value, path, option_errors)
+                if not option_errors:
+                    return
+            errors.append(f"{path}: matches none of the allowed shapes")
+        checks.append(check_any_of)
+
+    def validate(value, path, errors):
+        for check in checks:
+            check(value, path, errors)
+    return validate
+
+
+@lru_cache(maxsize=None)
+def _row_validator(category: str) -> Optional[Validator]:
+    schema = get_category_schema(category)
+    return compile_schema(schema['properties']['rows']['items']) if schema else None
+
+
+def validate_parse_fields(parse_fields: Any, category: Optional[str]) -> List[str]:
+    """
+    Schema errors of a parsed result. The pipeline stores results as a row dict, a
+    {'rows': [...]} dict or a list of rows, so each shape is checked row by row.
+    Categories without a schema validate trivially.
+    """
+    validator = _row_validator(category) if category else None
+    if validator is None:
+        return []
+    if isinstance(parse_fields, dict) and 'rows' in parse_fields:
+        if not isinstance(parse_fields['rows'], list):
+            return [f"$.rows: expected array, got {_json_type(parse_fields['rows'])}"]
+        rows = [(f"$.rows[{i}]", row) for i, row in enumerate(parse_fields['rows'])]
+    elif isinstance(parse_fields, dict):
+        rows = [('$', parse_fields)]
+    elif isinstance(parse_fields, list):
+        rows = [(f"$[{i}]", row) for i, row in enumerate(parse_fields)]
+    else:
+        return [f"$: expected object or array, got {_json_type(parse_fields)}"]
+
+    errors: List[str] = []
+    for path, row in rows:
+        validator(row, path, errors)
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate per-category JSON Schemas or validate an output file')
+    parser.add_argument('--write', action='store_true', help=f'Write generated schemas to {SCHEMA_DIR.relative_to(project_root)}/')
+    parser.add_argument('--check', metavar='FILE', help='Validate parse_fields of a processed output file')
+    parser.add_argument('--category', help='Category for --check (default: record category or file name)')
+    args = parser.parse_args()
+
+    if args.check:
+        from src.streaming import iter_records
+
+        default_category = args.category or category_from_path(args.check)
+        total = invalid = 0
+        for record in iter_records(args.check):
+            parse_fields = record.get('parse_fields')
+            if parse_fields is None or (isinstance(parse_fields, dict) and 'error' in parse_fields):
+                continue
+            total += 1
+            errors = validate_parse_fields(parse_fields, record.get('category') or default_category)
+            if errors:
+                invalid += 1
+                if invalid <= 10:
+                    print(f"[{record.get('id')}] " + "; ".join(errors[:3]))
+        print(f"\n{invalid}/{total} parsed records violate the schema")
+        return
+
+    for category in Config.CATEGORY_FIELDS:
+        schema = build_category_schema(category)
+        fields = schema['properties']['rows']['items']['required']
+        print(f"{category:<12} {len(fields)} fields: {', '.join(fields)}")
+        if args.write:
+            SCHEMA_DIR.mkdir(parents=True, exist_ok=True)
+            with open(SCHEMA_DIR / f"{category}.json", 'w', encoding='utf-8') as f:
+                json.dump(schema, f, ensure_ascii=False, indent=2)
+    if args.write:
+        print(f"\nSchemas written to {SCHEMA_DIR}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Result serialization - JSON dump/load for pipeline outputs with a fast backend, compact/pretty modes and zstd
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+# Add project root directory to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.utils import get_logger
+
+# orjson is several times faster than the standard library; json is the fallback
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Optional zstd compression for .zst outputs
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+logger = get_logger('serialization')
+
+ZSTD_SUFFIX = '.zst'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+BACKENDS = ('orjson', 'json')
+
+
+class Serializer:
+    """
+    Encoder/decoder for result files. Pretty output matches the former
+    json.dump(..., ensure_ascii=False, indent=2, default=str); compact output drops the
+    whitespace. Paths ending in .zst are zstd-compressed, and compressed input is detected
+    by its magic bytes, so loaders accept either.
+    """
+
+    def __init__(self, pretty: bool = True, backend: Optional[str] = None, level: int = 3):
+        if backend is None:
+            backend = 'orjson' if ORJSON_AVAILABLE else 'json'
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown serialization backend: {backend} (expected one of {BACKENDS})")
+        if backend == 'orjson' and not ORJSON_AVAILABLE:
+            raise ImportError("orjson is not installed")
+        self.pretty = pretty
+        self.backend = backend
+        self.level = level
+
+    def dumps(self, data: Any) -> bytes:
+        """UTF-8 JSON bytes; values the encoder does not know are written with str()"""
+        if self.backend == 'orjson':
+            options = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+            if self.pretty:
+                options |= orjson.OPT_INDENT_2
+            try:
+                return orjson.dumps(data, default=str, option=options)
+            except TypeError:
+                # Integers beyond 64 bits and other values orjson rejects
+                pass
+        if self.pretty:
+            return json.dumps(data, ensure_ascii=False, indent=2, default=str).encode('utf-8')
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+
+    def loads(self, payload: Union[bytes, str]) -> Any:
+        if isinstance(payload, bytes) and payload[:4] == ZSTD_MAGIC:
+            payload = _decompress(payload)
+        if self.backend == 'orjson':
+            return orjson.loads(payload)
+        return json.loads(payload)
+
+    def dump(self, data: Any, path: Union[str, Path]):
+        """Write data to path (zstd-compressed if the path ends in .zst)"""
+        payload = self.dumps(data)
+        if str(path).endswith(ZSTD_SUFFIX):
+            payload = _compress(payload, self.level)
+        with open(path, 'wb') as f:
+            f.write(payload)
+
+    def load(self, path: Union[str, Path]) -> Any:
+        with open(path, 'rb') as f:
+            return self.loads(f.read())
+
+
+def _compress(payload: bytes, level: int) -> bytes:
+    if not ZSTD_AVAILABLE:
+        raise ImportError("zstandard is not installed; write to a path without the .zst suffix")
+    return zstandard.ZstdCompressor(level=level).compress(payload)
+
+
+def _decompress(payload: bytes) -> bytes:
+    if not ZSTD_AVAILABLE:
+        raise ImportError("zstandard is not installed; cannot read a zstd-compressed file")
+    return zstandard.ZstdDecompressor().decompressobj().decompress(payload)
+
+
+def zstd_stream_writer(f, level: int = 3):
+    """Incremental zstd compressor around a binary file (closing it closes the file)"""
+    if not ZSTD_AVAILABLE:
+        raise ImportError("zstandard is not installed; write to a path without the .zst suffix")
+    return zstandard.ZstdCompressor(level=level).stream_writer(f)
+
+
+_default_serializer = Serializer()
+
+
+def get_serializer() -> Serializer:
+    """Serializer used by the pipeline writers and loaders"""
+    return _default_serializer
+
+
+def set_serializer(serializer: Serializer):
+    """Replace the process-wide serializer (e.g. compact output selected on the command line)"""
+    global _default_serializer
+    _default_serializer = serializer
+
+
+def dump_json(data: Any, path: Union[str, Path]):
+    """Write a result file with the process-wide serializer"""
+    _default_serializer.dump(data, path)
+
+
+def load_json(path: Union[str, Path]) -> Any:
+    """Read a JSON (or .zst) file with the process-wide serializer"""
+    return _default_serializer.load(path)
+
+
+def benchmark(path: Union[str, Path], repeat: int = 3) -> List[Dict[str, Any]]:
+    """Dump/load time and size of one file for every available backend, mode and codec"""
+    data = Serializer(backend='json').load(path)
+    rows = []
+    for backend in [b for b in BACKENDS if b == 'json' or ORJSON_AVAILABLE]:
+        for pretty in (True, False):
+            serializer = Serializer(pretty=pretty, backend=backend)
+            for compressed in ([False, True] if ZSTD_AVAILABLE else [False]):
+                dump_seconds = load_seconds = float('inf')
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    payload = serializer.dumps(data)
+                    if compressed:
+                        payload = _compress(payload, serializer.level)
+                    dump_seconds = min(dump_seconds, time.perf_counter() - start)
+                    start = time.perf_counter()
+                    serializer.loads(payload)
+                    load_seconds = min(load_seconds, time.perf_counter() - start)
+                rows.append({
+                    'backend': backend,
+                    'mode': 'pretty' if pretty else 'compact',
+                    'zstd': compressed,
+                    'bytes': len(payload),
+                    'dump_seconds': dump_seconds,
+                    'load_seconds': load_seconds
+                })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark result serialization on output files')
+    parser.add_argument('files', nargs='+', help='Output files written by the pipeline (e.g. data/output/*_processed.json)')
+    parser.add_argument('--repeat', type=int, default=3, help='Best of N runs (default: 3)')
+    args = parser.parse_args()
+
+    for file_path in args.files:
+        rows = benchmark(file_path, args.repeat)
+        baseline = next(r for r in rows if r['backend'] == 'json' and r['mode'] == 'pretty' and not r['zstd'])
+        print(f"\n{file_path} ({Path(file_path).stat().st_size / 1e6:.1f} MB)")
+        print(f"{'Backend':<8} {'Mode':<8} {'zstd':<5} {'MB':>8} {'Size':>6} {'Dump s':>8} {'Load s':>8} {'Dump x':>7} {'Load x':>7}")
+        print("-" * 72)
+        for row in rows:
+            print(f"{row['backend']:<8} {row['mode']:<8} {'yes' if row['zstd'] else 'no':<5} {row['bytes'] / 1e6:>8.2f} "
+                  f"{row['bytes'] / baseline['bytes']:>6.0%} {row['dump_seconds']:>8.3f} {row['load_seconds']:>8.3f} "
+                  f"{baseline['dump_seconds'] / row['dump_seconds']:>7.1f} {baseline['load_seconds'] / row['load_seconds']:>7.1f}")
+    if not ZSTD_AVAILABLE:
+        print("\nzstandard not installed: compressed variants skipped")
+
+
+if __name__ == "__main__":
+    main()
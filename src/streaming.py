@@ -0,0 +1,286 @@
+"""
+Constant-memory streaming I/O - incremental JSON/JSONL record reader and ordered record writer
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# Add project root directory to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.utils import get_logger
+from src.serialization import Serializer, get_serializer, zstd_stream_writer, ZSTD_SUFFIX
+
+logger = get_logger('streaming')
+
+CHUNK_SIZE = 1 << 16
+
+
+class _JSONTokenStream:
+    """Buffered reader that decodes one JSON value at a time from a text file"""
+
+    def __init__(self, f, chunk_size: int = CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # Drop the consumed prefix so the buffer only ever holds about one value
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character ('' at end of input)"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' at offset {self.pos}, found '{self.peek()}'")
+        self.pos += 1
+
+    def value(self) -> Any:
+        """Decode the next complete JSON value, reading more input as needed"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A value touching the end of the buffer may be truncated (e.g. a number)
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            if not self._fill():
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                self.pos = end
+                return value
+
+    def array_items(self) -> Iterator[Any]:
+        """Yield the items of the array starting at the current position"""
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            separator = self.peek()
+            self.pos += 1
+            if separator == ']':
+                return
+            if separator != ',':
+                raise ValueError(f"Expected ',' or ']' in array, found '{separator}'")
+
+
+def iter_records(input_file: str) -> Iterator[Dict[str, Any]]:
+    """
+    Stream records from a JSON array, a {'records': [...]} object or a JSONL file
+    without loading the whole file.
+    """
+    with open(input_file, 'r', encoding='utf-8') as f:
+        if input_file.endswith('.jsonl'):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+
+        stream = _JSONTokenStream(f)
+        first = stream.peek()
+        if first == '[':
+            yield from stream.array_items()
+        elif first == '{':
+            stream.expect('{')
+            found = False
+            while stream.peek() != '}':
+                key = stream.value()
+                stream.expect(':')
+                if key == 'records' and stream.peek() == '[':
+                    found = True
+                    yield from stream.array_items()
+                else:
+                    value = stream.value()
+                    if key == 'records':
+                        found = True
+                        yield value
+                if stream.peek() == ',':
+                    stream.pos += 1
+            if not found:
+                # A single record object (same fallback as DataProcessor._load_records)
+                f.seek(0)
+                yield json.load(f)
+
+
+def iter_batches(records: Iterable[Dict[str, Any]], batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Group a record stream into lists of at most batch_size"""
+    iterator = iter(records)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+class StreamingRecordWriter:
+    """
+    Append records to the output as they are produced, in order, encoded with the
+    process-wide serializer (pretty or compact). JSON output is written as
+    {"records": [...], <trailer keys>} to a partial file that is renamed into place on
+    close; .jsonl output gets one compact record per line. A .zst suffix compresses the stream.
+    """
+
+    def __init__(self, output_file: str, serializer: Optional[Serializer] = None):
+        self.output_file = output_file
+        self.partial_file = output_file + '.partial'
+        base = output_file[:-len(ZSTD_SUFFIX)] if output_file.endswith(ZSTD_SUFFIX) else output_file
+        self.jsonl = base.endswith('.jsonl')
+        serializer = serializer or get_serializer()
+        # JSONL needs one record per line whatever the configured mode
+        self.serializer = Serializer(pretty=False, backend=serializer.backend) if self.jsonl else serializer
+        self.count = 0
+        self.f = open(self.partial_file, 'wb')
+        if output_file.endswith(ZSTD_SUFFIX):
+            try:
+                self.f = zstd_stream_writer(self.f, serializer.level)
+            except ImportError:
+                self.f.close()
+                os.remove(self.partial_file)
+                raise
+        if not self.jsonl:
+            self.f.write(b'{"records": [')
+
+    def write(self, records: Iterable[Dict[str, Any]]):
+        for record in records:
+            payload = self.serializer.dumps(record)
+            if self.jsonl:
+                self.f.write(payload + b'\n')
+            else:
+                self.f.write((b',\n' if self.count else b'\n') + payload)
+            self.count += 1
+        self.f.flush()
+
+    def close(self, trailer: Optional[Dict[str, Any]] = None):
+        """Finish the file; trailer keys (metadata, api_stats...) follow the records in JSON output"""
+        if not self.jsonl:
+            self.f.write(b'\n]')
+            for key, value in (trailer or {}).items():
+                self.f.write(b',\n' + json.dumps(key).encode('utf-8') + b': ' + self.serializer.dumps(value))
+            self.f.write(b'}\n')
+        self.f.close()
+        os.replace(self.partial_file, self.output_file)
+
+
+# --- memory benchmark ---------------------------------------------------------
+
+def _write_synthetic_input(path: str, count: int):
+    """Synthetic NOTAM records in JSON array form"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('[')
+        for i in range(count):
+            record = {
+                'id': str(i),
+                'category': 'runway',
+                'raw_text': f"A) Z{i % 9999:04d} E)RWY {i % 36 + 1:02d}/{(i + 18) % 36 + 1:02d} CLSD DUE MAINT\n)\nNNNN",
+                'manual_fields': {'airport': f"Z{i % 9999:04d}", 'runway': f"{i % 36 + 1:02d}", 'status_type': 'ltd'}
+            }
+            f.write((',' if i else '') + json.dumps(record))
+        f.write(']')
+
+
+def _echo_batch_call(requests: List[Dict[str, Any]], progress_callback=None, client_name=None) -> List[Dict[str, Any]]:
+    """Offline stand-in for APIManager.batch_call used by the benchmark (no network)"""
+    return [
+        {'task_id': str(i), 'index': i,
+         'result': {'success': True, 'data': {'raw_length': len(req['input_text'])}, 'raw_response': '{}', 'usage': None}}
+        for i, req in enumerate(requests)
+    ]
+
+
+def _run_benchmark_child(mode: str, input_file: str, output_file: str):
+    """Process the input with the offline API and print elapsed time and peak RSS as JSON"""
+    if mode == 'load_only':
+        # Baseline: what merely holding the parsed input costs
+        start = time.time()
+        with open(input_file, 'r', encoding='utf-8') as f:
+            records = json.load(f)
+        peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        print(json.dumps({'mode': mode, 'seconds': time.time() - start, 'peak_rss_mb': peak_kb / 1024}))
+        return
+
+    from main import DataProcessor
+    import main as main_module
+
+    main_module.print_evaluation_report = lambda *args, **kwargs: None
+    processor = DataProcessor({'api_config': {}, 'streaming': mode == 'streaming',
+                               'telemetry': {'log_task_details': False}})
+    processor.api_manager.batch_call = _echo_batch_call
+    get_logger().setLevel('WARNING')
+
+    start = time.time()
+    processor.process_json_file(input_file, output_file, 'benchmark', batch_size=1000)
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({'mode': mode, 'seconds': time.time() - start, 'peak_rss_mb': peak_kb / 1024}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Peak memory benchmark: streaming vs in-memory processing')
+    parser.add_argument('--records', type=int, default=1_000_000, help='Synthetic input size (default: 1,000,000)')
+    parser.add_argument('--modes', default='streaming,load_only',
+                        help="Comma-separated modes: streaming, in_memory (full pipeline, slow on large inputs), "
+                             "load_only (json.load of the input) (default: streaming,load_only)")
+    parser.add_argument('--child', nargs=3, metavar=('MODE', 'INPUT', 'OUTPUT'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _run_benchmark_child(*args.child)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_file = os.path.join(tmp_dir, 'synthetic.json')
+        _write_synthetic_input(input_file, args.records)
+        size_mb = os.path.getsize(input_file) / (1 << 20)
+        print(f"Synthetic input: {args.records} records, {size_mb:.1f} MB")
+
+        print(f"\n{'Mode':<12} {'Seconds':>10} {'Peak RSS (MB)':>15}")
+        print("-" * 40)
+        for mode in args.modes.split(','):
+            # Each mode runs in its own process so peak RSS is measured independently
+            output_file = os.path.join(tmp_dir, f"out_{mode}.json")
+            completed = subprocess.run(
+                [sys.executable, '-m', 'src.streaming', '--child', mode, input_file, output_file],
+                cwd=str(project_root), capture_output=True, text=True
+            )
+            lines = [line for line in completed.stdout.splitlines() if line.startswith('{"mode"')]
+            if completed.returncode != 0 or not lines:
+                print(f"{mode:<12} failed: {completed.stderr.strip().splitlines()[-1:]}")
+                continue
+            result = json.loads(lines[-1])
+            print(f"{mode:<12} {result['seconds']:>10.1f} {result['peak_rss_mb']:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
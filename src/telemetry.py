@@ -0,0 +1,223 @@
+"""
+Live run telemetry - throughput, ETA, local metrics endpoint and progress line
+"""
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional
+
+from src.utils import get_logger
+
+logger = get_logger('telemetry')
+
+
+class RunTelemetry:
+    """Thread-safe counters for a processing run, updated by DataProcessor and APIManager"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.total_records = 0
+        self.completed_records = 0
+        self.successful_records = 0
+        self.tasks_started = 0
+        self.tasks_finished = 0
+        self.tasks_succeeded = 0
+        self.retries = 0
+        self.tokens = 0
+        self.live_accuracy = None
+        self.live_f1 = None
+
+    # --- updates -------------------------------------------------------------
+
+    def set_total(self, total_records: int):
+        with self._lock:
+            self.total_records = total_records
+
+    def update_progress(self, completed_records: int):
+        """Records completed so far (may be called from progress callbacks at any rate)"""
+        with self._lock:
+            self.completed_records = max(self.completed_records, completed_records)
+
+    def record_batch(self, completed_records: int, successful_records: int):
+        """Cumulative record counts after a batch has been assembled"""
+        with self._lock:
+            self.completed_records = max(self.completed_records, completed_records)
+            self.successful_records = successful_records
+
+    def record_evaluation(self, accuracy: Optional[float], f1: Optional[float]):
+        """Current accuracy/F1 of the labelled records completed so far"""
+        with self._lock:
+            self.live_accuracy = accuracy
+            self.live_f1 = f1
+
+    def task_started(self):
+        with self._lock:
+            self.tasks_started += 1
+
+    def task_finished(self, result: Dict[str, Any]):
+        with self._lock:
+            self.tasks_finished += 1
+            if result.get('success'):
+                self.tasks_succeeded += 1
+            usage = result.get('usage') or {}
+            self.tokens += usage.get('total_tokens', 0) or 0
+
+    def retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def wrap_progress(self, progress_callback: Optional[Callable]) -> Callable:
+        """Wrap a (completed, total) progress callback so it also feeds the telemetry"""
+        def wrapper(completed, total):
+            self.update_progress(completed)
+            if progress_callback:
+                progress_callback(completed, total)
+        return wrapper
+
+    # --- views ---------------------------------------------------------------
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current metrics"""
+        with self._lock:
+            elapsed = max(time.time() - self.started_at, 1e-9)
+            records_per_s = self.completed_records / elapsed
+            remaining = max(self.total_records - self.completed_records, 0)
+            return {
+                'elapsed_s': elapsed,
+                'total_records': self.total_records,
+                'completed_records': self.completed_records,
+                'successful_records': self.successful_records,
+                'records_per_s': records_per_s,
+                'tokens': self.tokens,
+                'tokens_per_s': self.tokens / elapsed,
+                'tasks_finished': self.tasks_finished,
+                'success_rate': self.tasks_succeeded / self.tasks_finished if self.tasks_finished else 0.0,
+                'retries': self.retries,
+                'retry_rate': self.retries / self.tasks_started if self.tasks_started else 0.0,
+                'in_flight': self.tasks_started - self.tasks_finished,
+                'eta_s': remaining / records_per_s if records_per_s > 0 else None,
+                'live_accuracy': self.live_accuracy,
+                'live_f1': self.live_f1
+            }
+
+    def prometheus_text(self) -> str:
+        """Metrics in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        metrics = [
+            ('notam_records_total', 'gauge', 'Records in this run', snapshot['total_records']),
+            ('notam_records_completed', 'counter', 'Records completed', snapshot['completed_records']),
+            ('notam_records_successful', 'counter', 'Records parsed successfully', snapshot['successful_records']),
+            ('notam_records_per_second', 'gauge', 'Record throughput', snapshot['records_per_s']),
+            ('notam_tokens_total', 'counter', 'Tokens consumed', snapshot['tokens']),
+            ('notam_tokens_per_second', 'gauge', 'Token throughput', snapshot['tokens_per_s']),
+            ('notam_task_success_ratio', 'gauge', 'Share of API tasks that succeeded', snapshot['success_rate']),
+            ('notam_retries_total', 'counter', 'API retries', snapshot['retries']),
+            ('notam_retry_ratio', 'gauge', 'Retries per started API task', snapshot['retry_rate']),
+            ('notam_tasks_in_flight', 'gauge', 'API tasks currently running', snapshot['in_flight']),
+            ('notam_eta_seconds', 'gauge', 'Estimated seconds to completion', snapshot['eta_s'] if snapshot['eta_s'] is not None else float('nan')),
+            ('notam_live_accuracy', 'gauge', 'Mean field accuracy of labelled records so far', snapshot['live_accuracy'] if snapshot['live_accuracy'] is not None else float('nan')),
+            ('notam_live_f1', 'gauge', 'Mean field F1 of labelled records so far', snapshot['live_f1'] if snapshot['live_f1'] is not None else float('nan')),
+        ]
+        lines = []
+        for name, metric_type, help_text, value in metrics:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def progress_line(self) -> str:
+        """Compact single-line progress summary"""
+        s = self.snapshot()
+        eta = _format_seconds(s['eta_s']) if s['eta_s'] is not None else '--:--'
+        total = s['total_records'] or '?'
+        accuracy = f" | acc {s['live_accuracy']:.1%}" if s['live_accuracy'] is not None else ''
+        return (f"{s['completed_records']}/{total} rec | {s['records_per_s']:.2f} rec/s | "
+                f"{s['tokens_per_s']:.0f} tok/s | ok {s['success_rate']:.1%} | "
+                f"retry {s['retry_rate']:.1%} | in-flight {s['in_flight']} | ETA {eta}{accuracy}")
+
+
+def _format_seconds(seconds: float) -> str:
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes:02d}:{secs:02d}"
+
+
+class MetricsServer:
+    """Local HTTP endpoint: /metrics (Prometheus text) and /metrics.json"""
+
+    def __init__(self, telemetry: RunTelemetry, port: int, host: str = '127.0.0.1'):
+        self.telemetry = telemetry
+        self.host = host
+        self.port = port
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        telemetry = self.telemetry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith('/metrics.json'):
+                    body = json.dumps(telemetry.snapshot()).encode('utf-8')
+                    content_type = 'application/json'
+                elif self.path.startswith('/metrics'):
+                    body = telemetry.prometheus_text().encode('utf-8')
+                    content_type = 'text/plain; version=0.0.4'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"Metrics endpoint: http://{self.host}:{self.port}/metrics (JSON: /metrics.json)")
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class ProgressDisplay:
+    """Redraw a single terminal line with the current telemetry at a fixed interval"""
+
+    def __init__(self, telemetry: RunTelemetry, interval: float = 1.0, stream=None):
+        self.telemetry = telemetry
+        self.interval = interval
+        self.stream = stream or sys.stderr
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._draw()
+
+    def _draw(self):
+        self.stream.write("\r\033[K" + self.telemetry.progress_line())
+        self.stream.flush()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self._draw()
+        self.stream.write("\n")
+        self.stream.flush()
@@ -2,12 +2,28 @@ import re
 import json
 import logging
 import sys
+import time
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional, List, Dict, Any, Tuple, Union
 from collections import OrderedDict
 from sklearn.metrics import precision_recall_fscore_support, accuracy_score, precision_score, recall_score, f1_score
 import pandas as pd
 
+# Exact token counts need tiktoken; without it counts are estimated
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+# orjson decodes model responses faster; the standard library is the fallback
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 class LogManager:
     """Log Manager - Singleton Pattern"""
     _instance = None
@@ -92,59 +108,215 @@ def get_logger(name: str = None) -> logging.Logger:
     return log_manager.get_logger(name)
 
 
+# Word pieces, single punctuation marks and CJK characters, roughly one BPE token each
+_TOKEN_ESTIMATE_PATTERN = re.compile(r"[A-Za-z]{1,4}|\d{1,3}|[\u4e00-\u9fff]|[^\sA-Za-z\d]")
+_encoding = None
+
+def count_tokens(text: str) -> int:
+    """Prompt token count (cl100k_base with tiktoken, otherwise a regex estimate)"""
+    global _encoding
+    if not text:
+        return 0
+    if TIKTOKEN_AVAILABLE:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding('cl100k_base')
+        return len(_encoding.encode(text))
+    return len(_TOKEN_ESTIMATE_PATTERN.findall(text))
+
+
 # JSON processing functionality
+_json_logger = get_logger('JSONProcessor')
+
+def loads_json(text: str) -> Any:
+    """json.loads, with orjson when it is installed (raises json.JSONDecodeError either way)"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+_CLOSERS = {'}': '{', ']': '['}
+# Only these characters change the scanner state; everything between them is skipped in C
+_STRUCTURAL = re.compile(r'[{}\[\]"\\]')
+_JSON_VALUE_START = re.compile(r'\s*[-"{}\[\]0-9tfn]')
+
+
+def iter_json_spans(text: str):
+    """
+    (start, end) of each balanced top-level {...} or [...] span, in one left-to-right pass.
+    Brackets inside strings are skipped; a mismatched closer drops the open span.
+    """
+    stack: List[str] = []
+    in_string = False
+    escaped_at = -1
+    span_start = 0
+    for match in _STRUCTURAL.finditer(text):
+        char, i = match.group(), match.start()
+        if not stack:
+            # Prose brackets ("[see AIP]", "{runway}") are not followed by a JSON value
+            if (char == '{' or char == '[') and _JSON_VALUE_START.match(text, i + 1):
+                stack.append(char)
+                span_start = i
+            continue
+        if in_string:
+            if i == escaped_at:
+                continue
+            if char == '\\':
+                escaped_at = i + 1
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == '{' or char == '[':
+            stack.append(char)
+        elif char in _CLOSERS:
+            if stack[-1] != _CLOSERS[char]:
+                stack.clear()
+                continue
+            stack.pop()
+            if not stack:
+                yield span_start, i + 1
+
+
+def _strip_reasoning(content: str) -> str:
+    """Drop a <think>...</think> block; reasoning text often contains braces of its own"""
+    end = content.rfind('</think>')
+    return content[end + len('</think>'):] if end >= 0 else content
+
+
+def _fenced_blocks(content: str) -> List[str]:
+    """Bodies of ``` code fences (language tag removed); an unclosed fence runs to the end"""
+    blocks = []
+    position = content.find('```')
+    while position >= 0:
+        body_start = content.find('\n', position + 3)
+        if body_start < 0:
+            break
+        close = content.find('```', body_start)
+        blocks.append(content[body_start + 1:close if close >= 0 else len(content)])
+        if close < 0:
+            break
+        position = content.find('```', close + 3)
+    return blocks
+
+
+def _decode_span(span: str) -> Tuple[bool, Any]:
+    try:
+        return True, loads_json(span)
+    except ValueError:
+        pass
+    # JSON that was escaped once too often ({\"a\": 1})
+    if '\\"' in span:
+        try:
+            return True, loads_json(span.replace('\\"', '"'))
+        except ValueError:
+            pass
+    return False, None
+
+
+def _scan(content: str) -> Tuple[bool, Any]:
+    """First decodable top-level JSON span of the text"""
+    for span_start, span_end in iter_json_spans(content):
+        found, value = _decode_span(content[span_start:span_end])
+        if found:
+            return True, value
+    return False, None
+
+
 def extract_json_from_text(content: str) -> Optional[Union[Dict, List]]:
-    """Extract JSON data from text content"""
-    logger = get_logger('JSONProcessor')
-    
+    """
+    Extract JSON data from text content: reasoning blocks and code fences are stripped,
+    then the first balanced JSON span is decoded. Linear in the length of the response.
+    """
     if not content:
-        logger.warning("Input content is empty")
+        _json_logger.warning("Input content is empty")
         return None
 
-    content = content.strip()
-    logger.debug(f"Processing content length: {len(content)}")
-
-    # 1. Try matching JSON in Markdown code blocks
-    code_block_patterns = [
-        r'```json\n(.*?)\n```',
-        r'```\s*json\s*\n(.*?)\n\s*```',
-        r'json\n([\s\S]*)',
-        r'(?:json)?\s*\n?\s*(\[[\s\S]*?\])',
-        r'(?:json)?\s*\n?\s*(\{[\s\S]*?\})'
-    ]
-
-    for i, pattern in enumerate(code_block_patterns):
-        match = re.search(pattern, content, re.DOTALL)
-        if match:
-            try:
-                json_str = match.group(1).strip().replace('\\"', '"')
-                result = json.loads(json_str)
-                logger.debug(f"Successfully parsed using pattern {i+1}")
-                return result
-            except json.JSONDecodeError as e:
-                logger.debug(f"Failed to parse using pattern {i+1}: {e}")
+    content = _strip_reasoning(content).strip()
+
+    # 1. Raw JSON (the common case)
+    found, value = _decode_span(content)
+    # 2. A JSON document serialised into a string ("{\"a\": 1}")
+    if found and isinstance(value, str):
+        found, value = _scan(value.strip())
+    if found:
+        return value
+
+    # 3. Code fences, then the whole text; over-escaped quotes hide the brackets from the scan
+    blocks = _fenced_blocks(content) + [content]
+    if '\\"' in content:
+        blocks.append(content.replace('\\"', '"'))
+    for block in blocks:
+        found, value = _scan(block)
+        if found:
+            return value
+
+    _json_logger.warning("All JSON parsing methods failed")
+    return None
+
+
+_REPAIR_STRUCTURAL = re.compile(r'[{}\[\]",\\]')
+_OPENERS = {'{': '}', '[': ']'}
+
+
+def _is_row_list(stack: List[str]) -> bool:
+    """Innermost open bracket is the outermost array, i.e. the list holding the rows"""
+    return bool(stack) and stack[-1] == '[' and stack.index('[') == len(stack) - 1
+
+
+def repair_truncated_json(content: str) -> Optional[Union[Dict, List]]:
+    """
+    Salvage a JSON document cut off mid-stream (max_tokens, dropped connection): the text is
+    cut back to the last complete element of the outermost array and the open arrays/objects
+    are closed, so the incomplete trailing row is dropped rather than half-filled. None if the
+    document is complete or no row survives.
+    """
+    if not content:
+        return None
+    content = _strip_reasoning(content)
+    # An unclosed fence runs to the end, so the truncated document is in the last block
+    fences = _fenced_blocks(content)
+    text = fences[-1] if fences else content
+    start = next((m.start() for m in re.finditer(r'[{\[]', text) if _JSON_VALUE_START.match(text, m.start() + 1)), None)
+    if start is None:
+        return None
+
+    stack: List[str] = []
+    in_string = False
+    escaped_at = -1
+    cut = None  # (end of the kept text, stack at that point)
+    for match in _REPAIR_STRUCTURAL.finditer(text, start):
+        char, i = match.group(), match.start()
+        if in_string:
+            if i == escaped_at:
                 continue
+            if char == '\\':
+                escaped_at = i + 1
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in _OPENERS:
+            stack.append(char)
+        elif char in _CLOSERS:
+            if not stack or stack[-1] != _CLOSERS[char]:
+                break
+            stack.pop()
+            if not stack:
+                # Balanced document: not truncated
+                return None
+            if _is_row_list(stack):
+                cut = (i + 1, stack[:])
+        elif char == ',' and _is_row_list(stack):
+            cut = (i, stack[:])
 
-    # 2. Try parsing as raw JSON
+    if cut is None:
+        return None
+    end, open_brackets = cut
+    repaired = text[start:end] + ''.join(_OPENERS[b] for b in reversed(open_brackets))
     try:
-        result = json.loads(content)
-        logger.debug("Successfully parsed as raw JSON")
-        return result
-    except json.JSONDecodeError as e:
-        logger.debug(f"Failed to parse as raw JSON: {e}")
-
-    # 3. Try handling JSON strings wrapped in quotes
-    if content.startswith('"') and content.endswith('"'):
-        try:
-            unquoted = content[1:-1].replace('\\"', '"')
-            result = json.loads(unquoted)
-            logger.debug("Successfully parsed unquoted JSON")
-            return result
-        except json.JSONDecodeError as e:
-            logger.debug(f"Failed to parse unquoted JSON: {e}")
-
-    logger.warning("All JSON parsing methods failed")
-    return None
+        return loads_json(repaired)
+    except ValueError:
+        return None
 
 
 def clean_text(text: str) -> str:
@@ -161,12 +333,17 @@ def clean_text(text: str) -> str:
     return text.strip()
 
 def _serialize_for_comparison(value: Any) -> str:
+    """Serialize value to a consistent string for comparison (memoized, see canonical_form)"""
+    return canonical_form(value)
+
+def _canonicalize(value: Any) -> str:
     """Serialize value to a consistent string for comparison"""
     if value is None:
         return "null"
     
     # If the value is a string, try parsing it as a JSON object
     if isinstance(value, str):
+        _canonical_stats['json_decodes'] += 1
         try:
             # Parse and re-serialize to unify format (e.g., quotes and spaces)
             # sort_keys=True ensures consistent dictionary key order
@@ -177,40 +354,82 @@ def _serialize_for_comparison(value: Any) -> str:
     
     # If the value is a dictionary or list (from parsed JSON), serialize it
     if isinstance(value, (dict, list)):
+        _canonical_stats['json_encodes'] += 1
         return json.dumps(value, sort_keys=True, separators=(',', ':'))
         
     # Other types are converted to strings directly
     return str(value)
 
-def compare_json_results(api_json: Any, gold_json: Any) -> bool:
-    """Compare JSON results, ignoring order"""
+
+# Canonical forms are memoized per distinct raw value: the same field values recur across
+# rows, rounds and records. typed=True keeps 1, 1.0 and True apart (their str() differs).
+CANONICAL_CACHE_SIZE = 1 << 16
+_canonical_stats = {'calls': 0, 'misses': 0, 'uncached_calls': 0, 'json_decodes': 0, 'json_encodes': 0, 'seconds': 0.0}
+
+@lru_cache(maxsize=CANONICAL_CACHE_SIZE, typed=True)
+def _cached_canonical(value: Any) -> str:
+    _canonical_stats['misses'] += 1
+    start = time.perf_counter()
+    result = _canonicalize(value)
+    _canonical_stats['seconds'] += time.perf_counter() - start
+    return result
+
+def canonical_form(value: Any) -> str:
+    """
+    Hashable canonical form of a field value, used by every evaluation and voting comparison:
+    JSON strings are decoded and re-encoded with sorted keys, None becomes "null".
+    Hashable values are looked up in a bounded memo table; dicts and lists are encoded directly.
+    """
+    _canonical_stats['calls'] += 1
+    if isinstance(value, (dict, list)):
+        _canonical_stats['uncached_calls'] += 1
+        return _canonicalize(value)
+    try:
+        return _cached_canonical(value)
+    except TypeError:
+        # Unhashable value of another type
+        _canonical_stats['uncached_calls'] += 1
+        return _canonicalize(value)
+
+def canonical_stats() -> Dict[str, Any]:
+    """Memo table hits, JSON decodes performed and the estimated time the hits saved"""
+    stats = _canonical_stats
+    lookups = stats['calls'] - stats['uncached_calls']
+    hits = lookups - stats['misses']
+    per_miss = stats['seconds'] / stats['misses'] if stats['misses'] else 0.0
+    return {
+        **stats,
+        'hits': hits,
+        'hit_rate': hits / lookups if lookups else 0.0,
+        'cached_values': _cached_canonical.cache_info().currsize,
+        'seconds_saved': hits * per_miss
+    }
+
+def reset_canonical_stats(clear: bool = False):
+    """Zero the counters (and empty the memo table if clear)"""
+    for key in _canonical_stats:
+        _canonical_stats[key] = 0.0 if key == 'seconds' else 0
+    if clear:
+        _cached_canonical.cache_clear()
+
+def compare_json_results(api_json: Any, gold_json: Any, mode: str = 'exact', data_type: Optional[str] = None) -> bool:
+    """
+    Compare JSON results as multisets of rows, ignoring order. Modes (see src/comparison.py):
+    exact (all fields), subset (fields the API rows carry) and key (the type's core_fields)
+    """
+    from src.comparison import compare_rows
     logger = get_logger('JSONProcessor')
     
     try:
-        if not isinstance(api_json, list) or not isinstance(gold_json, list) or len(api_json) != len(gold_json):
-            logger.debug(f"Type or length mismatch: {type(api_json)} vs {type(gold_json)}")
-            return False
-
-        for api_item in api_json:
-            if not isinstance(api_item, dict):
-                logger.debug("API item is not a dictionary")
-                return False
-            found_match = False
-            for gold_item in gold_json:
-                if not isinstance(gold_item, dict):
-                    continue
-                if all(api_item.get(key) == gold_item.get(key) for key in api_item):
-                    found_match = True
-                    break
-            if not found_match:
-                logger.debug(f"No matching item found: {api_item}")
-                return False
-        
-        logger.debug("JSON comparison successful")
-        return True
+        result = compare_rows(api_json, gold_json, mode, data_type)
+    except ValueError:
+        raise
     except Exception as e:
         logger.error(f"Error comparing JSON: {e}")
         return False
+    if not result['match']:
+        logger.debug(f"Rows differ: missing {result['missing']}, unexpected {result['unexpected']}")
+    return result['match']
 
 
 def calculate_similarity(text1: str, text2: str) -> float:
@@ -232,9 +451,8 @@ def calculate_similarity(text1: str, text2: str) -> float:
 
 def load_processed_data(file_path: str) -> List[Dict[str, Any]]:
     """Load processed JSON file"""
-    with open(file_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    return data['records']
+    from src.serialization import load_json
+    return load_json(file_path)['records']
 
 def _normalize_parse_fields(parse_fields_raw: Any) -> Dict[str, Any]:
     """Normalize parse_fields format"""
@@ -261,7 +479,8 @@ def extract_field_values(records: List[Dict[str, Any]]) -> Dict[str, Dict[str, L
         
         # Process rows structure in manual_fields
         if 'rows' in manual_fields and isinstance(manual_fields['rows'], list):
-            manual_rows = manual_fields['rows']
+            # Filtered like parse_rows, so matched indices refer to the same lists
+            manual_rows = [item for item in manual_fields['rows'] if isinstance(item, dict)]
         else:
             # If no rows structure, treat the entire manual_fields as a single row
             manual_rows = [manual_fields]
@@ -316,7 +535,7 @@ def extract_field_values(records: List[Dict[str, Any]]) -> Dict[str, Dict[str, L
 
 def _calculate_row_similarity(manual_row: Dict, parse_row: Dict) -> float:
     """
-    Calculate similarity score between two rows
+    Calculate similarity score between two rows (share of manual fields with equal canonical forms)
     """
     # Add type checking
     if not isinstance(manual_row, dict) or not isinstance(parse_row, dict):
@@ -333,87 +552,29 @@ def _calculate_row_similarity(manual_row: Dict, parse_row: Dict) -> float:
             continue
             
         total_fields += 1
-        parse_value = parse_row.get(field_name)
-        
-        # Standardized comparison (convert to string and handle None values)
-        manual_str = str(manual_value) if manual_value is not None else "null"
-        parse_str = str(parse_value) if parse_value is not None else "null"
-        
-        # Add intelligent comparison for JSON strings and dictionaries
-        if manual_str != parse_str:
-            # Try JSON parsing comparison
-            if _try_json_comparison(manual_value, parse_value):
-                matching_fields += 1
-            # If not JSON comparable, keep the original mismatch result
-        else:
+        # JSON strings and dictionaries compare equal when their canonical forms do
+        if canonical_form(manual_value) == canonical_form(parse_row.get(field_name)):
             matching_fields += 1
     
     return matching_fields / total_fields if total_fields > 0 else 0.0
 
-def _try_json_comparison(value1: Any, value2: Any) -> bool:
-    """
-    Attempt intelligent comparison of JSON strings and dictionaries
-    """
-    try:
-        # Case 1: value1 is a JSON string, value2 is a dictionary
-        if isinstance(value1, str) and isinstance(value2, dict):
-            parsed_value1 = json.loads(value1)
-            return parsed_value1 == value2
-            
-        # Case 2: value1 is a dictionary, value2 is a JSON string
-        if isinstance(value1, dict) and isinstance(value2, str):
-            parsed_value2 = json.loads(value2)
-            return value1 == parsed_value2
-            
-        # Case 3: Both are JSON strings
-        if isinstance(value1, str) and isinstance(value2, str):
-            try:
-                parsed_value1 = json.loads(value1)
-                parsed_value2 = json.loads(value2)
-                return parsed_value1 == parsed_value2
-            except:
-                return False
-                
-        return False
-    except (json.JSONDecodeError, TypeError):
-        return False
-
 def _find_best_row_matches(manual_rows: List[Dict], parse_rows: List[Dict]) -> List[Tuple[int, int]]:
     """
     Find the best matches between manually labeled rows and parsed rows
     Return a list of matched index pairs [(manual_idx, parse_idx), ...]
     """
-    logger = get_logger('FieldMatcher')
-    
-    if not manual_rows or not parse_rows:
-        return []
-    
-    # Calculate match scores for each pair of rows
-    scores = []
-    for i, manual_row in enumerate(manual_rows):
-        for j, parse_row in enumerate(parse_rows):
-            score = _calculate_row_similarity(manual_row, parse_row)
-            scores.append((score, i, j))
-    
-    # Sort by score and select the best matches
-    scores.sort(reverse=True)
-    
-    used_manual = set()
-    used_parse = set()
-    matches = []
-    
-    for score, manual_idx, parse_idx in scores:
-        if manual_idx not in used_manual and parse_idx not in used_parse:
-            matches.append((manual_idx, parse_idx))
-            used_manual.add(manual_idx)
-            used_parse.add(parse_idx)
-            logger.debug(f"Matched rows: manual[{manual_idx}] <-> parse[{parse_idx}], score: {score:.3f}")
-    
-    return matches
+    # Optimal assignment over a vectorized similarity matrix (src/row_matching.py)
+    from src.row_matching import match_rows
+    return match_rows(manual_rows, parse_rows)
 
-def calculate_metrics(file_path):
-    """Calculate evaluation metrics"""
-    records = load_processed_data(file_path)
+# Version of the metric computation; bump it whenever a change alters the numbers so
+# cached metrics (src/leaderboard.py) from the previous logic are no longer served
+EVALUATION_VERSION = 1
+
+def calculate_metrics(file_path, records: Optional[List[Dict[str, Any]]] = None):
+    """Calculate evaluation metrics (from records already in memory when given)"""
+    if records is None:
+        records = load_processed_data(file_path)
     if not records:
         return None
     
@@ -421,32 +582,22 @@ def calculate_metrics(file_path):
     if not field_data:
         return None
     
-    results = {}
-    for field_name, data in field_data.items():
-        y_true = [_serialize_for_comparison(val) for val in data['y_true']]
-        y_pred = [_serialize_for_comparison(val) for val in data['y_pred']]
-        
-        if not y_true:
-            continue
-        
-        results[field_name] = {
-            'accuracy': accuracy_score(y_true, y_pred),
-            'precision': precision_score(y_true, y_pred, average='weighted', zero_division=0),
-            'recall': recall_score(y_true, y_pred, average='weighted', zero_division=0),
-            'f1': f1_score(y_true, y_pred, average='weighted', zero_division=0),
-            'total_samples': len(y_true)
-        }
-    
-    return results
+    # Vectorized engine (src/metrics.py), identical to the sklearn scores
+    from src.metrics import evaluate_fields
+    return evaluate_fields(field_data)
 
-def print_evaluation_report(file_path: str):
-    """Print evaluation report"""
+def print_evaluation_report(file_path: str, records: Optional[List[Dict[str, Any]]] = None,
+                            results: Optional[Dict[str, Dict[str, Any]]] = None):
+    """Print evaluation report and return the per-field metrics (computed unless results are given)"""
     logger = get_logger('EvaluationReport')  # Get logger instance
     
     logger.info(f"Starting evaluation report generation: {file_path}")
     print(f"\n=== Evaluation Report: {file_path} ===")
     
-    results = calculate_metrics(file_path)
+    if results is None:
+        reset_canonical_stats()
+        results = calculate_metrics(file_path, records)
+    canonical = canonical_stats()
     if not results:
         logger.warning("Unable to generate evaluation report - no available data")
         print("Unable to generate evaluation report")
@@ -478,6 +629,10 @@ def print_evaluation_report(file_path: str):
     print(f"   Total samples: {total_samples}")
     print(f"   Average Accuracy: {total_accuracy:.1%}")
     print(f"   Average F1 Score: {total_f1:.1%}")
+    print(f"   Value canonicalization: {canonical['calls']} comparisons, {canonical['json_decodes']} JSON decodes "
+          f"({canonical['hit_rate']:.1%} memo hits, ~{canonical['seconds_saved'] * 1e3:.1f} ms saved)")
+    logger.info(f"Canonicalization stats: {canonical}")
+    return results
 
 def compare_parsed_fields(manual_fields: Dict[str, Any], parse_fields: Any) -> Dict[str, Any]:
     """Compare manually labeled and AI-parsed fields"""
@@ -0,0 +1,51 @@
+"""
+Parity of the vectorized evaluation engine (src/metrics.py) with the sklearn metrics it replaces
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add project root directory to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.metrics import field_metrics, sklearn_field_metrics, parity_check, synthetic_records, IncrementalEvaluator
+from src.utils import calculate_metrics
+
+pytest.importorskip('sklearn')
+
+LABEL_SETS = {
+    'all correct': (['a', 'b', 'c'], ['a', 'b', 'c']),
+    'all wrong': (['a', 'a', 'b'], ['b', 'b', 'a']),
+    'single sample': (['a'], ['a']),
+    # Predicted labels that never occur in y_true: zero weight in the averages, but they cost recall
+    'unseen predicted labels': (['a', 'a', 'b', 'b'], ['a', 'x', 'y', 'b']),
+    # True labels that are never predicted have zero precision denominators (zero_division=0)
+    'never predicted labels': (['a', 'b', 'c', 'c'], ['a', 'a', 'a', 'a']),
+    # Labels with zero support (only ever predicted) next to unbalanced supports
+    'zero-support labels': (['a'] * 5 + ['b'], ['z'] * 3 + ['a'] * 2 + ['b']),
+    'serialized values': (['null', '["01", "19"]', '{"a": 1}', '1'], ['null', '["01"]', '{"a": 1}', 'null']),
+}
+
+
+@pytest.mark.parametrize('y_true, y_pred', LABEL_SETS.values(), ids=list(LABEL_SETS))
+def test_field_metrics_match_sklearn(y_true, y_pred):
+    assert field_metrics(y_true, y_pred) == sklearn_field_metrics(y_true, y_pred)
+
+
+def test_parity_on_dataset_labels():
+    result = parity_check(synthetic_records(error_rate=0.2))
+    assert result['fields'] > 0
+    assert result['identical'], result
+
+
+def test_incremental_evaluator_matches_batch_metrics():
+    records = [{'id': str(i), **record} for i, record in enumerate(synthetic_records(error_rate=0.3))]
+    evaluator = IncrementalEvaluator()
+    for record in records:
+        evaluator.update(record)
+    expected = calculate_metrics(None, records)
+    assert evaluator.field_metrics().keys() == expected.keys()
+    for name, metrics in expected.items():
+        assert evaluator.field_metrics()[name] == pytest.approx(metrics, abs=1e-12)